@@ -0,0 +1,157 @@
+# backend/account_ledger.py
+"""
+科目明细账：某科目（含全部下级科目）在日期区间内的分录及逐笔余额。
+
+- 期初余额 = account_balances 中该科目的年初余额 + 年初至起始日前的发生额
+  （整月部分取 account_period_balances，起始日所在月的零头再查一次分录）；
+- 只读查询，有从库时走从库（db_utils.read_cursor）；
+- 明细用非缓冲游标按批 fetchmany，边读边计算余额边输出，
+  几十万行的明细账也不会在内存中拼成一个大列表；
+- 分录按 idx_account_code 定位，再按主键关联凭证，日期区间落在凭证日期上；
+  区间涉及已归档年度时同时查询归档表（archive.table_sources）。
+
+输出格式：
+  ndjson（默认）：第一行 {"type": "opening", ...}，每条分录一行 {"type": "entry", ...}，
+                 最后一行 {"type": "closing", ...}
+  json：{"account_code": ..., "opening_balance": ..., "entries": [...], "closing_balance": ..., "entry_count": ...}
+"""
+import datetime
+import json
+
+import archive
+from db_utils import read_cursor
+from ledger_balances import ZERO
+from voucher_queries import InvalidQueryError, parse_date
+
+FORMATS = ("ndjson", "json")
+FETCH_SIZE = 1000
+
+
+def parse_ledger_args(args):
+    """解析 date_from、date_to、format；未给日期时取 date_from 所在年度（默认今年）的全年"""
+    date_from = parse_date(args['date_from'], 'date_from') if args.get('date_from') else None
+    date_to = parse_date(args['date_to'], 'date_to') if args.get('date_to') else None
+    year = (date_from or date_to or datetime.date.today()).year
+    date_from = date_from or datetime.date(year, 1, 1)
+    date_to = date_to or datetime.date(year, 12, 31)
+    if date_from > date_to:
+        raise InvalidQueryError("date_from 不能晚于 date_to")
+    fmt = args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        raise InvalidQueryError("format 只能是 ndjson 或 json")
+    return {"date_from": date_from, "date_to": date_to, "format": fmt}
+
+
+def signed(direction, debit, credit):
+    """按余额方向计算净发生额"""
+    return debit - credit if direction == 'debit' else credit - debit
+
+
+def opening_balance(cursor, tree, account_code, codes, date_from):
+    """起始日之前的余额：年初余额 + 之前整月发生额 + 当月起始日前的发生额"""
+    direction = tree.direction(account_code)
+    year, month = date_from.year, date_from.month
+
+    cursor.execute("""
+        SELECT opening_balance FROM account_balances
+        WHERE account_code = %s AND fiscal_year = %s
+    """, (account_code, year))
+    row = cursor.fetchone()
+    balance = row[0] if row else ZERO
+
+    cursor.execute("""
+        SELECT COALESCE(SUM(period_debit), 0), COALESCE(SUM(period_credit), 0)
+        FROM account_period_balances
+        WHERE fiscal_year = %s AND account_code = %s AND period_month < %s
+    """, (year, account_code, month))
+    debit, credit = cursor.fetchone()
+    balance += signed(direction, debit, credit)
+
+    month_start = datetime.date(year, month, 1)
+    if date_from > month_start:
+        placeholders = ", ".join(["%s"] * len(codes))
+        sources = archive.table_sources(cursor, month_start, date_from)
+        sql, params = archive.union_all(f"""
+            SELECT COALESCE(SUM(je.debit_amount), 0) AS debit, COALESCE(SUM(je.credit_amount), 0) AS credit
+            FROM {{entries}} je
+            JOIN {{vouchers}} v ON je.voucher_id = v.id
+            WHERE je.account_code IN ({placeholders})
+              AND v.voucher_date >= %s AND v.voucher_date < %s
+        """, (*codes, month_start, date_from), sources)
+        cursor.execute(f"SELECT SUM(debit), SUM(credit) FROM ({sql}) AS moved", params)
+        debit, credit = cursor.fetchone()
+        balance += signed(direction, debit, credit)
+    return balance
+
+
+def to_json(record):
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def stream_ledger(account_code, tree, date_from, date_to, fmt="ndjson"):
+    """
+    生成明细账的输出片段。第一次 next() 时借出连接并计算期初余额，
+    调用方可以先取出第一个片段，以便在开始发送响应前暴露数据库错误。
+    """
+    codes = [account_code, *tree.descendants(account_code)]
+    direction = tree.direction(account_code)
+    names = {code: tree.nodes[code].row["account_name"] for code in codes}
+
+    # 非缓冲游标：结果集留在服务器端，fetchmany 时才按批读取
+    with read_cursor() as (conn, cursor):
+        try:
+            balance = opening_balance(cursor, tree, account_code, codes, date_from)
+            head = {"account_code": account_code, "account_name": names[account_code],
+                    "balance_direction": direction, "date_from": date_from.isoformat(),
+                    "date_to": date_to.isoformat(), "opening_balance": balance}
+            if fmt == "ndjson":
+                yield to_json({"type": "opening", **head}) + "\n"
+            else:
+                yield to_json(head)[:-1] + ', "entries": ['
+
+            placeholders = ", ".join(["%s"] * len(codes))
+            sources = archive.table_sources(cursor, date_from, date_to)
+            sql, params = archive.union_all(f"""
+                SELECT v.voucher_date, v.id AS voucher_id, v.voucher_type, v.voucher_number,
+                       je.id AS entry_id, je.account_code, je.summary, je.debit_amount, je.credit_amount
+                FROM {{entries}} je
+                JOIN {{vouchers}} v ON je.voucher_id = v.id
+                WHERE je.account_code IN ({placeholders})
+                  AND v.voucher_date >= %s AND v.voucher_date <= %s
+            """, (*codes, date_from, date_to), sources)
+            cursor.execute(sql + " ORDER BY voucher_date, voucher_number, entry_id", params)
+
+            count = 0
+            total_debit = total_credit = ZERO
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                chunk = []
+                for voucher_date, voucher_id, voucher_type, voucher_number, entry_id, code, summary, debit, credit in rows:
+                    balance += signed(direction, debit, credit)
+                    total_debit += debit
+                    total_credit += credit
+                    entry = {
+                        "voucher_date": voucher_date.isoformat(), "voucher_id": voucher_id,
+                        "voucher_ref": f"{voucher_type}-{voucher_number:04d}", "entry_id": entry_id,
+                        "account_code": code, "account_name": names.get(code), "summary": summary,
+                        "debit_amount": debit, "credit_amount": credit, "balance": balance,
+                    }
+                    if fmt == "ndjson":
+                        chunk.append(to_json({"type": "entry", **entry}) + "\n")
+                    else:
+                        chunk.append(("," if count else "") + to_json(entry))
+                    count += 1
+                yield "".join(chunk)
+
+            tail = {"total_debit": total_debit, "total_credit": total_credit,
+                    "closing_balance": balance, "entry_count": count}
+            if fmt == "ndjson":
+                yield to_json({"type": "closing", **tail}) + "\n"
+            else:
+                yield "], " + to_json(tail)[1:]
+        except GeneratorExit:
+            # 客户端断开或生成器被提前关闭：服务器端还有未读的行，连接不再放回连接池
+            conn.discard()
+            raise
@@ -0,0 +1,172 @@
+# backend/account_tree.py
+"""
+会计科目树的进程级缓存。
+
+整张 chart_of_accounts 一次读入内存，构建为带索引的科目树：
+科目代码 -> 节点、末级科目集合、每个科目的上级路径和级别。
+科目的增、改、删接口提交后调用 invalidate() 使版本号加一，
+下一次访问时才重新构建，平时所有读取都直接命中内存。
+"""
+import hashlib
+import json
+import threading
+
+from db_utils import PRIMARY, cursor_target, db_cursor
+
+
+class AccountNode:
+    """科目树中的一个节点"""
+    __slots__ = ("code", "parent_code", "level", "direction", "row", "children", "ancestors")
+
+    def __init__(self, row):
+        self.code = row["account_code"]
+        self.parent_code = row["parent_code"]
+        self.level = row["level"]
+        self.direction = row["balance_direction"]
+        self.row = row              # 原始行数据，用于接口输出
+        self.children = []          # 直接下级科目代码
+        self.ancestors = ()         # 上级科目代码，由近及远
+
+
+class AccountTree:
+    """不可变的科目树快照，构建完成后可被多个线程同时读取"""
+
+    def __init__(self, rows, version=0):
+        self.version = version
+        self.nodes = {}
+        self.codes = []  # 按科目代码排序
+
+        for row in sorted(rows, key=lambda r: r["account_code"]):
+            node = AccountNode(dict(row))
+            self.nodes[node.code] = node
+            self.codes.append(node.code)
+
+        for node in self.nodes.values():
+            if node.parent_code in self.nodes:
+                self.nodes[node.parent_code].children.append(node.code)
+
+        resolved = set()
+        for code in self.codes:
+            # 先向上找到第一个已算好路径的上级，再自上而下依次复用上级的路径
+            chain = []
+            node = self.nodes[code]
+            while node is not None and node.code not in resolved and node.code not in chain:
+                chain.append(node.code)
+                node = self.nodes.get(node.parent_code)
+            for current in reversed(chain):
+                current_node = self.nodes[current]
+                parent = self.nodes.get(current_node.parent_code)
+                current_node.ancestors = (parent.code,) + parent.ancestors if parent else ()
+                resolved.add(current)
+
+        self.leaf_codes = frozenset(code for code in self.codes if not self.nodes[code].children)
+
+        # 接口输出：与原 SQL 查询的字段保持一致
+        self.accounts = []
+        self.leaf_accounts = []
+        for code in self.codes:
+            node = self.nodes[code]
+            is_leaf = 1 if code in self.leaf_codes else 0
+            self.accounts.append({**node.row, "is_leaf": is_leaf})
+            if is_leaf:
+                self.leaf_accounts.append({"account_code": code, "account_name": node.row["account_name"]})
+
+        digest = hashlib.sha1(json.dumps(self.accounts, sort_keys=True, default=str).encode("utf-8"))
+        self.etag = digest.hexdigest()
+
+    def __contains__(self, code):
+        return code in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def is_leaf(self, code):
+        return code in self.leaf_codes
+
+    def level(self, code):
+        return self.nodes[code].level
+
+    def direction(self, code):
+        """余额方向：'debit' 或 'credit'"""
+        return self.nodes[code].direction
+
+    def ancestors(self, code):
+        """上级科目代码元组，由近及远；科目不存在时返回空元组"""
+        node = self.nodes.get(code)
+        return node.ancestors if node else ()
+
+    def path(self, code):
+        """从一级科目到该科目的完整路径"""
+        return tuple(reversed(self.ancestors(code))) + (code,)
+
+    def descendants(self, code):
+        """该科目的所有下级科目代码（不含自身，先序遍历）"""
+        result = []
+        stack = list(reversed(self.nodes[code].children)) if code in self.nodes else []
+        while stack:
+            current = stack.pop()
+            result.append(current)
+            stack.extend(reversed(self.nodes[current].children))
+        return result
+
+    def leaves_under(self, code):
+        """该科目下的所有末级科目（科目本身是末级时返回自身）"""
+        if self.is_leaf(code):
+            return [code]
+        return [c for c in self.descendants(code) if c in self.leaf_codes]
+
+
+def build_tree(cursor, version=0):
+    """用给定游标读取科目表并构建科目树"""
+    cursor.execute("""
+        SELECT id, account_code, account_name, parent_code, level, balance_direction,
+               is_enabled, created_at, updated_at
+        FROM chart_of_accounts
+    """)
+    rows = cursor.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in rows]
+    return AccountTree(rows, version)
+
+
+_lock = threading.Lock()
+_version = 0
+_tree = None
+
+
+def invalidate():
+    """科目表发生变化后调用：版本号加一，下次访问时重建"""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def current_version():
+    return _version
+
+
+def get_account_tree(cursor=None):
+    """
+    获取当前版本的科目树。
+    缓存过期时才访问数据库；传入 cursor 可复用调用方已有的连接（和事务）。
+    从库的游标不用于构建：从库可能还没有刚修改的科目，构建结果会被缓存下来。
+    """
+    global _tree
+    tree = _tree
+    if tree is not None and tree.version == _version:
+        return tree
+
+    with _lock:
+        version = _version
+        if _tree is not None and _tree.version == version:
+            return _tree
+        if cursor is not None and cursor_target(cursor) == PRIMARY:
+            tree = build_tree(cursor, version)
+        else:
+            with db_cursor(dictionary=True) as (_conn, own_cursor):
+                tree = build_tree(own_cursor, version)
+        # 构建期间若有新的失效通知，只作为本次结果返回，不写入缓存
+        if version == _version:
+            _tree = tree
+        return tree
@@ -1,7 +1,125 @@
 # backend/app.py
-from flask import Flask, jsonify, render_template, request
-from db_utils import get_db_connection
+import codecs
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, jsonify, render_template, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import db_utils
+from db_utils import db_cursor, read_cursor, call_procedure, get_pool_stats, DatabaseUnavailableError
+from config import (INCREMENTAL_BALANCES, REPORT_ENGINE, IMPORT_CONFIG, CHART_IMPORT_CONFIG, METRICS_CONFIG,
+                    REPORT_BUNDLE_CONFIG)
+import jobs
+import ledger_balances
+import account_tree
+import chart_import
+import report_engine
+import trial_balance
+from report_cache import report_cache, report_key, bump_ledger_version
+import voucher_queries
+import voucher_import
+import voucher_export
+import voucher_numbers
+import account_ledger
+import archive
+import year_end
+import metrics
+import json_codec
+import http_cache
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify 使用的序列化器：由 json_codec 序列化（直接处理 Decimal、日期），并记录每次序列化的耗时"""
+    def _dumps_bytes(self, obj):
+        start = time.perf_counter()
+        try:
+            return json_codec.dumps_bytes(obj)
+        finally:
+            metrics.observe_json(time.perf_counter() - start)
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
+
+# /api/reports/bundle 并行生成报表的线程池，每个线程借用一个连接池连接
+report_bundle_executor = ThreadPoolExecutor(max_workers=REPORT_BUNDLE_CONFIG['workers'], thread_name_prefix="report")
+
+# --- 运行指标：按路由记录接口耗时，SQL 计时由 db_utils 中的游标包装完成 ---
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.set_route(request.url_rule.rule if request.url_rule else "unmatched")
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        metrics.http_request_duration.observe(
+            (request.method, metrics.current_route(), str(response.status_code)), elapsed)
+        if METRICS_CONFIG['server_timing'] or request.headers.get('X-Server-Timing') == '1':
+            timing = metrics.server_timing_header()
+            total = f"total;dur={elapsed * 1000:.1f}"
+            response.headers['Server-Timing'] = f"{timing}, {total}" if timing else total
+    return response
+
+# --- 响应压缩与缓存头：after_request 按注册的逆序执行，放在指标之后注册，压缩耗时计入接口耗时 ---
+@app.after_request
+def finalize_response(response):
+    return http_cache.finalize_response(request, response, request.endpoint == 'static')
+
+@app.url_defaults
+def add_static_version(endpoint, values):
+    """url_for('static') 自动带上文件修改时间作为版本号，文件更新后地址随之变化"""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = http_cache.static_version(app.static_folder, values['filename'])
+        if version is not None:
+            values['v'] = version
+
+# --- 读写分离：本次请求在主库提交过写入时，用 Cookie 记下此后读请求应走主库的截止时间（读己之写） ---
+READ_YOUR_WRITES_COOKIE = 'db_primary_until'
+
+@app.before_request
+def begin_db_session():
+    try:
+        primary_until = float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    db_utils.begin_session(primary_until)
+
+@app.after_request
+def remember_db_writes(response):
+    primary_until = db_utils.session_primary_until()
+    if primary_until is not None:
+        response.set_cookie(READ_YOUR_WRITES_COOKIE, f"{primary_until:.3f}",
+                            max_age=int(db_utils.read_router.window) + 1, httponly=True, samesite='Lax')
+    return response
+
+@app.teardown_request
+def clear_request_metrics(exc):
+    metrics.clear_route()
+    db_utils.end_session()
+
+@app.errorhandler(DatabaseUnavailableError)
+def handle_database_unavailable(e):
+    """连接池无法提供连接时，统一返回 500"""
+    return jsonify({"error": "数据库连接失败"}), 500
+
+def cached_json_response(etag, payload):
+    """带 ETag 的 JSON 响应：客户端缓存仍有效时直接返回 304，不再序列化数据"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # 每次都向服务器验证，但可复用本地副本
+    return response
+
 @app.route("/")
 def index():
     return "财务系统后端服务已启动"
@@ -32,36 +150,14 @@ def show_reports_page():
 # --- Read all: 获取所有会计科目 ---
 @app.route("/api/accounts", methods=['GET'])
 def get_accounts_api():
-    """获取所有会计科目，并增加是否为末级科目的标志"""
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
+    """获取所有会计科目，并增加是否为末级科目的标志（从内存科目树读取）"""
     try:
-        # 这个SQL查询会判断每个科目是否作为其他科目的父科目出现过
-        # 如果没有，则它就是末级科目 (is_leaf = 1)
-        sql = """
-            SELECT
-                a.*,
-                (CASE WHEN b.parent_code IS NULL THEN 1 ELSE 0 END) as is_leaf
-            FROM
-                chart_of_accounts a
-            LEFT JOIN
-                (SELECT DISTINCT parent_code FROM chart_of_accounts WHERE parent_code IS NOT NULL) b
-            ON
-                a.account_code = b.parent_code
-            ORDER BY
-                a.account_code;
-        """
-        cursor.execute(sql)
-        accounts = cursor.fetchall()
-        return jsonify(accounts)
+        tree = account_tree.get_account_tree()
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         return jsonify({"error": f"查询科目列表失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    return cached_json_response(tree.etag, tree.accounts)
 
 
 
@@ -69,18 +165,13 @@ def get_accounts_api():
 @app.route("/api/accounts/<string:account_code>", methods=['GET'])
 def get_single_account_api(account_code):
     """获取单个会计科目的API接口"""
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM chart_of_accounts WHERE account_code = %s;", (account_code,))
-        account = cursor.fetchone()
-        if account: return jsonify(account)
-        else: return jsonify({"error": "未找到该科目"}), 404
-    except Exception as e: return jsonify({"error": f"查询失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        try:
+            cursor.execute("SELECT * FROM chart_of_accounts WHERE account_code = %s;", (account_code,))
+            account = cursor.fetchone()
+            if account: return jsonify(account)
+            else: return jsonify({"error": "未找到该科目"}), 404
+        except Exception as e: return jsonify({"error": f"查询失败: {e}"}), 500
 
 # --- Create: 新增一个会计科目 ---
 @app.route("/api/accounts", methods=['POST'])
@@ -89,20 +180,55 @@ def create_account_api():
     data = request.get_json()
     if not data or not all(k in data for k in ['account_code', 'account_name', 'balance_direction']):
         return jsonify({"error": "缺少必要的字段"}), 400
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    cursor = conn.cursor()
+    with db_cursor() as (conn, cursor):
+        try:
+            sql = "INSERT INTO chart_of_accounts (account_code, account_name, balance_direction) VALUES (%s, %s, %s)"
+            cursor.execute(sql, (data['account_code'], data['account_name'], data['balance_direction']))
+            conn.commit()
+            account_tree.invalidate()
+            bump_ledger_version()
+            return jsonify({"message": "会计科目创建成功"}), 201
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": f"创建失败: {e}"}), 500
+
+# --- Create: 批量导入会计科目 ---
+@app.route("/api/accounts/import", methods=['POST'])
+def import_accounts_api():
+    """
+    【API】批量导入会计科目：整批在内存中校验并排序，一个事务写入；有任何错误时全部返回且不写入。
+    请求体为 JSON 数组，或由 ?format= / Content-Type 指定的 CSV、NDJSON 原始内容；?dry_run=1 只校验。
+    """
+    fmt = request.args.get('format') or chart_import.guess_format(request.mimetype)
+    if fmt not in chart_import.FORMATS:
+        return jsonify({"error": "请通过 format 参数或 Content-Type 指定 json、csv 或 ndjson 格式"}), 400
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+
     try:
-        sql = "INSERT INTO chart_of_accounts (account_code, account_name, balance_direction) VALUES (%s, %s, %s)"
-        cursor.execute(sql, (data['account_code'], data['account_name'], data['balance_direction']))
-        conn.commit()
-        return jsonify({"message": "会计科目创建成功"}), 201
+        if fmt == 'json':
+            data = request.get_json(force=True, silent=True)
+            if data is None:
+                return jsonify({"error": "请求体不是有效的 JSON"}), 400
+            records = chart_import.parse_records(data, fmt)
+        else:
+            records = chart_import.parse_records(codecs.getreader('utf-8-sig')(request.stream), fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"导入文件无法解析: {e}"}), 400
+    if not records:
+        return jsonify({"error": "没有需要导入的科目"}), 400
+
+    try:
+        result = chart_import.import_chart(records, dry_run=dry_run)
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"创建失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        return jsonify({"error": f"科目导入失败: {e}"}), 500
+    errors = result["errors"]
+    if errors:
+        return jsonify({"error": f"科目导入失败: 共 {len(errors)} 处错误，未写入任何科目",
+                        "stats": result["stats"],
+                        "errors": errors[:CHART_IMPORT_CONFIG['max_reported_errors']]}), 400
+    return jsonify({"stats": result["stats"], "errors": []}), (200 if dry_run else 201)
 
 # --- Update: 修改一个会计科目 ---
 @app.route("/api/accounts/<string:account_code>", methods=['PUT'])
@@ -117,40 +243,34 @@ def update_account_api(account_code):
     values = [data[field] for field in fields]
     values.append(account_code)
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    cursor = conn.cursor()
-    try:
-        sql = f"UPDATE chart_of_accounts SET {set_clause} WHERE account_code = %s"
-        cursor.execute(sql, tuple(values))
-        conn.commit()
-        if cursor.rowcount == 0: return jsonify({"error": "未找到该科目"}), 404
-        return jsonify({"message": "会计科目更新成功"})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"更新失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    with db_cursor() as (conn, cursor):
+        try:
+            sql = f"UPDATE chart_of_accounts SET {set_clause} WHERE account_code = %s"
+            cursor.execute(sql, tuple(values))
+            conn.commit()
+            account_tree.invalidate()
+            bump_ledger_version()
+            if cursor.rowcount == 0: return jsonify({"error": "未找到该科目"}), 404
+            return jsonify({"message": "会计科目更新成功"})
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": f"更新失败: {e}"}), 500
 
 # --- Delete: 删除一个会计科目 ---
 @app.route("/api/accounts/<string:account_code>", methods=['DELETE'])
 def delete_account_api(account_code):
     """删除一个会计科目"""
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM chart_of_accounts WHERE account_code = %s", (account_code,))
-        conn.commit()
-        if cursor.rowcount > 0: return jsonify({"message": "删除成功"})
-        else: return jsonify({"error": "未找到该科目"}), 404
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"删除失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    with db_cursor() as (conn, cursor):
+        try:
+            cursor.execute("DELETE FROM chart_of_accounts WHERE account_code = %s", (account_code,))
+            conn.commit()
+            account_tree.invalidate()
+            bump_ledger_version()
+            if cursor.rowcount > 0: return jsonify({"message": "删除成功"})
+            else: return jsonify({"error": "未找到该科目"}), 404
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": f"删除失败: {e}"}), 500
 
 # --- API 路由：期初余额管理 ---
 @app.route("/api/account_balances", methods=['GET'])
@@ -159,35 +279,29 @@ def get_account_balances_api():
     year = request.args.get('year', type=int)
     if not year: return jsonify({"error": "必须提供年份参数"}), 400
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT MIN(fiscal_year) as min_year FROM account_balances WHERE opening_balance != 0 OR period_debit != 0 OR period_credit != 0")
-        result = cursor.fetchone()
-        min_year = result['min_year'] if result and result['min_year'] is not None else year
-        is_initial_year = (year <= min_year)
-
-        sql = """
-            SELECT coa.account_code, ab.opening_balance
-            FROM chart_of_accounts coa
-            LEFT JOIN account_balances ab ON coa.account_code = ab.account_code AND ab.fiscal_year = %s
-            ORDER BY coa.account_code;
-        """
-        cursor.execute(sql, (year,))
-        balances = cursor.fetchall()
-        balance_map = {b['account_code']: b['opening_balance'] for b in balances}
-
-        return jsonify({
-            "balances": balance_map,
-            "is_initial_year": is_initial_year
-        })
-    except Exception as e:
-        return jsonify({"error": f"查询期初余额失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    with db_cursor(dictionary=True) as (conn, cursor):
+        try:
+            cursor.execute("SELECT MIN(fiscal_year) as min_year FROM account_balances WHERE opening_balance != 0 OR period_debit != 0 OR period_credit != 0")
+            result = cursor.fetchone()
+            min_year = result['min_year'] if result and result['min_year'] is not None else year
+            is_initial_year = (year <= min_year)
+
+            sql = """
+                SELECT coa.account_code, ab.opening_balance
+                FROM chart_of_accounts coa
+                LEFT JOIN account_balances ab ON coa.account_code = ab.account_code AND ab.fiscal_year = %s
+                ORDER BY coa.account_code;
+            """
+            cursor.execute(sql, (year,))
+            balances = cursor.fetchall()
+            balance_map = {b['account_code']: b['opening_balance'] for b in balances}
+
+            return jsonify({
+                "balances": balance_map,
+                "is_initial_year": is_initial_year
+            })
+        except Exception as e:
+            return jsonify({"error": f"查询期初余额失败: {e}"}), 500
 
 @app.route("/api/account_balances", methods=['POST'])
 def save_account_balances_api():
@@ -198,174 +312,406 @@ def save_account_balances_api():
     if not year or balances is None:
         return jsonify({"error": "缺少年份或余额数据"}), 400
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor()
+    with db_cursor() as (conn, cursor):
+        try:
+            archive.ensure_writable(cursor, int(year))
+            # 增量模式下期末余额只由记账增量维护：修改期初时期末同步平移（期末 = 原期末 - 原期初 + 新期初），
+            # 新插入的行期末等于期初，保持 期末 = 期初 + 本年发生额
+            sql = """
+                INSERT INTO account_balances (account_code, fiscal_year, opening_balance, closing_balance)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    closing_balance = closing_balance - opening_balance + VALUES(opening_balance),
+                    opening_balance = VALUES(opening_balance)
+            """
+            data_to_insert = [(item['account_code'], year, item['balance'], item['balance']) for item in balances]
+            cursor.executemany(sql, data_to_insert)
+            conn.commit()
+            bump_ledger_version(int(year))
+            return jsonify({"message": f"{year}年度的期初余额已成功保存"})
+        except archive.ArchivedYearError as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 409
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": f"保存期初余额失败: {e}"}), 500
+
+@app.route("/api/year_end/close", methods=['POST'])
+def close_year_api():
+    """
+    年末结转：把 year 年末余额结转为下一年度期初（损益类科目转入留存收益）。
+    可选 to_year 连续结转多个年度；期末余额未变化的年度自动跳过，force 为 true 时全部重新结转；
+    retained_earnings_account 可临时指定留存收益科目。
+    """
+    data = request.get_json(silent=True) or {}
     try:
-        sql = """
-            INSERT INTO account_balances (account_code, fiscal_year, opening_balance)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE opening_balance = VALUES(opening_balance)
-        """
-        data_to_insert = [(item['account_code'], year, item['balance']) for item in balances]
-        cursor.executemany(sql, data_to_insert)
-        conn.commit()
-        return jsonify({"message": f"{year}年度的期初余额已成功保存"})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"保存期初余额失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        year = int(data.get('year'))
+        to_year = int(data['to_year']) if data.get('to_year') else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "必须提供年份"}), 400
+
+    with db_cursor() as (conn, cursor):
+        try:
+            results = year_end.close_years(conn, year, to_year, force=bool(data.get('force')),
+                                           retained_account=data.get('retained_earnings_account'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": f"年末结转失败: {e}"}), 500
+    for result in results:
+        if result["status"] == "closed":
+            bump_ledger_version(result["year"] + 1)
+    closed = [r["year"] for r in results if r["status"] == "closed"]
+    message = f"已结转 {', '.join(map(str, closed))} 年度" if closed else "各年度期末余额均未变化，无需结转"
+    return jsonify({"message": message, "results": results})
+
+@app.route("/api/year_end/closes", methods=['GET'])
+def get_year_end_closes_api():
+    """各年度最近一次结转的记录"""
+    with db_cursor(dictionary=True) as (conn, cursor):
+        try:
+            cursor.execute("SELECT fiscal_year, net_income, accounts, closed_at FROM year_end_closes "
+                           "ORDER BY fiscal_year")
+            return jsonify(cursor.fetchall())
+        except Exception as e:
+            return jsonify({"error": f"查询结转记录失败: {e}"}), 500
+
+@app.route("/api/year_end/archive", methods=['POST'])
+def archive_year_api():
+    """
+    提交归档任务（202）：把已结转年度的凭证和分录移到归档表，该年度的科目余额成为只读快照。
+    要求该年度已年末结转且试算平衡检查通过，force 为 true 时跳过检查。
+    进度和结果通过 GET /api/jobs/<job_id> 查询；中断的归档再次提交会继续。
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        year = int(data.get('year'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "必须提供年份"}), 400
+
+    job, coalesced = jobs.runner.submit(
+        'archive_year', ('archive_year', year),
+        lambda job: run_archive_year(job, year, bool(data.get('force'))), {"year": year})
+    payload = job.to_dict()
+    payload.update({"coalesced": coalesced, "status_url": f"/api/jobs/{job.id}",
+                    "message": f"{year}年度归档任务已{'在执行中' if coalesced else '提交'}"})
+    return jsonify(payload), 202
+
+def run_archive_year(job, year, force):
+    """后台任务：归档指定年度"""
+    job.progress(5, "正在检查结转记录和试算平衡" if not force else "正在检查结转记录")
+    with db_cursor() as (conn, cursor):
+        result = archive.archive_year(
+            conn, year, force=force,
+            progress=lambda moved: job.progress(50, f"已搬移 {moved} 张凭证"))
+    result["message"] = f"{year}年度已归档，共 {result['voucher_count']} 张凭证"
+    return result
+
+@app.route("/api/year_end/archives", methods=['GET'])
+def get_year_end_archives_api():
+    """已归档（含归档中）的年度"""
+    with db_cursor(dictionary=True) as (conn, cursor):
+        try:
+            return jsonify(archive.list_archives(cursor))
+        except Exception as e:
+            return jsonify({"error": f"查询归档记录失败: {e}"}), 500
 
 
 # --- 财务报表生成的 API 路由 ---
 
 @app.route("/api/reports/generate_summary", methods=['POST'])
 def generate_summary_api():
-    """调用存储过程，计算指定年度的科目汇总数据"""
-    data = request.get_json()
-    year = data.get('year')
-    if not year:
+    """
+    提交年度科目汇总的后台任务，立即返回任务编号（202）。
+    同一年度已有排队或运行中的汇总任务时，直接返回该任务（coalesced 为 true）。
+    前端通过 GET /api/jobs/<job_id> 轮询进度和结果。
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        year = int(data.get('year'))
+    except (TypeError, ValueError):
         return jsonify({"error": "必须提供年份"}), 400
-    
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor()
+
+    job, coalesced = jobs.runner.submit(
+        'generate_summary', ('generate_summary', year),
+        lambda job: run_generate_summary(job, year), {"year": year})
+    payload = job.to_dict()
+    payload.update({"coalesced": coalesced, "status_url": f"/api/jobs/{job.id}",
+                    "message": f"{year}年度科目汇总任务已{'在执行中' if coalesced else '提交'}"})
+    return jsonify(payload), 202
+
+def run_generate_summary(job, year):
+    """后台任务：调用存储过程重新计算指定年度的科目汇总"""
+    job.progress(5, "等待数据库连接")
+    with db_cursor() as (conn, cursor):
+        try:
+            archive.ensure_writable(cursor, year)
+            job.progress(10, "正在执行 proc_generate_account_summary")
+            cursor.callproc('proc_generate_account_summary', (year,))
+            job.progress(90, "正在提交")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    bump_ledger_version(year)
+    return {"year": year, "message": f"{year}年度科目汇总数据已生成"}
+
+@app.route("/api/jobs/<job_id>", methods=['GET'])
+def get_job_api(job_id):
+    """
+    查询后台任务的状态、进度和结果。
+    可选参数 ?wait=秒数（最多 30）：任务未结束时最多等待这么久再返回，减少轮询次数。
+    """
     try:
-        cursor.callproc('proc_generate_account_summary', (year,))
-        conn.commit()
-        return jsonify({"message": f"{year}年度科目汇总数据已生成"})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"汇总计算失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        wait = min(max(float(request.args.get('wait', 0)), 0), 30)
+    except ValueError:
+        return jsonify({"error": "wait 必须是数字"}), 400
+    job = jobs.runner.wait(job_id, wait) if wait else jobs.runner.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(job.to_dict())
 
-@app.route("/api/reports/account_summary", methods=['GET'])
-def get_account_summary_api():
-    """获取指定年度的科目汇总表数据"""
-    year = request.args.get('year', type=int)
-    if not year:
-        return jsonify({"error": "必须提供年份参数"}), 400
+@app.route("/api/jobs", methods=['GET'])
+def list_jobs_api():
+    """最近的后台任务（新的在前），可用 ?kind= 过滤"""
+    return jsonify([job.to_dict() for job in jobs.runner.recent(request.args.get('kind'))])
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
+def report_period():
+    """
+    报表期间参数：?year=（全年）、?period=YYYY-MM（单月）或 ?from=YYYY-MM&to=YYYY-MM（月份区间）。
+    返回 (年度, 月份区间或 None)，参数不合法时抛出 ValueError。
+    """
+    return report_engine.parse_period_args(request.args)
+
+def report_scope():
+    """
+    报表的年度范围：返回 (年度, 月份区间或 None, 对比年度列表或 None)。
+    ?years=2021-2025 或 ?years=2023,2024,2025 为多年度对比（年度取最后一年），否则同 report_period()。
+    """
+    years = report_engine.parse_years_arg(request.args)
+    if years is not None:
+        return years[-1], None, years
+    return (*report_period(), None)
+
+def report_plan(report, year, years):
+    """返回 (生成函数, 报表读取的年度, 出错提示)；years 不为空时生成多年度对比报表"""
+    build, depends_on_years, error_label = REPORT_BUILDERS[report]
+    if years is None:
+        return build, depends_on_years(year), error_label
+    if report not in report_engine.STATEMENTS:
+        raise ValueError(f"{report} 不支持多年度对比（years 参数）")
+    # 对比报表只由 Python 引擎生成：一条查询读取全部年度，每个年度一列
+    comparative = lambda cursor, year, months, use_python: report_engine.comparative_report(cursor, report, years)
+    return comparative, tuple(years), error_label
+
+def cached_report_lookup(report, year, depends_on_years):
+    """
+    查找报表缓存。返回 (缓存键, 响应)，未命中时响应为 None。
+    depends_on_years 为报表读取的年度，任一年度的账簿版本变化都会使缓存失效。
+    """
+    params = [(k, v) for k, v in request.args.items() if k != 'year']
+    key = report_key(report, year, depends_on_years, params)
+    entry = report_cache.get(key)
+    return key, (report_cache_response(entry) if entry is not None else None)
+
+def store_report(key, report_data):
+    """把报表数据序列化后放入缓存，并返回响应"""
+    entry = report_cache.put(key, app.json.response(report_data).get_data())
+    return report_cache_response(entry)
+
+def report_cache_response(entry):
+    if request.if_none_match.contains_weak(entry.etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# --- 报表生成函数：单张报表接口和 /api/reports/bundle 共用，不依赖请求上下文 ---
+
+def build_account_summary(cursor, year, months, use_python):
+    """科目汇总表：全年取 account_balances，期间汇总合并年初余额与按月发生额"""
+    if months is not None:
+        tree = account_tree.get_account_tree(cursor)
+        snapshot = report_engine.load_period_balances(cursor, tree, year, *months)
+        return report_engine.account_summary(snapshot, tree)
+    sql = """
+        SELECT ab.account_code, coa.account_name, ab.opening_balance, 
+               ab.period_debit, ab.period_credit, ab.closing_balance
+        FROM account_balances ab
+        JOIN chart_of_accounts coa ON ab.account_code = coa.account_code
+        WHERE ab.fiscal_year = %s ORDER BY ab.account_code;
+    """
+    cursor.execute(sql, (year,))
+    return cursor.fetchall()
+
+def statement_builder(report, procedure):
+    """三大报表：期间报表只能由 Python 引擎合并期间行计算，全年报表按引擎开关选择"""
+    def build(cursor, year, months, use_python):
+        if months is not None or use_python:
+            return report_engine.generate_report(cursor, report, year, months)
+        # 存储过程在本会话的临时表中生成报表，并直接以结果集返回
+        return call_procedure(cursor, procedure, (year,))
+    return build
+
+def build_cash_flow_statement(cursor, year, months, use_python):
+    rows = statement_builder('cash_flow_statement', 'proc_generate_cash_flow_statement')(
+        cursor, year, months, use_python)
+    return [{"item": r["item"], "current_period_amount": r["current_period_amount"],
+             "prior_period_amount": r["prior_period_amount"]} for r in rows]
+
+# 报表名 -> (生成函数, 报表读取的年度, 出错时的提示)
+# 资产负债表的期初数、现金流量表的上期金额取自上一年度，因此两个年度的变化都会使其缓存失效
+REPORT_BUILDERS = {
+    'account_summary': (build_account_summary, lambda year: (year,), "获取科目汇总表失败"),
+    'balance_sheet': (statement_builder('balance_sheet', 'proc_generate_balance_sheet'),
+                      lambda year: (year - 1, year), "获取报表失败"),
+    'income_statement': (statement_builder('income_statement', 'proc_generate_income_statement'),
+                         lambda year: (year,), "获取报表失败"),
+    'cash_flow_statement': (build_cash_flow_statement, lambda year: (year - 1, year), "获取现金流量表失败"),
+}
+
+def serve_report(report):
+    """单张报表接口：解析期间（或对比年度）参数、查缓存，未命中时生成并放入缓存"""
     try:
-        sql = """
-            SELECT ab.account_code, coa.account_name, ab.opening_balance, 
-                   ab.period_debit, ab.period_credit, ab.closing_balance
-            FROM account_balances ab
-            JOIN chart_of_accounts coa ON ab.account_code = coa.account_code
-            WHERE ab.fiscal_year = %s ORDER BY ab.account_code;
-        """
-        cursor.execute(sql, (year,))
-        summary_data = cursor.fetchall()
-        return jsonify(summary_data)
-    except Exception as e:
-        return jsonify({"error": f"获取科目汇总表失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        year, months, years = report_scope()
+        build, depends_on_years, error_label = report_plan(report, year, years)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cache_key, cached = cached_report_lookup(report, year, depends_on_years)
+    if cached is not None: return cached
+
+    with read_cursor(dictionary=True) as (conn, cursor):
+        try:
+            data = build(cursor, year, months, use_python_report_engine())
+            if db_utils.replica_may_lag(conn):
+                return jsonify(data)   # 从库可能还没有刚提交的写入，不按新版本缓存
+            return store_report(cache_key, data)
+        except Exception as e:
+            return jsonify({"error": f"{error_label}: {e}"}), 500
+
+def use_python_report_engine():
+    """报表引擎开关：默认取 config.REPORT_ENGINE，可用 ?engine=python|procedure 临时切换"""
+    return request.args.get('engine', REPORT_ENGINE) == 'python'
+
+@app.route("/api/reports/account_summary", methods=['GET'])
+def get_account_summary_api():
+    """获取指定年度（或期间）的科目汇总表数据"""
+    return serve_report('account_summary')
 
 @app.route("/api/reports/balance_sheet", methods=['GET'])
 def get_balance_sheet_api():
     """获取资产负债表数据"""
-    year = request.args.get('year', type=int)
-    if not year: return jsonify({"error": "必须提供年份参数"}), 400
-
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
-    try:
-        # 注意: 某些数据库驱动可能需要分别处理callproc和后续查询
-        cursor.callproc('proc_generate_balance_sheet', (year,))
-        # 清理可能存在的上一个查询结果
-        for _ in cursor.stored_results():
-            pass
-        cursor.execute("SELECT * FROM balance_sheet_report ORDER BY line_index;")
-        report_data = cursor.fetchall()
-        return jsonify(report_data)
-    except Exception as e:
-        return jsonify({"error": f"获取报表失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    return serve_report('balance_sheet')
 
 @app.route("/api/reports/income_statement", methods=['GET'])
 def get_income_statement_api():
     """获取利润表数据"""
-    year = request.args.get('year', type=int)
-    if not year: return jsonify({"error": "必须提供年份参数"}), 400
-        
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.callproc('proc_generate_income_statement', (year,))
-        for _ in cursor.stored_results():
-            pass
-        cursor.execute("SELECT * FROM income_statement_report ORDER BY line_index;")
-        report_data = cursor.fetchall()
-        return jsonify(report_data)
-    except Exception as e:
-        return jsonify({"error": f"获取报表失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    return serve_report('income_statement')
 
 @app.route("/api/reports/cash_flow_statement", methods=['GET'])
 def get_cash_flow_statement_api():
     """获取现金流量表数据"""
-    year = request.args.get('year', type=int)
-    if not year: return jsonify({"error": "必须提供年份参数"}), 400
-    
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
+    return serve_report('cash_flow_statement')
+
+@app.route("/api/reports/bundle", methods=['GET'])
+def get_report_bundle_api():
+    """
+    一次获取多张报表：?year=...&reports=account_summary,balance_sheet,...（默认全部）。
+    期间参数和多年度对比参数（years）与单张报表接口相同。各报表在独立的线程和连接池连接上并行生成，
+    总耗时取决于最慢的一张；缓存命中的报表直接复用缓存内容。
+    返回 {"year", "reports": {名称: 数据}, "errors": {名称: 错误}, "timings": {名称: {seconds, cached}}, "total_seconds"}。
+    """
+    started = time.perf_counter()
+    try:
+        year, months, years = report_scope()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    default_reports = report_engine.STATEMENTS if years is not None else REPORT_BUILDERS
+    names = [name for name in request.args.get('reports', ','.join(default_reports)).split(',') if name]
+    unknown = [name for name in names if name not in REPORT_BUILDERS]
+    if unknown or not names:
+        return jsonify({"error": f"reports 只能是 {', '.join(REPORT_BUILDERS)} 中的一个或多个"}), 400
+    names = list(dict.fromkeys(names))
+    try:
+        plans = {name: report_plan(name, year, years) for name in names}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 缓存键与单张报表接口一致（排除 year 和 reports 参数），两边可以互相命中
+    params = [(k, v) for k, v in request.args.items() if k not in ('year', 'reports')]
+    use_python = use_python_report_engine()
+    route = metrics.current_route()
+    pinned_until = db_utils.read_pinned_until()
+    futures = {}
+    for name, (build, depends_on_years, error_label) in plans.items():
+        key = report_key(name, year, depends_on_years, params)
+        futures[name] = report_bundle_executor.submit(
+            build_bundled_report, build, error_label, key, year, months, use_python, route, pinned_until)
+
+    bodies, errors, timings = {}, {}, {}
+    for name, future in futures.items():
+        body, error, timings[name] = future.result()
+        if error is None:
+            bodies[name] = body
+        else:
+            errors[name] = error
+    if not bodies:
+        return jsonify({"error": "；".join(errors.values())}), 500
+
+    # 各报表的 JSON 已在工作线程中序列化（或取自缓存），这里直接拼接，不再重复序列化
+    meta = app.json.dumps({"year": year, "years": years, "errors": errors, "timings": timings,
+                           "total_seconds": round(time.perf_counter() - started, 6)})
+    reports = b",".join(app.json.dumps(name).encode() + b":" + body.strip() for name, body in bodies.items())
+    return app.response_class(b'{"reports":{' + reports + b"}," + meta[1:].encode(), mimetype='application/json')
+
+def build_bundled_report(build, error_label, cache_key, year, months, use_python, route, pinned_until):
+    """
+    在工作线程中生成一张报表，返回 (JSON 字节串, 错误信息, 耗时)。
+    pinned_until 为请求线程的读己之写截止时间，工作线程按同样的规则选择主库或从库。
+    """
+    started = time.perf_counter()
+    entry = report_cache.get(cache_key)
+    if entry is not None:
+        return entry.body, None, {"seconds": round(time.perf_counter() - started, 6), "cached": True}
+    metrics.set_route(route)
+    db_utils.begin_session(pinned_until)
     try:
-        cursor.callproc('proc_generate_cash_flow_statement', (year,))
-        for _ in cursor.stored_results():
-            pass
-        cursor.execute("SELECT item, current_period_amount FROM cash_flow_statement_report ORDER BY line_index;")
-        report_data = cursor.fetchall()
-        return jsonify(report_data)
+        with read_cursor(dictionary=True) as (conn, cursor):
+            data = build(cursor, year, months, use_python)
+            lagging = db_utils.replica_may_lag(conn)
+        body = app.json.response(data).get_data()
+        if not lagging:
+            body = report_cache.put(cache_key, body).body
+        error = None
     except Exception as e:
-        return jsonify({"error": f"获取现金流量表失败: {e}"}), 500
+        body, error = None, f"{error_label}: {e}"
     finally:
-        cursor.close()
-        conn.close()
+        metrics.clear_route()
+        db_utils.end_session()
+    return body, error, {"seconds": round(time.perf_counter() - started, 6), "cached": False}
 
 @app.route("/api/reports/trial_balance", methods=['GET'])
 def get_trial_balance_api():
-    """获取试算平衡表数据"""
+    """
+    获取试算平衡表及账簿完整性检查结果（trial_balance.py）：
+    分录分批遍历一次得到全账和各科目发生额并找出问题凭证，再对照科目余额表检查。
+    结果按年度的账簿版本缓存。
+    """
     year = request.args.get('year', type=int)
     if not year:
         return jsonify({"error": "必须提供年份参数"}), 400
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
+    cache_key, cached = cached_report_lookup('trial_balance', year, (year,))
+    if cached is not None: return cached
     try:
-        cursor.callproc('proc_generate_trial_balance', (year,))
-        cursor.execute("SELECT * FROM trial_balance_report;")
-        report_data = cursor.fetchall()
-        conn.commit() # 确保存储过程的结果对当前会话可见
-        return jsonify(report_data)
+        return store_report(cache_key, trial_balance.run_trial_balance(year))
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         return jsonify({"error": f"获取试算平衡表失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 # ==========================================
 # 10.3 记账凭证功能后端实现
@@ -389,119 +735,135 @@ def voucher_new_page():
 
 @app.route("/api/vouchers", methods=['GET'])
 def get_vouchers_api():
-    """【API】获取凭证列表（含合计金额）"""
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
+    """
+    【API】分页获取凭证列表（含合计金额）
+    查询参数：limit（每页条数）、cursor（上一页返回的 next_cursor）、
+    date_from / date_to（日期范围）、type（凭证字）、account_code（含下级科目）
+    """
     try:
-        # SQL说明：查询凭证主表，并通过子查询计算每张凭证的借方合计
-        sql = """
-            SELECT 
-                v.id,
-                v.voucher_date,
-                CONCAT(v.voucher_type, '-', LPAD(v.voucher_number, 4, '0')) as voucher_ref,
-                v.summary,
-                (SELECT SUM(je.debit_amount) FROM journal_entries je WHERE je.voucher_id = v.id) as total_amount
-            FROM vouchers v
-            ORDER BY v.voucher_date DESC, v.voucher_number DESC;
-        """
-        cursor.execute(sql)
-        vouchers = cursor.fetchall()
-        return jsonify(vouchers)
-    except Exception as e:
-        return jsonify({"error": f"查询凭证列表失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        filters = voucher_queries.parse_list_args(request.args)
+    except voucher_queries.InvalidQueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with read_cursor(dictionary=True) as (conn, cursor):
+        try:
+            account_codes = None
+            if filters["account_code"]:
+                tree = account_tree.get_account_tree(cursor)
+                if filters["account_code"] not in tree:
+                    return jsonify({"error": "未找到该科目"}), 404
+                account_codes = [filters["account_code"]] + tree.descendants(filters["account_code"])
+
+            # 翻页时游标之后的凭证不会晚于游标日期，据此判断是否需要查询归档表
+            date_to = filters["date_to"]
+            if filters["cursor"]:
+                date_to = min(date_to, filters["cursor"][0]) if date_to else filters["cursor"][0]
+            sources = archive.table_sources(cursor, filters["date_from"], date_to)
+
+            # SQL说明：合计金额取自凭证主表中保存凭证时写入的 total_amount，不再逐行子查询
+            sql, params = voucher_queries.build_list_query(filters, account_codes, sources)
+            cursor.execute(sql, params)
+            vouchers, next_cursor = voucher_queries.paginate(cursor.fetchall(), filters["limit"])
+            return jsonify({"vouchers": vouchers, "next_cursor": next_cursor})
+        except Exception as e:
+            return jsonify({"error": f"查询凭证列表失败: {e}"}), 500
 
 @app.route("/api/vouchers/<int:voucher_id>", methods=['GET'])
 def get_voucher_details_api(voucher_id):
     """【API】获取单张凭证的详细信息（头+分录）"""
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor(dictionary=True)
+    with read_cursor(dictionary=True) as (conn, cursor):
+        try:
+            # 1. 查询凭证头（当前表没有时再查已归档年度的凭证）
+            tables = archive.CURRENT
+            cursor.execute("SELECT * FROM vouchers WHERE id = %s", (voucher_id,))
+            header = cursor.fetchone()
+            if not header:
+                tables = archive.ARCHIVE
+                cursor.execute("SELECT * FROM vouchers_archive WHERE id = %s", (voucher_id,))
+                header = cursor.fetchone()
+            if not header:
+                return jsonify({"error": "未找到该凭证"}), 404
+
+            # 2. 查询该凭证关联的所有会计分录
+            sql_entries = f"""
+                SELECT je.*, coa.account_name 
+                FROM {tables[1]} je
+                JOIN chart_of_accounts coa ON je.account_code = coa.account_code
+                WHERE je.voucher_id = %s 
+                ORDER BY je.id;
+            """
+            cursor.execute(sql_entries, (voucher_id,))
+            entries = cursor.fetchall()
+
+            return jsonify({ "header": header, "entries": entries })
+        except Exception as e:
+            return jsonify({"error": f"查询凭证详情失败: {e}"}), 500
+
+@app.route("/api/vouchers/details", methods=['GET', 'POST'])
+def get_vouchers_details_api():
+    """
+    【API】批量获取凭证详情（头+分录）：按 ids 或 date_from ~ date_to 筛选，
+    两条查询取出全部凭证，边读边按凭证分组输出；format 可选 ndjson（默认）、json、csv、xlsx。
+    id 较多时可以 POST JSON 请求体 {"ids": [...], "format": ...}。
+    """
+    args = request.args
+    if request.method == 'POST':
+        args = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+    try:
+        params = voucher_export.parse_export_args(args)
+    except voucher_queries.InvalidQueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+    tree = account_tree.get_account_tree()
+    chunks = voucher_export.stream_vouchers(tree, params)
     try:
-        # 1. 查询凭证头
-        cursor.execute("SELECT * FROM vouchers WHERE id = %s", (voucher_id,))
-        header = cursor.fetchone()
-        if not header:
-            return jsonify({"error": "未找到该凭证"}), 404
-
-        # 2. 查询该凭证关联的所有会计分录
-        sql_entries = """
-            SELECT je.*, coa.account_name 
-            FROM journal_entries je
-            JOIN chart_of_accounts coa ON je.account_code = coa.account_code
-            WHERE je.voucher_id = %s 
-            ORDER BY je.id;
-        """
-        cursor.execute(sql_entries, (voucher_id,))
-        entries = cursor.fetchall()
-
-        return jsonify({ "header": header, "entries": entries })
+        # 先取出第一段，数据库错误在发送响应头之前就能返回 500
+        first = next(chunks)
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        return jsonify({"error": f"查询凭证详情失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        chunks.close()
+        return jsonify({"error": f"批量获取凭证详情失败: {e}"}), 500
+
+    def generate():
+        yield first
+        yield from chunks
+
+    response = Response(stream_with_context(generate()), mimetype=voucher_export.MIMETYPES[params['format']])
+    if params['format'] in ('csv', 'xlsx'):
+        response.headers['Content-Disposition'] = f"attachment; filename={voucher_export.export_filename(params)}"
+    return response
 
 # --- 关键补丁：获取末级科目接口 ---
 @app.route("/api/accounts/leaf", methods=['GET'])
 def get_leaf_accounts_api():
-    """【API】获取所有末级科目（用于录入页面的下拉框）"""
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    cursor = conn.cursor(dictionary=True)
+    """【API】获取所有末级科目（用于录入页面的下拉框，从内存科目树读取）"""
     try:
-        # SQL逻辑：找出那些没有出现在 parent_code 列中的科目
-        sql = """
-            SELECT account_code, account_name 
-            FROM chart_of_accounts 
-            WHERE account_code NOT IN (
-                SELECT DISTINCT parent_code FROM chart_of_accounts WHERE parent_code IS NOT NULL
-            )
-            ORDER BY account_code;
-        """
-        cursor.execute(sql)
-        accounts = cursor.fetchall()
-        return jsonify(accounts)
+        tree = account_tree.get_account_tree()
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         return jsonify({"error": f"获取末级科目失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    return cached_json_response(tree.etag + "-leaf", tree.leaf_accounts)
 
 @app.route("/api/vouchers/next_number", methods=['GET'])
 def get_next_voucher_number_api():
-    """【API】获取下一个可用的凭证号"""
+    """【API】预览下一个凭证号（仅供显示，实际号码在保存凭证时分配）"""
     voucher_date_str = request.args.get('date')
     voucher_type = request.args.get('type')
 
     if not voucher_date_str or not voucher_type:
         return jsonify({"error": "必须提供日期和凭证字参数"}), 400
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-
-    cursor = conn.cursor()
-    try:
-        # 统计当月该字号下的最大凭证号
-        sql = """
-            SELECT MAX(voucher_number) FROM vouchers
-            WHERE voucher_type = %s AND DATE_FORMAT(voucher_date, '%%Y-%%m') = DATE_FORMAT(%s, '%%Y-%%m');
-        """
-        cursor.execute(sql, (voucher_type, voucher_date_str))
-        max_number = cursor.fetchone()[0]
-
-        next_number = (max_number or 0) + 1
-        return jsonify({"next_number": next_number})
-    except Exception as e:
-        return jsonify({"error": f"计算凭证号失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    with db_cursor() as (conn, cursor):
+        try:
+            # 读取该凭证字当月的号码序列（主键查询）
+            next_number = voucher_numbers.peek_next_number(cursor, voucher_type, voucher_date_str)
+            return jsonify({"next_number": next_number})
+        except ValueError:
+            return jsonify({"error": "日期格式应为 YYYY-MM-DD"}), 400
+        except Exception as e:
+            return jsonify({"error": f"计算凭证号失败: {e}"}), 500
 
 @app.route("/api/vouchers", methods=['POST'])
 def create_voucher_api():
@@ -515,55 +877,182 @@ def create_voucher_api():
     if not header or not entries:
         return jsonify({"error": "凭证头或分录数据缺失"}), 400
 
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor()
+    with db_cursor() as (conn, cursor):
+        try:
+            # --- 核心：启动事务 ---
+            conn.start_transaction()
+            archive.ensure_writable(cursor, int(str(header['date'])[:4]))
+
+            # 1. 在本事务中取号：序列行锁持有到提交，并发保存不会拿到相同的凭证号
+            voucher_number = voucher_numbers.allocate_number(cursor, header['type'], header['date'])
+
+            # 2. 插入凭证主表（同时保存借方合计，供凭证列表直接读取）
+            total_amount = sum(ledger_balances.to_decimal(e.get('debit')) for e in entries)
+            sql_header = "INSERT INTO vouchers (voucher_date, voucher_type, voucher_number, summary, total_amount) VALUES (%s, %s, %s, %s, %s)"
+            cursor.execute(sql_header, (header['date'], header['type'], voucher_number, header['summary'], total_amount))
+            voucher_id = cursor.lastrowid # 获取生成的主键 ID
+
+            # 3. 批量插入分录明细表
+            sql_entries = "INSERT INTO journal_entries (voucher_id, account_code, summary, debit_amount, credit_amount) VALUES (%s, %s, %s, %s, %s)"
+            entry_data = [(voucher_id, e['account_code'], e['summary'], e['debit'], e['credit']) for e in entries]
+            cursor.executemany(sql_entries, entry_data)
+
+            # 4. 增量模式：在同一事务中把发生额累加到末级科目及其所有上级科目
+            if INCREMENTAL_BALANCES:
+                tree = account_tree.get_account_tree(cursor)
+                ledger_balances.apply_voucher_entries(cursor, tree, header['date'], entries)
+
+            # 5. 提交事务
+            conn.commit()
+            bump_ledger_version(int(str(header['date'])[:4]))
+            voucher_ref = f"{header['type']}-{voucher_number:04d}"
+            return jsonify({"message": f"凭证保存成功，凭证号 {voucher_ref}", "voucher_id": voucher_id,
+                            "voucher_number": voucher_number}), 201
+        except archive.ArchivedYearError as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 409
+        except Exception as e:
+            # 出错则回滚，确保数据一致性
+            conn.rollback() 
+            return jsonify({"error": f"凭证保存失败: {e}"}), 500
+
+@app.route("/api/vouchers/import", methods=['POST'])
+def import_vouchers_api():
+    """
+    【API】批量导入凭证：请求体为 CSV 或 NDJSON 原始内容，边读边解析、分批提交。
+    格式由 ?format= 或 Content-Type 指定；?batch_size= 可覆盖每个事务的凭证数。
+    """
+    fmt = request.args.get('format') or voucher_import.guess_format(request.mimetype)
+    if fmt not in voucher_import.FORMATS:
+        return jsonify({"error": "请通过 format 参数或 Content-Type 指定 csv 或 ndjson 格式"}), 400
+    try:
+        batch_size = int(request.args['batch_size']) if request.args.get('batch_size') else None
+    except ValueError:
+        return jsonify({"error": "batch_size 必须是整数"}), 400
+
+    rejects = []
+    def collect_reject(record):
+        if len(rejects) < IMPORT_CONFIG['max_reported_rejects']:
+            rejects.append(record)
+
+    lines = codecs.getreader('utf-8-sig')(request.stream)
     try:
-        # --- 核心：启动事务 ---
-        conn.start_transaction()
-
-        # 1. 插入凭证主表
-        sql_header = "INSERT INTO vouchers (voucher_date, voucher_type, voucher_number, summary) VALUES (%s, %s, %s, %s)"
-        cursor.execute(sql_header, (header['date'], header['type'], header['number'], header['summary']))
-        voucher_id = cursor.lastrowid # 获取生成的主键 ID
-
-        # 2. 批量插入分录明细表
-        sql_entries = "INSERT INTO journal_entries (voucher_id, account_code, summary, debit_amount, credit_amount) VALUES (%s, %s, %s, %s, %s)"
-        entry_data = [(voucher_id, e['account_code'], e['summary'], e['debit'], e['credit']) for e in entries]
-        cursor.executemany(sql_entries, entry_data)
-
-        # 3. 提交事务
-        conn.commit()
-        return jsonify({"message": "凭证保存成功", "voucher_id": voucher_id}), 201
+        stats = voucher_import.import_vouchers(lines, fmt, collect_reject, batch_size=batch_size)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"导入文件无法解析: {e}"}), 400
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        # 出错则回滚，确保数据一致性
-        conn.rollback() 
-        return jsonify({"error": f"凭证保存失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        return jsonify({"error": f"凭证导入失败: {e}"}), 500
+    return jsonify({"stats": stats, "rejects": rejects})
 
 @app.route("/api/vouchers/<int:voucher_id>", methods=['DELETE'])
 def delete_voucher_api(voucher_id):
     """【API】删除凭证"""
-    conn = get_db_connection()
-    if conn is None: return jsonify({"error": "数据库连接失败"}), 500
-    
-    cursor = conn.cursor()
+    with db_cursor() as (conn, cursor):
+        try:
+            conn.start_transaction()
+            # 增量模式：删除前先冲回该凭证对科目余额的影响
+            if INCREMENTAL_BALANCES:
+                tree = account_tree.get_account_tree(cursor)
+                voucher_date = ledger_balances.reverse_voucher(cursor, tree, voucher_id)
+            else:
+                cursor.execute("SELECT voucher_date FROM vouchers WHERE id = %s FOR UPDATE", (voucher_id,))
+                row = cursor.fetchone()
+                voucher_date = row[0] if row else None
+            if voucher_date is None:
+                conn.rollback()
+                cursor.execute("SELECT voucher_date FROM vouchers_archive WHERE id = %s", (voucher_id,))
+                row = cursor.fetchone()
+                if row:
+                    return jsonify({"error": f"{row[0].year} 年度已归档，账簿为只读快照，不能删除凭证"}), 409
+                return jsonify({"error": "未找到该凭证"}), 404
+            archive.ensure_writable(cursor, voucher_date.year)
+            cursor.execute("DELETE FROM vouchers WHERE id = %s", (voucher_id,))
+            conn.commit()
+            if cursor.rowcount > 0:
+                bump_ledger_version(voucher_date.year)
+                return jsonify({"message": "凭证删除成功"})
+            else:
+                return jsonify({"error": "未找到该凭证"}), 404
+        except archive.ArchivedYearError as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 409
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": f"删除失败: {e}"}), 500
+
+@app.route("/api/ledger/<string:account_code>", methods=['GET'])
+def get_account_ledger_api(account_code):
+    """
+    【API】科目明细账：科目及其全部下级科目在 date_from ~ date_to 之间的分录和逐笔余额。
+    结果边查边以 NDJSON（默认）或分块 JSON 输出。
+    """
     try:
-        cursor.execute("DELETE FROM vouchers WHERE id = %s", (voucher_id,))
-        conn.commit()
-        if cursor.rowcount > 0:
-            return jsonify({"message": "凭证删除成功"})
-        else:
-            return jsonify({"error": "未找到该凭证"}), 404
+        params = account_ledger.parse_ledger_args(request.args)
+    except voucher_queries.InvalidQueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+    tree = account_tree.get_account_tree()
+    if account_code not in tree:
+        return jsonify({"error": "未找到该科目"}), 404
+
+    chunks = account_ledger.stream_ledger(account_code, tree, params['date_from'], params['date_to'], params['format'])
+    try:
+        # 先取出第一段（期初余额），数据库错误在发送响应头之前就能返回 500
+        first = next(chunks)
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
-        conn.rollback()
-        return jsonify({"error": f"删除失败: {e}"}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        chunks.close()
+        return jsonify({"error": f"获取明细账失败: {e}"}), 500
+
+    def generate():
+        yield first
+        yield from chunks
+
+    mimetype = 'application/x-ndjson' if params['format'] == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+@app.route("/metrics", methods=['GET'])
+def metrics_api():
+    """Prometheus 文本格式的运行指标（接口、SQL、连接池、报表缓存）"""
+    extra = []
+    pool_stats = db_utils.get_all_pool_stats()
+    for name in sorted(pool_stats[db_utils.PRIMARY]):
+        extra.append(f"# TYPE financial_db_pool_{name} gauge")
+        for target, stats in pool_stats.items():
+            extra.append(f'financial_db_pool_{name}{{target="{target}"}} {float(stats[name])}')
+    for name, value in sorted(report_cache.stats().items()):
+        if isinstance(value, (int, float)):
+            extra.append(f"# TYPE financial_report_cache_{name} gauge")
+            extra.append(f"financial_report_cache_{name} {float(value)}")
+    return Response(metrics.render_prometheus(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route("/api/system/db_pool", methods=['GET'])
+def get_db_pool_stats_api():
+    """
+    【API】查看数据库连接池的统计信息（借出次数、等待时间、耗尽次数等）。
+    顶层为主库连接池；targets 为主库和各从库的连接池，queries 为各目标数据库按操作类型的语句数，
+    read_routing 为读写分离的路由统计（读己之写、回退主库、从库连接失败次数）。
+    """
+    return jsonify({**get_pool_stats(), "targets": db_utils.get_all_pool_stats(),
+                    "queries": metrics.query_counts(), "read_routing": db_utils.read_router.stats()})
+
+@app.route("/api/reports/cache", methods=['GET'])
+def get_report_cache_stats_api():
+    """【API】查看报表缓存的命中、未命中、淘汰统计"""
+    return jsonify(report_cache.stats())
+
+@app.route("/api/reports/cache/pinned_years", methods=['POST'])
+def pin_report_cache_year_api():
+    """【API】钉住（或取消钉住）已结账年度的报表缓存，使其不被淘汰"""
+    data = request.get_json()
+    year = data.get('year') if data else None
+    if not year: return jsonify({"error": "必须提供年份"}), 400
+    pinned = bool(data.get('pinned', True))
+    report_cache.pin_year(int(year), pinned)
+    return jsonify({"message": f"{year}年度报表缓存已{'钉住' if pinned else '取消钉住'}"})
 
 if __name__ == '__main__':
     # 关键：设置 host='0.0.0.0' 以允许外部访问
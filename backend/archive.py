@@ -0,0 +1,270 @@
+# backend/archive.py
+"""
+已结转年度的归档：把一个年度的凭证和分录移到归档表，冻结该年度的科目余额。
+
+- 当前表（vouchers / journal_entries）只保留未归档年度的数据：当年的科目汇总、保存凭证、
+  凭证列表等操作的扫描量和缓冲池占用不再随历史年度增长；
+- 归档前提：该年度已年末结转（year_end_closes 有记录），且试算平衡检查全部通过（force 可跳过检查）；
+- 先写入 fiscal_year_archives（状态 archiving），此后该年度拒绝一切写入；再按凭证 id 分批搬移
+  （INSERT ... SELECT 到归档表，删除当前表中的分录和凭证），每批一个事务。
+  中途失败时状态停在 archiving，再次运行从剩余的凭证继续；
+- 归档完成后，该年度的 account_balances / account_period_balances 就是权威快照：
+  保存、导入、删除凭证，修改期初余额，重新汇总都会被拒绝（ArchivedYearError，接口返回 409）；
+  归档时记录余额指纹，verify_year 核对快照没有被改动；
+- 查询（凭证列表、凭证详情、批量取数、明细账、试算平衡）按日期区间判断是否涉及已归档年度，
+  涉及时用 UNION ALL 同时查询归档表，结果与归档前相同；不涉及时只查当前表。
+
+没有改为按年度分区：MySQL 的分区表不支持外键（journal_entries 需要 fk_entry_voucher 级联删除和
+fk_entry_account 科目校验），唯一键也必须包含分区列。归档表只在归档时写入，不需要这些约束。
+
+命令行：
+    python archive.py 2022              # 归档 2022 年度
+    python archive.py 2022 --verify     # 核对已归档年度的余额快照
+    python archive.py --list            # 列出已归档年度
+"""
+import argparse
+import time
+
+import trial_balance
+from config import ARCHIVE_CONFIG
+from db_utils import get_db_connection
+from report_cache import bump_ledger_version
+
+CURRENT = ("vouchers", "journal_entries")
+ARCHIVE = ("vouchers_archive", "journal_entries_archive")
+
+# 搬移时显式列出的列（voucher_period 是生成列，不能写入）
+VOUCHER_COLUMNS = "id, voucher_date, voucher_type, voucher_number, summary, total_amount, created_at, updated_at"
+ENTRY_COLUMNS = "id, voucher_id, account_code, summary, debit_amount, credit_amount"
+
+
+class ArchivedYearError(ValueError):
+    """要写入的年度已归档（接口返回 409）"""
+
+
+def scalar(row):
+    """取一行的第一列，普通游标和字典游标都适用"""
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def archived_years(cursor):
+    """已归档（含归档中）的年度集合"""
+    cursor.execute("SELECT fiscal_year FROM fiscal_year_archives")
+    return {scalar(row) for row in cursor.fetchall()}
+
+
+def ensure_writable(cursor, year):
+    """
+    year 已归档（或正在归档）时抛出 ArchivedYearError。
+    在写入事务中调用：共享锁（记录不存在时为间隙锁）持有到提交，
+    归档写入 fiscal_year_archives 时会等待本事务结束，本事务写入的凭证也会被一并归档。
+    """
+    cursor.execute("SELECT status FROM fiscal_year_archives WHERE fiscal_year = %s LOCK IN SHARE MODE", (year,))
+    if cursor.fetchone() is not None:
+        raise ArchivedYearError(f"{year} 年度已归档，账簿为只读快照，不能再修改")
+
+
+def table_sources(cursor, date_from=None, date_to=None):
+    """
+    查询日期区间（可以不限起止）涉及的 (凭证表, 分录表) 列表：
+    不涉及已归档年度时只有当前表，否则加上归档表。
+    """
+    conditions, params = [], []
+    if date_from:
+        conditions.append("fiscal_year >= %s")
+        params.append(date_from.year)
+    if date_to:
+        conditions.append("fiscal_year <= %s")
+        params.append(date_to.year)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    cursor.execute(f"SELECT COUNT(*) AS archived FROM fiscal_year_archives {where}", params)
+    return [CURRENT, ARCHIVE] if scalar(cursor.fetchone()) else [CURRENT]
+
+
+def union_all(template, params, sources):
+    """
+    把用 {vouchers}、{entries} 表示表名的查询按 sources 展开为 UNION ALL，参数按份数重复。
+    只有一个来源时原样返回，不加括号。
+    """
+    if len(sources) == 1:
+        vouchers, entries = sources[0]
+        return template.format(vouchers=vouchers, entries=entries), list(params)
+    sql = "\nUNION ALL\n".join(f"({template.format(vouchers=vouchers, entries=entries)})"
+                               for vouchers, entries in sources)
+    return sql, list(params) * len(sources)
+
+
+def balances_fingerprint(cursor, year):
+    """科目余额的指纹：行数、期末合计和逐科目 (期初, 借方, 贷方, 期末) 的 CRC 合计"""
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(closing_balance), 0),
+               COALESCE(SUM(CRC32(CONCAT_WS('|', account_code, opening_balance, period_debit,
+                                            period_credit, closing_balance))), 0)
+        FROM account_balances WHERE fiscal_year = %s
+    """, (year,))
+    count, total, checksum = cursor.fetchone()
+    return f"{count}:{total}:{checksum}"
+
+
+def check_archivable(cursor, year, force):
+    """归档前提：已年末结转；未指定 force 时试算平衡检查必须全部通过"""
+    cursor.execute("SELECT 1 FROM year_end_closes WHERE fiscal_year = %s", (year,))
+    if cursor.fetchone() is None:
+        raise ValueError(f"{year} 年度尚未年末结转，不能归档")
+    if force:
+        return
+    result = trial_balance.run_trial_balance(year)
+    if not result["ok"]:
+        counts = ", ".join(f"{trial_balance.ISSUE_TITLES[name]} {issue['count']}"
+                           for name, issue in result["issues"].items() if issue["count"])
+        raise ValueError(f"{year} 年度试算平衡检查未通过（{counts or '试算不平衡'}），"
+                         f"请先处理，或用 force 跳过检查")
+
+
+def move_batch(cursor, year, batch_size):
+    """把 year 的一批凭证（及其分录）移到归档表，返回 (凭证数, 分录数)；调用方负责提交"""
+    cursor.execute("""
+        SELECT id FROM vouchers
+        WHERE voucher_date >= %s AND voucher_date < %s
+        ORDER BY id LIMIT %s FOR UPDATE
+    """, (f"{year}-01-01", f"{year + 1}-01-01", batch_size))
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return 0, 0
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"INSERT INTO vouchers_archive ({VOUCHER_COLUMNS}) "
+                   f"SELECT {VOUCHER_COLUMNS} FROM vouchers WHERE id IN ({placeholders})", ids)
+    cursor.execute(f"INSERT INTO journal_entries_archive ({ENTRY_COLUMNS}) "
+                   f"SELECT {ENTRY_COLUMNS} FROM journal_entries WHERE voucher_id IN ({placeholders})", ids)
+    entries = cursor.rowcount
+    cursor.execute(f"DELETE FROM journal_entries WHERE voucher_id IN ({placeholders})", ids)
+    cursor.execute(f"DELETE FROM vouchers WHERE id IN ({placeholders})", ids)
+    return len(ids), entries
+
+
+def archive_year(conn, year, force=False, batch_size=None, progress=None):
+    """
+    归档 year 年度，返回统计信息。
+    progress(已搬移凭证数) 在每批提交后调用，可用于报告进度。
+    """
+    batch_size = batch_size or ARCHIVE_CONFIG['batch_vouchers']
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT status FROM fiscal_year_archives WHERE fiscal_year = %s", (year,))
+        row = cursor.fetchone()
+        if row and row[0] == 'archived':
+            raise ValueError(f"{year} 年度已归档")
+        resumed = row is not None
+        if not resumed:
+            check_archivable(cursor, year, force)
+            # 写入状态行后该年度即为只读（会等待持有共享锁的写入事务提交）
+            cursor.execute("INSERT INTO fiscal_year_archives (fiscal_year, status) VALUES (%s, 'archiving')",
+                           (year,))
+        conn.commit()
+
+        moved_vouchers = moved_entries = batches = 0
+        while True:
+            vouchers, entries = move_batch(cursor, year, batch_size)
+            if not vouchers:
+                break
+            conn.commit()
+            batches += 1
+            moved_vouchers += vouchers
+            moved_entries += entries
+            if progress:
+                progress(moved_vouchers)
+
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM vouchers_archive
+            WHERE voucher_date >= %s AND voucher_date < %s
+        """, (f"{year}-01-01", f"{year + 1}-01-01"))
+        voucher_count, total_amount = cursor.fetchone()
+        cursor.execute("""
+            SELECT COUNT(*) FROM journal_entries_archive je
+            JOIN vouchers_archive v ON je.voucher_id = v.id
+            WHERE v.voucher_date >= %s AND v.voucher_date < %s
+        """, (f"{year}-01-01", f"{year + 1}-01-01"))
+        entry_count = cursor.fetchone()[0]
+        fingerprint = balances_fingerprint(cursor, year)
+        cursor.execute("""
+            UPDATE fiscal_year_archives
+            SET status = 'archived', voucher_count = %s, entry_count = %s, total_amount = %s,
+                balances_fingerprint = %s, archived_at = CURRENT_TIMESTAMP
+            WHERE fiscal_year = %s
+        """, (voucher_count, entry_count, total_amount, fingerprint, year))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    bump_ledger_version(year)
+    return {"year": year, "resumed": resumed, "batches": batches,
+            "vouchers_moved": moved_vouchers, "entries_moved": moved_entries,
+            "voucher_count": voucher_count, "entry_count": entry_count, "total_amount": total_amount,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)}
+
+
+def list_archives(cursor):
+    cursor.execute("""
+        SELECT fiscal_year, status, voucher_count, entry_count, total_amount, started_at, archived_at
+        FROM fiscal_year_archives ORDER BY fiscal_year
+    """)
+    columns = ("fiscal_year", "status", "voucher_count", "entry_count", "total_amount",
+               "started_at", "archived_at")
+    return [row if isinstance(row, dict) else dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def verify_year(cursor, year):
+    """核对已归档年度的余额快照与归档时记录的指纹是否一致"""
+    cursor.execute("SELECT status, balances_fingerprint FROM fiscal_year_archives WHERE fiscal_year = %s",
+                   (year,))
+    row = cursor.fetchone()
+    if row is None or row[0] != 'archived':
+        raise ValueError(f"{year} 年度尚未完成归档")
+    current = balances_fingerprint(cursor, year)
+    return {"year": year, "ok": current == row[1], "recorded": row[1], "current": current}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="已结转年度的归档")
+    parser.add_argument("year", type=int, nargs="?", help="归档的会计年度")
+    parser.add_argument("--force", action="store_true", help="跳过试算平衡检查")
+    parser.add_argument("--batch-size", type=int, help="每个事务搬移的凭证数")
+    parser.add_argument("--verify", action="store_true", help="只核对已归档年度的余额快照")
+    parser.add_argument("--list", action="store_true", help="列出已归档年度")
+    args = parser.parse_args()
+    if args.year is None and not args.list:
+        parser.error("请指定年度，或使用 --list")
+
+    conn = get_db_connection()
+    if conn is None:
+        raise SystemExit(1)
+    try:
+        if args.list:
+            cursor = conn.cursor()
+            for row in list_archives(cursor):
+                print(f"{row['fiscal_year']}  {row['status']:<10} 凭证 {row['voucher_count']}  "
+                      f"分录 {row['entry_count']}  借方合计 {row['total_amount']}  完成于 {row['archived_at']}")
+            return
+        if args.verify:
+            result = verify_year(conn.cursor(), args.year)
+            print(f"{args.year}: {'余额快照未变化' if result['ok'] else '余额快照已被改动'}"
+                  f"（归档时 {result['recorded']}，当前 {result['current']}）")
+            if not result["ok"]:
+                raise SystemExit(1)
+            return
+        result = archive_year(conn, args.year, force=args.force, batch_size=args.batch_size,
+                              progress=lambda moved: print(f"  已搬移 {moved} 张凭证", end="\r"))
+    finally:
+        conn.close()
+    print(f"{args.year} 年度已归档{'（继续上次中断的归档）' if result['resumed'] else ''}："
+          f"本次搬移凭证 {result['vouchers_moved']} 张、分录 {result['entries_moved']} 条，"
+          f"归档表中共 {result['voucher_count']} 张 / {result['entry_count']} 条，"
+          f"耗时 {result['elapsed_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
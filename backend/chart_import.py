@@ -0,0 +1,298 @@
+# backend/chart_import.py
+"""
+会计科目批量导入：整张科目表在内存中校验、排序后，一个事务内用多行 INSERT 写入。
+
+- 级别和上级代码在内存中推导，不依赖触发器：默认按 CHART_IMPORT_CONFIG['code_segments'] 的分段规则
+  （4 位一级科目，之后每级 2 位，最后一段可无限重复，因此 12、14、16 位代码同样适用）；
+  也可以在导入行中直接给出 parent_code，用于分段不规则的科目体系（上级代码须为本科目代码的前缀）；
+- 校验时收集全部错误后一起返回：文件内重复、与库中已有科目重复、上级科目不存在、代码长度不符合分段规则、
+  余额方向无效等；只要有一处错误就整批不写入；
+- 上级科目可以在库中已有，也可以在同一批导入中，行的先后顺序不限，写入前按级别（拓扑顺序）排好；
+- 写入时设置会话变量 @chart_bulk_import = 1，触发器看到它就不再逐行推导级别、检查上级是否存在
+  （这些已在内存中校验过）；读取现有科目时加共享锁，避免导入过程中上级科目被删除。
+余额方向留空时沿用上级科目的方向。
+
+文件格式：
+  CSV：表头 account_code,account_name,balance_direction，可选列 parent_code,is_enabled
+  NDJSON：每行一个科目 {"account_code": "100201", "account_name": "...", "balance_direction": "debit"}
+  JSON：上述对象组成的数组（接口直接提交 JSON 请求体时使用）
+
+命令行用法：
+    python chart_import.py chart.csv
+    python chart_import.py chart.ndjson --dry-run     # 只校验，不写入
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+import account_tree
+from config import CHART_IMPORT_CONFIG
+from db_utils import db_cursor
+from report_cache import bump_ledger_version
+from voucher_import import insert_rows
+
+FORMATS = ("csv", "ndjson", "json")
+DIRECTIONS = ("debit", "credit")
+MAX_CODE_LENGTH = 16
+MAX_NAME_LENGTH = 100
+
+
+def guess_format(name_or_mimetype):
+    """根据文件扩展名或 Content-Type 推断格式，无法判断时返回 None"""
+    value = (name_or_mimetype or "").lower()
+    if value.endswith(".csv") or "csv" in value:
+        return "csv"
+    if value.endswith((".ndjson", ".jsonl")) or "ndjson" in value or "jsonl" in value:
+        return "ndjson"
+    if value.endswith(".json") or "json" in value:
+        return "json"
+    return None
+
+
+# ==========================================
+# 解析：统一转换为带行号的科目记录
+# ==========================================
+
+def make_record(line, raw):
+    def text(key):
+        value = raw.get(key)
+        return "" if value is None else str(value).strip()
+    return {
+        "line": line,
+        "account_code": text("account_code"),
+        "account_name": text("account_name"),
+        "balance_direction": text("balance_direction").lower(),
+        "parent_code": text("parent_code") or None,
+        "is_enabled": text("is_enabled"),
+    }
+
+
+def parse_records(source, fmt):
+    """把输入（行迭代器；JSON 格式也可以直接传入列表）解析为科目记录列表"""
+    if fmt == "csv":
+        reader = csv.DictReader(source)
+        missing = [c for c in ("account_code", "account_name", "balance_direction")
+                   if c not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"CSV 缺少列: {', '.join(missing)}")
+        return [make_record(reader.line_num, row) for row in reader]
+    if fmt == "ndjson":
+        records = []
+        for line_no, line in enumerate(source, start=1):
+            if line.strip():
+                raw = json.loads(line)
+                if not isinstance(raw, dict):
+                    raise ValueError(f"第 {line_no} 行不是 JSON 对象")
+                records.append(make_record(line_no, raw))
+        return records
+    if fmt == "json":
+        items = source if isinstance(source, (list, dict)) else json.loads("".join(source))
+        if isinstance(items, dict):
+            items = items.get("accounts")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("JSON 请求体应为科目对象数组，或 {\"accounts\": [...]}")
+        return [make_record(index, item) for index, item in enumerate(items, start=1)]
+    raise ValueError(f"不支持的格式: {fmt}")
+
+
+# ==========================================
+# 校验与排序：全部在内存中完成
+# ==========================================
+
+def segment_parent(code, segments):
+    """
+    按分段规则推导上级代码：返回 (是否符合规则, 上级代码或 None)。
+    segments 如 (4, 2)：一级 4 位，此后每级 2 位，最后一段重复使用。
+    """
+    boundaries = [0]
+    index = 0
+    while boundaries[-1] < len(code):
+        boundaries.append(boundaries[-1] + segments[min(index, len(segments) - 1)])
+        index += 1
+    if boundaries[-1] != len(code):
+        return False, None
+    return True, (code[:boundaries[-2]] or None)
+
+
+def parse_enabled(value):
+    if value == "":
+        return 1
+    lowered = value.lower()
+    if lowered in ("1", "true", "yes", "y"):
+        return 1
+    if lowered in ("0", "false", "no", "n"):
+        return 0
+    return None
+
+
+def plan_import(records, existing, segments=None):
+    """
+    校验并排序待导入的科目。
+    existing: 库中已有科目 {代码: (级别, 余额方向)}。
+    返回 (按级别排好序的插入行, 错误列表)，插入行为
+    (account_code, account_name, parent_code, level, balance_direction, is_enabled)；
+    错误为 {"line", "account_code", "error"}，有错误时调用方不应写入任何行。
+    """
+    segments = tuple(segments or CHART_IMPORT_CONFIG['code_segments'])
+    errors = []
+
+    def fail(record, message):
+        errors.append({"line": record["line"], "account_code": record["account_code"], "error": message})
+
+    # 第一轮：逐行检查字段，找出重复代码
+    by_code = {}
+    for record in records:
+        code = record["account_code"]
+        if not code:
+            fail(record, "科目代码不能为空")
+            continue
+        if code in by_code:
+            fail(record, f"科目代码在导入文件中重复（首次出现在第 {by_code[code]['line']} 行）")
+            continue
+        by_code[code] = record
+        if code in existing:
+            fail(record, "科目代码已存在")
+        if not code.isalnum() or len(code) > MAX_CODE_LENGTH:
+            fail(record, f"科目代码只能由字母和数字组成，且不超过 {MAX_CODE_LENGTH} 位")
+        if not record["account_name"]:
+            fail(record, "科目名称不能为空")
+        elif len(record["account_name"]) > MAX_NAME_LENGTH:
+            fail(record, f"科目名称不能超过 {MAX_NAME_LENGTH} 个字符")
+        if record["balance_direction"] and record["balance_direction"] not in DIRECTIONS:
+            fail(record, f"余额方向无效: {record['balance_direction']}（应为 debit 或 credit）")
+        if parse_enabled(record["is_enabled"]) is None:
+            fail(record, f"is_enabled 无效: {record['is_enabled']}")
+
+    # 第二轮：推导上级和级别。上级代码一定是本科目代码的真前缀，按代码长度处理即为拓扑顺序
+    failed = {error["account_code"] for error in errors}
+    resolved = {}  # 代码 -> (级别, 余额方向)，只含校验通过的导入科目
+    for code in sorted(by_code, key=len):
+        record = by_code[code]
+        parent = record["parent_code"]
+        if parent is not None:
+            if parent == code or not code.startswith(parent):
+                fail(record, f"上级科目代码 {parent} 不是本科目代码的前缀")
+                continue
+        else:
+            valid, parent = segment_parent(code, segments)
+            if not valid:
+                fail(record, f"科目代码长度 {len(code)} 不符合分段规则 {'-'.join(map(str, segments))}")
+                continue
+
+        if parent is None:
+            level, parent_direction = 1, None
+        elif parent in existing:
+            level, parent_direction = existing[parent][0] + 1, existing[parent][1]
+        elif parent in resolved:
+            level, parent_direction = resolved[parent][0] + 1, resolved[parent][1]
+        elif parent in by_code:
+            fail(record, f"上级科目 {parent} 校验未通过")
+            continue
+        else:
+            fail(record, f"上级科目 {parent} 不存在（库中和导入文件中都没有）")
+            continue
+
+        direction = record["balance_direction"] or parent_direction
+        if direction is None:
+            fail(record, "一级科目必须填写余额方向")
+            continue
+        if code not in failed:
+            resolved[code] = (level, direction)
+
+    errors.sort(key=lambda error: (error["line"], error["account_code"]))
+    if errors:
+        return [], errors
+
+    rows = []
+    for code, (level, direction) in resolved.items():
+        record = by_code[code]
+        parent = record["parent_code"] or segment_parent(code, segments)[1]
+        rows.append((code, record["account_name"], parent, level, direction, parse_enabled(record["is_enabled"])))
+    rows.sort(key=lambda row: (row[3], row[0]))
+    return rows, []
+
+
+# ==========================================
+# 写入：一个事务
+# ==========================================
+
+def load_existing(cursor):
+    """读取现有科目的级别和方向，并加共享锁直到事务结束"""
+    cursor.execute("SELECT account_code, level, balance_direction FROM chart_of_accounts LOCK IN SHARE MODE")
+    return {code: (level, direction) for code, level, direction in cursor.fetchall()}
+
+
+def import_chart(records, dry_run=False, chunk_rows=None):
+    """
+    校验并导入科目记录，返回 {"stats": {...}, "errors": [...]}。
+    有错误或 dry_run 时不写入任何科目。
+    """
+    chunk_rows = chunk_rows or CHART_IMPORT_CONFIG['insert_chunk_rows']
+    start = time.perf_counter()
+    with db_cursor() as (conn, cursor):
+        try:
+            existing = load_existing(cursor)
+            rows, errors = plan_import(records, existing)
+            validated = time.perf_counter()
+            if rows and not dry_run:
+                cursor.execute("SET @chart_bulk_import = 1")
+                try:
+                    insert_rows(cursor,
+                                "INSERT INTO chart_of_accounts (account_code, account_name, parent_code, level, "
+                                "balance_direction, is_enabled) VALUES ",
+                                "(%s, %s, %s, %s, %s, %s)", rows, chunk_rows)
+                finally:
+                    cursor.execute("SET @chart_bulk_import = NULL")
+                conn.commit()
+                account_tree.invalidate()
+                bump_ledger_version()
+            else:
+                conn.rollback()
+        except Exception:
+            conn.rollback()
+            raise
+
+    finished = time.perf_counter()
+    return {
+        "stats": {
+            "accounts_read": len(records),
+            "accounts_imported": 0 if errors or dry_run else len(rows),
+            "max_level": max((row[3] for row in rows), default=0),
+            "errors": len(errors),
+            "dry_run": dry_run,
+            "validate_seconds": round(validated - start, 3),
+            "elapsed_seconds": round(finished - start, 3),
+        },
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会计科目批量导入（CSV / NDJSON / JSON）")
+    parser.add_argument("path", help="导入文件路径")
+    parser.add_argument("--format", choices=FORMATS, help="文件格式，默认按扩展名判断")
+    parser.add_argument("--dry-run", action="store_true", help="只校验，不写入")
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.path)
+    if fmt is None:
+        sys.exit("无法根据扩展名判断文件格式，请使用 --format 指定")
+
+    with open(args.path, encoding="utf-8-sig", newline="") as source:
+        records = parse_records(source, fmt)
+    result = import_chart(records, dry_run=args.dry_run)
+
+    stats = result["stats"]
+    for error in result["errors"]:
+        print(f"第 {error['line']} 行 {error['account_code']}: {error['error']}")
+    print(f"读取科目: {stats['accounts_read']}  导入: {stats['accounts_imported']}  "
+          f"错误: {stats['errors']}  耗时: {stats['elapsed_seconds']}s（校验 {stats['validate_seconds']}s）")
+    if result["errors"]:
+        print("存在错误，未写入任何科目")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,3 +6,127 @@ DB_CONFIG = {
     'password': 'Abc@*123',
     'database': 'financial_db'
 }
+
+# 数据库连接池配置
+POOL_CONFIG = {
+    'pool_size': 5,           # 常驻连接数
+    'max_overflow': 10,       # 高峰期允许额外创建的连接数
+    'timeout': 10,            # 借出连接的最长等待时间（秒）
+    'recycle_uses': 1000,     # 单个连接使用多少次后重建
+    'recycle_seconds': 3600,  # 单个连接存活多少秒后重建
+    'ping_on_checkout': True  # 借出前检测连接是否可用（断线自动重连）
+}
+
+# 只读副本（从库）：每项只写与 DB_CONFIG 不同的配置（通常是 host / port），其余沿用 DB_CONFIG；
+# 可选 'name' 作为指标和统计中的名称（默认 replica-1、replica-2...）。每个从库一个连接池，参数同 POOL_CONFIG。
+# 为空列表时所有查询都走主库。
+REPLICA_CONFIGS = [
+    # {'host': '127.0.0.1', 'port': 3307},
+]
+
+# 读写分离（db_utils.read_cursor，报表、凭证列表等只读接口使用）：
+# read_your_writes_seconds - 会话提交写入后多少秒内，它的读请求仍走主库（刚保存的凭证立即可见），
+#                            应大于从库的正常复制延迟
+# replica_retry_seconds    - 从库连接失败后暂停使用的秒数，期间轮询其余从库，都不可用时回退主库
+READ_ROUTING_CONFIG = {
+    'read_your_writes_seconds': 5,
+    'replica_retry_seconds': 30,
+}
+
+# 科目余额维护模式：
+# True  - 增量模式，凭证保存/删除时在同一事务中同步更新 account_balances
+# False - 批量模式，需手动调用 proc_generate_account_summary 重新汇总
+INCREMENTAL_BALANCES = True
+
+# 年末结转（year_end.py 与 POST /api/year_end/close）：
+# retained_earnings_account - 接收本年净利润的留存收益科目，须为末级科目（有下级时请填其“未分配利润”明细科目）
+# profit_prefixes           - 损益类科目的代码前缀，这些科目下年期初归零、一级科目期末余额合计为净利润
+YEAR_END_CONFIG = {
+    'retained_earnings_account': '4104',
+    'profit_prefixes': ['6', '4103'],
+}
+
+# 财务报表计算方式：
+# 'procedure' - 调用数据库存储过程（proc_generate_balance_sheet 等）
+# 'python'    - 使用 report_engine.py，一次读取余额快照在内存中计算
+REPORT_ENGINE = 'procedure'
+
+# 试算平衡与账簿完整性检查（trial_balance.py 与 /api/reports/trial_balance）：
+# fetch_size          - 遍历分录时每批读取的行数
+# max_reported_issues - 每类问题最多列出的明细条数（数量仍完整统计）
+TRIAL_BALANCE_CONFIG = {
+    'fetch_size': 5000,
+    'max_reported_issues': 500,
+}
+
+# 已结转年度的归档（archive.py 与 POST /api/year_end/archive）：
+# batch_vouchers - 每个事务从当前表搬移到归档表的凭证数
+ARCHIVE_CONFIG = {
+    'batch_vouchers': 2000,
+}
+
+# 报表结果缓存：条目数和总字节数任一超限即按 LRU 淘汰；
+# pinned_years 中的（已结账）年度不参与淘汰
+REPORT_CACHE_CONFIG = {
+    'max_entries': 256,
+    'max_bytes': 64 * 1024 * 1024,
+    'pinned_years': [],
+}
+
+# 一次获取多张报表（/api/reports/bundle）：
+# workers - 并行生成报表的线程数，每个线程占用一个数据库连接
+REPORT_BUNDLE_CONFIG = {
+    'workers': 4,
+}
+
+# 凭证批量导入（voucher_import.py 与 POST /api/vouchers/import）：
+# batch_size        - 每个事务写入的凭证数
+# insert_chunk_rows - 每条多行 INSERT 语句最多包含的行数
+# max_reported_rejects - 接口响应中最多返回的被拒绝凭证条数（总数仍完整统计）
+IMPORT_CONFIG = {
+    'batch_size': 500,
+    'insert_chunk_rows': 1000,
+    'max_reported_rejects': 1000,
+}
+
+# 科目批量导入（chart_import.py 与 POST /api/accounts/import）：
+# code_segments       - 科目代码分段规则：一级科目位数、各下级位数，最后一段可重复（(4, 2) 即 4/6/8/10/12... 位）
+# insert_chunk_rows   - 每条多行 INSERT 语句最多包含的行数
+# max_reported_errors - 接口响应中最多返回的错误条数（总数仍完整统计）
+CHART_IMPORT_CONFIG = {
+    'code_segments': (4, 2),
+    'insert_chunk_rows': 1000,
+    'max_reported_errors': 1000,
+}
+
+# 响应压缩与缓存头（http_cache.py）：
+# compress_min_bytes     - 响应体超过该字节数才压缩（br 需安装 brotli，否则用 gzip）
+# gzip_level / brotli_quality - 压缩级别，兼顾压缩率与 CPU 耗时
+# compressed_cache_bytes - 按 (ETag, 编码) 缓存压缩结果的总字节数上限
+# static_max_age         - 带版本号（?v=文件修改时间）的静态文件的缓存秒数
+HTTP_CONFIG = {
+    'compress_min_bytes': 1024,
+    'gzip_level': 6,
+    'brotli_quality': 5,
+    'compressed_cache_bytes': 32 * 1024 * 1024,
+    'static_max_age': 365 * 24 * 3600,
+}
+
+# 运行指标（/metrics）：
+# enabled            - 是否包装数据库游标、记录 SQL 与存储过程耗时
+# slow_query_seconds - 单条语句（执行或取结果）超过该秒数写入慢查询日志，0 表示关闭
+# server_timing      - 是否为每个响应添加 Server-Timing 头；为 False 时，
+#                      请求头带 X-Server-Timing: 1 的请求仍会返回
+METRICS_CONFIG = {
+    'enabled': True,
+    'slow_query_seconds': 0.5,
+    'server_timing': False,
+}
+
+# 后台任务（jobs.py，如年度科目汇总）：
+# workers       - 同时执行的任务数（每个任务占用一个数据库连接，应小于连接池上限）
+# keep_finished - 保留多少个已结束任务的状态和结果供查询
+JOBS_CONFIG = {
+    'workers': 2,
+    'keep_finished': 200,
+}
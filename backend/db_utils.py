@@ -1,12 +1,542 @@
 # backend/db_utils.py
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import mysql.connector
-from config import DB_CONFIG
+import metrics
+from config import DB_CONFIG, POOL_CONFIG, METRICS_CONFIG, REPLICA_CONFIGS, READ_ROUTING_CONFIG
+
+PRIMARY = "primary"
+
+
+class PoolExhaustedError(Exception):
+    """在超时时间内没有可用连接"""
+
+
+class DatabaseUnavailableError(Exception):
+    """无法获取数据库连接（供路由统一返回 500）"""
+
+
+class PooledConnection:
+    """
+    对 mysql.connector 连接的轻量包装。
+    调用 close() 时并不真正断开，而是把连接归还给连接池，
+    因此旧代码里的 conn.close() 无需修改即可复用连接。
+    """
+
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._raw = raw_conn
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self._checked_out = False
+        self._discarded = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def target(self):
+        """连接所属的数据库（primary 或从库名称）"""
+        return self._pool.name
+
+    def cursor(self, *args, **kwargs):
+        """创建游标；开启运行指标时返回计时包装后的游标。游标的 db_target 为连接所属的数据库"""
+        cursor = self._raw.cursor(*args, **kwargs)
+        if METRICS_CONFIG['enabled']:
+            return metrics.InstrumentedCursor(cursor, self.target)
+        cursor.db_target = self.target
+        return cursor
+
+    def commit(self):
+        """提交事务；主库上的提交开启本会话的读己之写窗口"""
+        self._raw.commit()
+        if self.target == PRIMARY:
+            read_router.note_commit()
+
+    @property
+    def discarded(self):
+        return self._discarded
+
+    def discard(self):
+        """标记连接不再复用：归还时直接关闭（例如游标上还有未读完的结果集，连接已无法继续使用）"""
+        self._discarded = True
+
+    def close(self):
+        """归还连接到连接池"""
+        if self._checked_out:
+            self._checked_out = False
+            self._pool.release(self)
+
+    def __getattr__(self, name):
+        # 其余属性和方法（cursor、commit、rollback 等）全部转发给真实连接
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    线程安全的 MySQL 连接池。
+
+    - pool_size: 常驻的空闲连接上限；
+    - max_overflow: 超过 pool_size 后还能临时创建的连接数，归还时直接关闭；
+    - timeout: 连接全部借出时，等待归还的最长秒数，超时抛出 PoolExhaustedError；
+    - recycle_uses / recycle_seconds: 连接使用次数或存活时间超限后重建；
+    - ping_on_checkout: 借出前 ping 一次，断线则自动重连；
+    - name: 主库为 primary，从库为 REPLICA_CONFIGS 中的名称。
+    """
+
+    def __init__(self, db_config, pool_size=5, max_overflow=10, timeout=10,
+                 recycle_uses=1000, recycle_seconds=3600, ping_on_checkout=True, name=PRIMARY):
+        self._db_config = dict(db_config)
+        self.name = name
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle_uses = recycle_uses
+        self.recycle_seconds = recycle_seconds
+        self.ping_on_checkout = ping_on_checkout
+
+        self._idle = deque()
+        self._total = 0  # 已创建且尚未关闭的连接数（空闲 + 借出）
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "exhausted": 0,      # 借出时发现无空闲连接且已达上限的次数
+            "timeouts": 0,       # 等待超时的次数
+            "created": 0,
+            "recycled": 0,
+            "reconnects": 0,
+            "discarded": 0,
+        }
+
+    def _incr(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    # ---------- 连接的创建与销毁 ----------
+
+    def _create(self):
+        raw = mysql.connector.connect(**self._db_config)
+        self._incr("created")
+        return PooledConnection(self, raw)
+
+    def _dispose(self, conn):
+        try:
+            conn.raw.close()
+        except Exception:
+            pass
+
+    def _needs_recycle(self, conn):
+        if self.recycle_uses and conn.uses >= self.recycle_uses:
+            return True
+        if self.recycle_seconds and time.monotonic() - conn.created_at >= self.recycle_seconds:
+            return True
+        return False
+
+    def _check_health(self, conn):
+        """借出前的健康检查，返回可用的连接（可能是新建的）"""
+        if self._needs_recycle(conn):
+            self._dispose(conn)
+            self._incr("recycled")
+            return self._create()
+        if self.ping_on_checkout:
+            try:
+                conn.raw.ping(reconnect=True, attempts=1, delay=0)
+                if not conn.raw.is_connected():
+                    raise mysql.connector.Error("连接已断开")
+            except mysql.connector.Error:
+                self._dispose(conn)
+                self._incr("reconnects")
+                return self._create()
+        return conn
+
+    # ---------- 借出与归还 ----------
+
+    def acquire(self, timeout=None):
+        """借出一个连接；必要时等待，超时抛出 PoolExhaustedError"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        create_new = False
+
+        with self._cond:
+            if not self._idle and self._total >= self.pool_size + self.max_overflow:
+                self._stats["exhausted"] += 1
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()  # LIFO：优先复用最近用过的热连接
+                    break
+                if self._total < self.pool_size + self.max_overflow:
+                    self._total += 1
+                    create_new = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolExhaustedError(
+                        f"等待 {timeout} 秒后仍无可用连接（上限 {self.pool_size + self.max_overflow}）")
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - start
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+
+        # 建立或检测连接涉及网络往返，放在锁外执行
+        try:
+            conn = self._create() if create_new else self._check_health(conn)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        conn.uses += 1
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        """归还连接：回滚未提交的事务，超出常驻数量的连接和已标记丢弃的连接直接关闭"""
+        healthy = not conn.discarded
+        try:
+            # 结束可能残留的事务，避免下一个使用者读到旧快照或持有锁
+            if healthy and conn.raw.in_transaction:
+                conn.raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            if healthy and len(self._idle) < self.pool_size and not self._needs_recycle(conn):
+                self._idle.append(conn)
+            else:
+                self._total -= 1
+                self._stats["discarded"] += 1
+                self._dispose(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """with pool.connection() as conn: ...  退出时自动归还"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        """返回连接池计数器的快照"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = len(self._idle)
+            snapshot["in_use"] = self._total - len(self._idle)
+            snapshot["total"] = self._total
+            snapshot["pool_size"] = self.pool_size
+            snapshot["max_overflow"] = self.max_overflow
+        checkouts = snapshot["checkouts"]
+        snapshot["wait_time_avg"] = snapshot["wait_time_total"] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def dispose_all(self):
+        """关闭所有空闲连接（借出中的连接归还时会按常规处理）"""
+        with self._cond:
+            while self._idle:
+                self._dispose(self._idle.pop())
+                self._total -= 1
+
+
+class ReadRouter:
+    """
+    只读查询的目标选择（读写分离）。
+
+    - 当前会话处于读己之写窗口内（本次请求在主库提交过，或客户端带来的上次提交时间
+      距今不到 read_your_writes_seconds）时读主库，刚保存的凭证立即可见；
+    - 否则在可用的从库之间轮询；连接失败的从库暂停 replica_retry_seconds，
+      全部从库都不可用时回退主库；
+    - 没有配置从库时全部读主库。
+    """
+
+    def __init__(self, replicas, window, retry_seconds):
+        self.configs = dict(replicas)   # 从库名称 -> 连接配置
+        self.names = list(self.configs)
+        self.window = window
+        self.retry_seconds = retry_seconds
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._down_until = {}
+        self._last_commit = 0.0
+        self._stats = {"read_your_writes": 0, "fallbacks": 0, "replica_failures": 0}
+
+    def _incr(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def note_commit(self):
+        now = time.time()
+        self._last_commit = now
+        _session.committed_at = now
+
+    def pinned_until(self):
+        """当前会话的读请求走主库的截止时间（time.time() 口径），没有时为 0"""
+        until = getattr(_session, "primary_until", None) or 0.0
+        committed = getattr(_session, "committed_at", None)
+        return max(until, committed + self.window) if committed else until
+
+    def recently_committed(self):
+        """本进程最近 window 秒内在主库提交过写入（此时从库可能还没有这些数据）"""
+        return time.time() - self._last_commit < self.window
+
+    def replica_order(self):
+        """本次读请求依次尝试的从库（从轮询位置开始，跳过暂停中的从库）；应读主库时为空列表"""
+        if not self.names:
+            return []
+        if self.pinned_until() > time.time():
+            self._incr("read_your_writes")
+            return []
+        start = next(self._sequence) % len(self.names)
+        now = time.monotonic()
+        with self._lock:
+            names = [name for name in self.names[start:] + self.names[:start]
+                     if self._down_until.get(name, 0) <= now]
+            if not names:
+                self._stats["fallbacks"] += 1   # 从库全部暂停中，回退主库
+            return names
+
+    def mark_down(self, name):
+        with self._lock:
+            self._down_until[name] = time.monotonic() + self.retry_seconds
+            self._stats["replica_failures"] += 1
+
+    def note_fallback(self):
+        self._incr("fallbacks")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["replicas"] = list(self.names)
+            snapshot["replicas_down"] = [name for name, until in self._down_until.items() if until > now]
+        snapshot["read_your_writes_seconds"] = self.window
+        return snapshot
+
+
+# 当前请求（线程）的读己之写状态，由 begin_session / end_session 维护
+_session = threading.local()
+
+
+def replica_settings(configs):
+    """把 REPLICA_CONFIGS 展开为 [(名称, 完整连接配置)]，未写的配置项沿用 DB_CONFIG"""
+    settings = []
+    for index, override in enumerate(configs, start=1):
+        override = dict(override)
+        name = override.pop("name", None) or f"replica-{index}"
+        settings.append((name, {**DB_CONFIG, **override}))
+    return settings
+
+
+read_router = ReadRouter(replica_settings(REPLICA_CONFIGS), READ_ROUTING_CONFIG['read_your_writes_seconds'],
+                         READ_ROUTING_CONFIG['replica_retry_seconds'])
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def configure_replicas(configs, window=None, retry_seconds=None):
+    """
+    替换从库配置（命令行工具和测试用，格式同 REPLICA_CONFIGS），原有从库连接池的空闲连接随之关闭。
+    """
+    global read_router
+    with _pool_lock:
+        for name in [name for name in _pools if name != PRIMARY]:
+            _pools.pop(name).dispose_all()
+        read_router = ReadRouter(
+            replica_settings(configs),
+            READ_ROUTING_CONFIG['read_your_writes_seconds'] if window is None else window,
+            READ_ROUTING_CONFIG['replica_retry_seconds'] if retry_seconds is None else retry_seconds)
+
+
+def get_pool(target=PRIMARY):
+    """获取进程级的连接池（首次调用时创建）：target 为 primary 或从库名称"""
+    pool = _pools.get(target)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(target)
+            if pool is None:
+                config = DB_CONFIG if target == PRIMARY else read_router.configs[target]
+                pool = _pools[target] = ConnectionPool(config, name=target, **POOL_CONFIG)
+    return pool
+
+
+def get_pool_stats():
+    """获取主库连接池的统计信息"""
+    return get_pool().stats()
+
+
+def get_all_pool_stats():
+    """主库和各从库连接池的统计信息 {名称: 统计}"""
+    return {target: get_pool(target).stats() for target in (PRIMARY, *read_router.names)}
+
 
 def get_db_connection():
-    """获取数据库连接"""
+    """获取数据库连接（从连接池借出，conn.close() 即归还）"""
+    start = time.perf_counter()
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = get_pool().acquire()
+        metrics.observe_connection_wait(time.perf_counter() - start)
         return conn
-    except mysql.connector.Error as err:
+    except (mysql.connector.Error, PoolExhaustedError) as err:
         print(f"数据库连接失败: {err}")
         return None
+
+
+def begin_session(primary_until=None):
+    """
+    开始一次请求：primary_until 为客户端上次提交写入后读请求应走主库的截止时间（time.time() 口径，
+    由接口层通过 Cookie 带回），没有时为 None。
+    """
+    _session.primary_until = primary_until
+    _session.committed_at = None
+
+
+def end_session():
+    _session.primary_until = None
+    _session.committed_at = None
+
+
+def session_primary_until():
+    """本次请求在主库提交过写入时，返回此后读请求应走主库的截止时间，否则返回 None"""
+    committed = getattr(_session, "committed_at", None)
+    return committed + read_router.window if committed else None
+
+
+def read_pinned_until():
+    """当前会话的读请求走主库的截止时间，传给工作线程的 begin_session() 以保持同样的路由"""
+    return read_router.pinned_until() or None
+
+
+def acquire_replica(router, name, timeout):
+    """借用从库连接，返回 (连接, 是否连接失败)；连接池已满时连接为 None"""
+    start = time.perf_counter()
+    try:
+        conn = get_pool(name).acquire(timeout)
+    except PoolExhaustedError:
+        return None, False
+    except mysql.connector.Error as err:
+        print(f"从库 {name} 连接失败: {err}")
+        router.mark_down(name)
+        return None, True
+    metrics.observe_connection_wait(time.perf_counter() - start)
+    return conn, False
+
+
+def get_read_connection():
+    """
+    只读查询的连接：按 read_router 的顺序尝试从库，先不等待地借用，都借不到时在第一个可用从库上等待；
+    从库连接失败时暂停该从库并尝试下一个，最后回退主库。
+    """
+    router = read_router
+    names = router.replica_order()
+    if not names:
+        return get_db_connection()
+    reachable = []
+    for name in names:
+        conn, failed = acquire_replica(router, name, 0)
+        if conn is not None:
+            return conn
+        if not failed:
+            reachable.append(name)
+    if reachable:
+        conn, _ = acquire_replica(router, reachable[0], None)
+        if conn is not None:
+            return conn
+    router.note_fallback()
+    return get_db_connection()
+
+
+def close_cursor(conn, cursor):
+    """
+    关闭游标并归还连接。游标关闭失败（非缓冲游标上还有未读完的行，例如流式下载被客户端中断）时
+    连接已无法复用，标记丢弃后仍然归还，不会泄漏连接池名额。
+    """
+    try:
+        cursor.close()
+    except mysql.connector.Error as err:
+        if not conn.discarded:
+            print(f"关闭游标失败，丢弃连接: {err}")
+        conn.discard()
+    finally:
+        conn.close()
+
+
+@contextmanager
+def db_cursor(dictionary=False):
+    """
+    借出连接并创建游标，退出 with 块时自动关闭游标、归还连接。
+    用法：
+        with db_cursor(dictionary=True) as (conn, cursor):
+            cursor.execute(...)
+    获取不到连接时抛出 DatabaseUnavailableError。
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise DatabaseUnavailableError("数据库连接失败")
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        yield conn, cursor
+    finally:
+        close_cursor(conn, cursor)
+
+
+@contextmanager
+def read_cursor(dictionary=False):
+    """
+    与 db_cursor 相同，但连接来自 get_read_connection()（有从库时优先从库）。
+    只用于只读查询：报表、凭证列表和详情、明细账等；不要在这里写入或加锁读取。
+    """
+    conn = get_read_connection()
+    if conn is None:
+        raise DatabaseUnavailableError("数据库连接失败")
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        yield conn, cursor
+    finally:
+        close_cursor(conn, cursor)
+
+
+def replica_may_lag(conn):
+    """
+    conn 是从库连接，且本进程最近 read_your_writes_seconds 秒内在主库提交过写入：
+    读到的可能是写入之前的数据，结果不应按新的账簿版本缓存。
+    """
+    return conn.target != PRIMARY and read_router.recently_committed()
+
+
+def cursor_target(cursor):
+    """游标所属的数据库（primary 或从库名称）"""
+    return getattr(cursor, "db_target", PRIMARY)
+
+
+def call_procedure(cursor, procedure, args=()):
+    """
+    调用以结果集返回数据的存储过程，返回最后一个结果集的行（字典列表）。
+    报表过程在会话临时表中生成数据并 SELECT 返回，不依赖任何共享结果表。
+    """
+    cursor.callproc(procedure, args)
+    rows = []
+    for result in cursor.stored_results():
+        columns = result.column_names
+        rows = [row if isinstance(row, dict) else dict(zip(columns, row)) for row in result.fetchall()]
+    return rows
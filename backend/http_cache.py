@@ -0,0 +1,141 @@
+# backend/http_cache.py
+"""
+响应压缩与条件请求。
+
+- 按 Accept-Encoding 协商 br（需安装 brotli）或 gzip，只压缩超过 HTTP_CONFIG['compress_min_bytes']
+  的文本类响应（JSON、JS、CSS、HTML、CSV 等）；边生成边输出的流式响应不压缩；
+- GET 的 JSON 接口：没有 ETag 的响应按内容摘要补上 ETag 并设置 Cache-Control: no-cache，
+  浏览器带 If-None-Match 再次请求时内容没变就返回 304，只省去传输；
+  已自带 ETag 的接口（科目、报表缓存）在序列化之前就能返回 304；
+- 压缩结果按 (ETag, 编码) 缓存，报表缓存命中、静态文件等内容不变的响应不会重复压缩；
+  压缩后的响应 ETag 改为弱 ETag（不同编码的字节不同），条件判断按弱比较进行；
+- 静态文件：url_for('static') 生成的地址自动带上文件修改时间 ?v=...，带版本的请求可长期缓存
+  （immutable），不带版本的请求每次用 ETag / Last-Modified 验证。
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from config import HTTP_CONFIG
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：未安装时只提供 gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript",
+                      "image/svg+xml", "text/")
+
+
+class CompressedCache:
+    """(ETag, 编码) -> 压缩后字节 的 LRU，按总字节数淘汰"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+compressed_cache = CompressedCache(HTTP_CONFIG['compressed_cache_bytes'])
+
+
+def negotiate_encoding(accept_encodings):
+    """按客户端给出的权重选择编码，权重相同时优先 br；都不接受时返回 None"""
+    candidates = [("br", accept_encodings["br"])] if brotli is not None else []
+    candidates.append(("gzip", accept_encodings["gzip"]))
+    encoding, quality = max(candidates, key=lambda item: item[1])
+    return encoding if quality > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=HTTP_CONFIG['brotli_quality'])
+    return gzip.compress(body, compresslevel=HTTP_CONFIG['gzip_level'], mtime=0)
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def static_version(static_folder, filename):
+    """静态文件的版本号（修改时间），文件不存在时返回 None"""
+    try:
+        return int(os.stat(os.path.join(static_folder, filename)).st_mtime)
+    except OSError:
+        return None
+
+
+def finalize_response(request, response, is_static):
+    """after_request 中调用：设置缓存头、回应 304、按需压缩"""
+    if is_static:
+        if request.args.get('v'):
+            response.cache_control.public = True
+            response.cache_control.max_age = HTTP_CONFIG['static_max_age']
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return response
+    if not is_compressible(response.mimetype):
+        return response
+    if is_static:
+        response.direct_passthrough = False   # 读取文件内容以便压缩（静态文件都不大）
+    elif response.is_streamed:
+        return response
+
+    cacheable = request.method in ("GET", "HEAD") and request.path.startswith("/api/")
+    etag, _ = response.get_etag()
+    if cacheable and etag is None:
+        etag = hashlib.sha1(response.get_data()).hexdigest()
+        response.set_etag(etag)
+        if not response.cache_control.no_cache:
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    response.vary.add("Accept-Encoding")
+    if response.content_length is not None and response.content_length < HTTP_CONFIG['compress_min_bytes']:
+        return response
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    key = (request.path, etag, encoding) if etag else None
+    body = compressed_cache.get(key) if key else None
+    if body is None:
+        data = response.get_data()
+        if len(data) < HTTP_CONFIG['compress_min_bytes']:
+            return response
+        body = compress(data, encoding)
+        if key:
+            compressed_cache.put(key, body)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,145 @@
+# backend/jobs.py
+"""
+后台任务：把耗时的计算（如年度科目汇总）放到线程池中执行，接口立即返回任务编号。
+
+- 每个任务有一个去重键（如 ("generate_summary", 2024)），同一键已有排队或运行中的任务时，
+  新的提交直接返回该任务，不会重复计算；
+- 任务执行函数接收一个 Job 对象，可以调用 job.progress() 报告进度；
+- 已结束的任务（成功或失败）保留最近 JOBS_CONFIG['keep_finished'] 个，供前端轮询结果。
+
+去重只在本进程内有效；多进程部署时同一年度仍可能在不同进程各算一次（结果相同）。
+"""
+import itertools
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import JOBS_CONFIG
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class Job:
+    """一个后台任务的状态；除 progress() 外只由 JobRunner 修改"""
+
+    _sequence = itertools.count(1)
+
+    def __init__(self, kind, key, params):
+        self.id = f"{next(self._sequence)}-{uuid.uuid4().hex[:8]}"
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.status = QUEUED
+        self.percent = 0
+        self.message = "排队中"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.submissions = 1      # 合并到本任务的提交次数
+        self.done = threading.Event()
+
+    def progress(self, percent, message):
+        self.percent = percent
+        self.message = message
+
+    def to_dict(self):
+        finished = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.percent,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(finished - self.started_at, 3) if self.started_at else None,
+            "submissions": self.submissions,
+        }
+
+
+class JobRunner:
+    """线程池任务执行器"""
+
+    def __init__(self, workers=2, keep_finished=200):
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()   # 任务编号 -> Job，按提交顺序
+        self._active = {}            # 去重键 -> 排队或运行中的 Job
+
+    def submit(self, kind, key, func, params=None):
+        """
+        提交任务，返回 (Job, 是否合并到了已有任务)。
+        func(job) 的返回值作为任务结果（需可 JSON 序列化），抛出的异常记为失败。
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                job.submissions += 1
+                return job, True
+            job = Job(kind, key, params or {})
+            self._jobs[job.id] = job
+            self._active[key] = job
+        self._executor.submit(self._run, job, func)
+        return job, False
+
+    def _run(self, job, func):
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.progress(0, "开始执行")
+        metrics.set_route(f"job:{job.kind}")
+        try:
+            result = func(job)
+        except Exception as e:
+            job.error = str(e)
+            job.message = f"执行失败: {e}"
+            job.status = FAILED
+            traceback.print_exc()
+        else:
+            job.result = result
+            job.progress(100, "已完成")
+            job.status = SUCCEEDED
+        finally:
+            metrics.clear_route()
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+                self._trim()
+            job.done.set()
+
+    def _trim(self):
+        """只保留最近的 keep_finished 个已结束任务（调用方持有锁）"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATES]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self, kind=None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if kind is None or job.kind == kind]
+
+    def wait(self, job_id, timeout=None):
+        """等待任务结束，返回 Job（不存在时返回 None）"""
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+
+runner = JobRunner(JOBS_CONFIG['workers'], JOBS_CONFIG['keep_finished'])
@@ -0,0 +1,46 @@
+# backend/json_codec.py
+"""
+接口响应的 JSON 序列化。
+
+- 安装了 orjson 时使用 orjson（C 实现，直接输出 UTF-8 字节），否则退回标准库 json；
+- Decimal 输出为字符串（保持两位小数精度，与原来的输出一致），
+  date / datetime 输出为 ISO 8601 字符串（如 "2025-01-15"），与流式接口的输出一致；
+- 中文不再转义为 \\uXXXX，响应体更小。
+"""
+import datetime
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：未安装时使用标准库
+    orjson = None
+
+
+def default(obj):
+    """orjson / json 无法直接处理的类型"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"无法序列化为 JSON 的类型: {type(obj).__name__}")
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=default, option=_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=default)
+
+    def dumps_bytes(obj):
+        return _encoder.encode(obj).encode("utf-8")
+
+
+def dumps(obj):
+    return dumps_bytes(obj).decode("utf-8")
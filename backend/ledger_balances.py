@@ -0,0 +1,277 @@
+# backend/ledger_balances.py
+"""
+科目余额的增量维护与对账。
+
+凭证保存/删除时，把每条分录的借贷发生额同时累加到末级科目及其所有上级科目
+（沿 parent_code 向上追溯），与凭证写入处于同一事务中，使 account_balances
+（年度）和 account_period_balances（按月）始终保持最新，
+无需在每次出报表前重新运行 proc_generate_account_summary。
+
+对账命令用一次全量重算校验增量结果，并可修复偏差：
+    python ledger_balances.py 2025            # 只校验
+    python ledger_balances.py 2025 --repair   # 校验并修复
+"""
+import argparse
+import datetime
+from decimal import Decimal
+
+from account_tree import build_tree
+from db_utils import get_db_connection
+
+ZERO = Decimal("0.00")
+
+
+def to_decimal(value):
+    """把前端传来的金额（字符串/数字/None）统一转换为 Decimal"""
+    if value is None or value == "":
+        return ZERO
+    return Decimal(str(value))
+
+
+def rollup_deltas(tree, entries):
+    """
+    把分录的借贷发生额汇总到末级科目及其全部上级科目。
+    entries: [(account_code, debit, credit), ...]
+    返回 {科目代码: [借方合计, 贷方合计]}
+    """
+    totals = {}
+    for account_code, debit, credit in entries:
+        if account_code not in tree:
+            raise ValueError(f"科目 {account_code} 不存在")
+        for code in (account_code, *tree.ancestors(account_code)):
+            bucket = totals.setdefault(code, [ZERO, ZERO])
+            bucket[0] += debit
+            bucket[1] += credit
+    return totals
+
+
+def apply_entry_deltas(cursor, tree, fiscal_year, month, entries, sign=1):
+    """
+    在当前事务中把同一会计期间的一组分录发生额增量写入 account_balances 和 account_period_balances。
+    sign=1 表示新增凭证，sign=-1 表示删除凭证（冲回）。
+    期末余额按各科目自身的余额方向同步重算。
+    """
+    totals = rollup_deltas(tree, entries)
+    if not totals:
+        return 0
+
+    sql = """
+        INSERT INTO account_balances
+            (account_code, fiscal_year, opening_balance, period_debit, period_credit, closing_balance)
+        VALUES (%s, %s, 0.00, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            period_debit = period_debit + VALUES(period_debit),
+            period_credit = period_credit + VALUES(period_credit),
+            closing_balance = closing_balance + VALUES(closing_balance)
+    """
+    rows = []
+    period_rows = []
+    # 按科目代码排序写入，保证并发事务以相同顺序加锁，避免死锁
+    for code in sorted(totals):
+        debit, credit = totals[code]
+        debit, credit = debit * sign, credit * sign
+        closing_delta = debit - credit if tree.direction(code) == 'debit' else credit - debit
+        rows.append((code, fiscal_year, debit, credit, closing_delta))
+        period_rows.append((fiscal_year, month, code, debit, credit))
+    cursor.executemany(sql, rows)
+    cursor.executemany("""
+        INSERT INTO account_period_balances
+            (fiscal_year, period_month, account_code, period_debit, period_credit)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            period_debit = period_debit + VALUES(period_debit),
+            period_credit = period_credit + VALUES(period_credit)
+    """, period_rows)
+    return len(rows)
+
+
+def apply_voucher_entries(cursor, tree, voucher_date, entries, sign=1):
+    """根据凭证日期确定会计年度，并写入分录增量（entries 为前端提交的分录字典列表）"""
+    if isinstance(voucher_date, str):
+        voucher_date = datetime.date.fromisoformat(voucher_date)
+    deltas = [(e['account_code'], to_decimal(e.get('debit')), to_decimal(e.get('credit'))) for e in entries]
+    return apply_entry_deltas(cursor, tree, voucher_date.year, voucher_date.month, deltas, sign)
+
+
+def reverse_voucher(cursor, tree, voucher_id):
+    """
+    删除凭证前调用：锁定凭证并冲回其分录对余额的影响。
+    返回凭证日期；凭证不存在时返回 None。
+    """
+    cursor.execute("SELECT voucher_date FROM vouchers WHERE id = %s FOR UPDATE", (voucher_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    voucher_date = row["voucher_date"] if isinstance(row, dict) else row[0]
+
+    cursor.execute(
+        "SELECT account_code, debit_amount, credit_amount FROM journal_entries WHERE voucher_id = %s",
+        (voucher_id,))
+    deltas = []
+    for entry in cursor.fetchall():
+        if isinstance(entry, dict):
+            deltas.append((entry["account_code"], entry["debit_amount"], entry["credit_amount"]))
+        else:
+            deltas.append(tuple(entry))
+    apply_entry_deltas(cursor, tree, voucher_date.year, voucher_date.month, deltas, sign=-1)
+    return voucher_date
+
+
+# ==========================================
+# 对账：全量重算并与增量结果比对
+# ==========================================
+
+def compute_expected_balances(cursor, tree, fiscal_year):
+    """
+    按凭证全量重算指定年度各科目的借贷发生额（含上级科目汇总）。
+    日期条件使用范围谓词，可以利用 voucher_date 上的索引。
+    """
+    cursor.execute("""
+        SELECT je.account_code, SUM(je.debit_amount), SUM(je.credit_amount)
+        FROM journal_entries je
+        JOIN vouchers v ON je.voucher_id = v.id
+        WHERE v.voucher_date >= %s AND v.voucher_date < %s
+        GROUP BY je.account_code
+    """, (datetime.date(fiscal_year, 1, 1), datetime.date(fiscal_year + 1, 1, 1)))
+    leaf_totals = [(code, debit or ZERO, credit or ZERO) for code, debit, credit in cursor.fetchall()]
+    return rollup_deltas(tree, leaf_totals)
+
+
+def compute_expected_period_balances(cursor, tree, fiscal_year):
+    """按凭证全量重算指定年度各科目每个月的借贷发生额（含上级科目汇总），返回 {(月份, 科目代码): [借, 贷]}"""
+    cursor.execute("""
+        SELECT MONTH(v.voucher_date), je.account_code, SUM(je.debit_amount), SUM(je.credit_amount)
+        FROM journal_entries je
+        JOIN vouchers v ON je.voucher_id = v.id
+        WHERE v.voucher_date >= %s AND v.voucher_date < %s
+        GROUP BY MONTH(v.voucher_date), je.account_code
+    """, (datetime.date(fiscal_year, 1, 1), datetime.date(fiscal_year + 1, 1, 1)))
+    by_month = {}
+    for month, code, debit, credit in cursor.fetchall():
+        by_month.setdefault(month, []).append((code, debit or ZERO, credit or ZERO))
+    expected = {}
+    for month, leaf_totals in by_month.items():
+        for code, totals in rollup_deltas(tree, leaf_totals).items():
+            expected[(month, code)] = totals
+    return expected
+
+
+def reconcile_period_balances(cursor, tree, fiscal_year):
+    """校验 account_period_balances，返回偏差列表"""
+    expected = compute_expected_period_balances(cursor, tree, fiscal_year)
+    cursor.execute("""
+        SELECT period_month, account_code, period_debit, period_credit
+        FROM account_period_balances WHERE fiscal_year = %s
+    """, (fiscal_year,))
+    stored = {(month, code): (debit, credit) for month, code, debit, credit in cursor.fetchall()}
+
+    drifts = []
+    for month, code in sorted(set(expected) | set(stored)):
+        exp_debit, exp_credit = expected.get((month, code), (ZERO, ZERO))
+        debit, credit = stored.get((month, code), (ZERO, ZERO))
+        if (debit, credit) != (exp_debit, exp_credit):
+            drifts.append({
+                "account_code": code,
+                "period_month": month,
+                "stored": {"period_debit": debit, "period_credit": credit},
+                "expected": {"period_debit": exp_debit, "period_credit": exp_credit},
+                "missing_row": (month, code) not in stored,
+            })
+    return drifts
+
+
+def reconcile_balances(conn, fiscal_year, repair=False):
+    """
+    校验 account_balances 中的发生额和期末余额、account_period_balances 中的月发生额
+    是否与全量重算一致。repair=True 时在同一事务中修正所有偏差行。
+    返回偏差列表，每项为一个字典（按月的偏差带 period_month）。
+    """
+    cursor = conn.cursor()
+    try:
+        tree = build_tree(cursor)
+        expected = compute_expected_balances(cursor, tree, fiscal_year)
+
+        cursor.execute("""
+            SELECT account_code, opening_balance, period_debit, period_credit, closing_balance
+            FROM account_balances WHERE fiscal_year = %s
+        """, (fiscal_year,))
+        stored = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        drifts = []
+        for code in sorted(set(expected) | set(stored)):
+            if code not in tree:
+                continue
+            exp_debit, exp_credit = expected.get(code, (ZERO, ZERO))
+            opening, debit, credit, closing = stored.get(code, (ZERO, ZERO, ZERO, ZERO))
+            movement = exp_debit - exp_credit if tree.direction(code) == 'debit' else exp_credit - exp_debit
+            exp_closing = opening + movement
+            if (debit, credit, closing) != (exp_debit, exp_credit, exp_closing):
+                drifts.append({
+                    "account_code": code,
+                    "stored": {"period_debit": debit, "period_credit": credit, "closing_balance": closing},
+                    "expected": {"period_debit": exp_debit, "period_credit": exp_credit,
+                                 "closing_balance": exp_closing},
+                    "missing_row": code not in stored,
+                })
+
+        period_drifts = reconcile_period_balances(cursor, tree, fiscal_year)
+
+        if repair and period_drifts:
+            cursor.executemany("""
+                INSERT INTO account_period_balances
+                    (fiscal_year, period_month, account_code, period_debit, period_credit)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    period_debit = VALUES(period_debit),
+                    period_credit = VALUES(period_credit)
+            """, [(fiscal_year, d["period_month"], d["account_code"], d["expected"]["period_debit"],
+                   d["expected"]["period_credit"]) for d in period_drifts])
+        if repair and drifts:
+            cursor.executemany("""
+                INSERT INTO account_balances
+                    (account_code, fiscal_year, opening_balance, period_debit, period_credit, closing_balance)
+                VALUES (%s, %s, 0.00, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    period_debit = VALUES(period_debit),
+                    period_credit = VALUES(period_credit),
+                    closing_balance = VALUES(closing_balance)
+            """, [(d["account_code"], fiscal_year, d["expected"]["period_debit"],
+                   d["expected"]["period_credit"], d["expected"]["closing_balance"]) for d in drifts])
+        if repair and (drifts or period_drifts):
+            conn.commit()
+        return drifts + period_drifts
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="科目余额对账：校验增量维护的余额与全量重算是否一致")
+    parser.add_argument("year", type=int, help="会计年度")
+    parser.add_argument("--repair", action="store_true", help="发现偏差时按全量重算结果修复")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if conn is None:
+        raise SystemExit(1)
+    try:
+        drifts = reconcile_balances(conn, args.year, repair=args.repair)
+    finally:
+        conn.close()
+
+    if not drifts:
+        print(f"{args.year}年度科目余额与凭证一致，无需修复。")
+        return
+    for d in drifts:
+        period = f" {d['period_month']}月" if "period_month" in d else ""
+        print(f"{d['account_code']}{period}: 当前 {d['stored']} -> 应为 {d['expected']}")
+    action = "已修复" if args.repair else "未修复（使用 --repair 修复）"
+    print(f"共发现 {len(drifts)} 处偏差，{action}。")
+    if not args.repair:
+        raise SystemExit(2)
+
+
+if __name__ == "__main__":
+    main()
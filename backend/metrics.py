@@ -0,0 +1,312 @@
+# backend/metrics.py
+"""
+运行指标：接口延迟、SQL/存储过程耗时、连接等待、JSON 序列化耗时，以 Prometheus 文本格式输出。
+
+- 每个请求开始时记下当前路由（线程局部变量），此后该线程上的 SQL 计时都带上这个路由标签，
+  没有请求上下文的调用（命令行、后台任务）记为 "-" 或调用方通过 set_route() 指定的名称；
+- InstrumentedCursor 包装数据库游标，execute / executemany / callproc 以及取结果都计时计数，
+  超过 METRICS_CONFIG['slow_query_seconds'] 的语句写入慢查询日志；
+  另按目标数据库（主库 primary 或从库名称）和操作类型统计语句数，用于观察读写分离的效果；
+- 同一请求内各阶段的累计耗时可以通过 Server-Timing 响应头返回给浏览器开发者工具。
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from config import METRICS_CONFIG
+
+slow_query_logger = logging.getLogger("financial.slow_query")
+
+# 直方图分桶上限（秒），覆盖 1ms 到 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """带标签的直方图：每组标签值一份分桶计数、总和与次数"""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值元组 -> [各分桶计数..., 总和, 次数]
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(labels, list(series)) for labels, series in items]
+        for labels, series in items:
+            base = format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values):
+    return ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+
+http_request_duration = Histogram(
+    "financial_http_request_duration_seconds", "接口处理耗时", ("method", "route", "status"))
+db_query_duration = Histogram(
+    "financial_db_query_duration_seconds", "SQL 语句和存储过程耗时（phase=execute 为执行，fetch 为取结果）",
+    ("route", "phase", "statement"))
+db_connection_wait = Histogram(
+    "financial_db_connection_wait_seconds", "从连接池借出连接的耗时", ("route",))
+json_serialize_duration = Histogram(
+    "financial_json_serialize_seconds", "响应 JSON 序列化耗时", ("route",))
+slow_queries = Counter(
+    "financial_db_slow_queries_total", "超过慢查询阈值的语句数", ("route", "statement"))
+db_queries = Counter(
+    "financial_db_queries_total", "按目标数据库统计的语句数（target 为 primary 或从库名称）", ("target", "operation"))
+
+REGISTRY = [http_request_duration, db_query_duration, db_connection_wait, json_serialize_duration, slow_queries,
+            db_queries]
+
+
+# ==========================================
+# 按线程记录当前路由和请求内的分阶段耗时
+# ==========================================
+
+_local = threading.local()
+
+
+def set_route(route):
+    """开始一次请求（或后台任务）：设置路由标签并清空分阶段耗时"""
+    _local.route = route
+    _local.timings = {}
+
+
+def clear_route():
+    _local.route = None
+    _local.timings = None
+
+
+def current_route():
+    return getattr(_local, "route", None) or "-"
+
+
+def request_timings():
+    """当前请求内各阶段的累计耗时 {阶段: [秒, 次数]}"""
+    return getattr(_local, "timings", None) or {}
+
+
+def record_phase(phase, seconds):
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        entry = timings.setdefault(phase, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def observe_connection_wait(seconds):
+    db_connection_wait.observe((current_route(),), seconds)
+    record_phase("db-connect", seconds)
+
+
+def observe_json(seconds):
+    json_serialize_duration.observe((current_route(),), seconds)
+    record_phase("json", seconds)
+
+
+# ==========================================
+# 游标包装
+# ==========================================
+
+_OPERATION_PATTERN = re.compile(
+    r"\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|CALL|SET|SHOW|TRUNCATE|CREATE|DROP|ALTER|WITH)\b", re.IGNORECASE)
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|TABLE|JOIN)\s+`?(\w+)", re.IGNORECASE)
+_UPDATE_TABLE_PATTERN = re.compile(r"\s+`?(\w+)")
+
+
+def statement_label(sql):
+    """把 SQL 归一为“操作 表名”形式的低基数标签，如 SELECT vouchers、UPDATE account_balances"""
+    text = sql if isinstance(sql, str) else sql.decode("utf-8", "replace")
+    match = _OPERATION_PATTERN.match(text)
+    if not match:
+        return "OTHER"
+    operation = match.group(1).upper()
+    if operation == "UPDATE":
+        table = _UPDATE_TABLE_PATTERN.match(text, match.end())
+    else:
+        table = _TABLE_PATTERN.search(text, match.end())
+    return f"{operation} {table.group(1)}" if table else operation
+
+
+class InstrumentedCursor:
+    """
+    包装 mysql.connector 游标，对执行和取结果计时；其余属性原样转发。
+    取结果的耗时记在最近一次执行的语句名下（非缓冲游标的大部分传输时间发生在这里）。
+    db_target 为游标所在连接的数据库（primary 或从库名称）。
+    """
+
+    def __init__(self, cursor, db_target="primary"):
+        self._cursor = cursor
+        self._statement = "OTHER"
+        self.db_target = db_target
+
+    def _count(self):
+        db_queries.inc((self.db_target, self._statement.split(" ", 1)[0]))
+
+    def _observe(self, phase, statement, seconds, sql=None):
+        route = current_route()
+        db_query_duration.observe((route, phase, statement), seconds)
+        record_phase("db", seconds)
+        threshold = METRICS_CONFIG["slow_query_seconds"]
+        if threshold and seconds >= threshold:
+            slow_queries.inc((route, statement))
+            text = " ".join(str(sql).split())[:500] if sql is not None else statement
+            slow_query_logger.warning("慢查询 %.3fs route=%s phase=%s %s", seconds, route, phase, text)
+
+    def _timed(self, phase, statement, func, *args, sql=None):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._observe(phase, statement, time.perf_counter() - start, sql)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._statement = statement_label(operation)
+        self._count()
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._observe("execute", self._statement, time.perf_counter() - start, operation)
+
+    def executemany(self, operation, seq_params):
+        self._statement = statement_label(operation)
+        self._count()
+        return self._timed("execute", self._statement, self._cursor.executemany, operation, seq_params,
+                           sql=operation)
+
+    def callproc(self, procname, args=()):
+        self._statement = f"CALL {procname}"
+        self._count()
+        return self._timed("execute", self._statement, self._cursor.callproc, procname, args)
+
+    def fetchone(self):
+        return self._timed("fetch", self._statement, self._cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed("fetch", self._statement, self._cursor.fetchmany)
+        return self._timed("fetch", self._statement, self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed("fetch", self._statement, self._cursor.fetchall)
+
+    def stored_results(self):
+        """存储过程返回的结果集，取结果同样计入该过程名下"""
+        for result in self._cursor.stored_results():
+            start = time.perf_counter()
+            rows = result.fetchall()
+            self._observe("fetch", self._statement, time.perf_counter() - start)
+            yield StoredResult(result, rows)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+        return False
+
+
+class StoredResult:
+    """stored_results() 中已取出行的结果集"""
+
+    def __init__(self, result, rows):
+        self._result = result
+        self._rows = rows
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+
+# ==========================================
+# 输出
+# ==========================================
+
+def query_counts():
+    """各目标数据库的语句数 {目标: {操作: 次数}}"""
+    counts = {}
+    for (target, operation), value in db_queries.values().items():
+        counts.setdefault(target, {})[operation] = value
+    return counts
+
+
+def render_prometheus(extra_lines=()):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header():
+    """把当前请求的分阶段耗时格式化为 Server-Timing 头，如 db;dur=12.3;desc="5 次" """
+    parts = []
+    for phase, (seconds, count) in request_timings().items():
+        parts.append(f'{phase};dur={seconds * 1000:.1f};desc="{count}"')
+    return ", ".join(parts)
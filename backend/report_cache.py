@@ -0,0 +1,157 @@
+# backend/report_cache.py
+"""
+报表结果缓存。
+
+缓存键由（报表类型, 年度, 查询参数, 所依赖年度的账簿版本）组成。
+凭证、期初余额、科目的写接口提交后调用 bump_ledger_version() 使相应年度的版本加一，
+旧版本的缓存自然失效，无需逐条清理；没有变化的年度则一直命中缓存。
+
+- 按条目数和总字节数双重上限做 LRU 淘汰；
+- 已结账年度可以“钉住”，其缓存不参与淘汰；
+- 命中、未命中、淘汰次数可通过 stats() 查看。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from config import REPORT_CACHE_CONFIG
+
+
+class LedgerVersions:
+    """账簿版本：一个全局版本（科目表变化影响所有年度）加上每个年度各自的版本"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global = 0
+        self._years = {}
+
+    def bump(self, year=None):
+        """year 为空时使所有年度失效"""
+        with self._lock:
+            if year is None:
+                self._global += 1
+            else:
+                self._years[year] = self._years.get(year, 0) + 1
+
+    def version_of(self, years):
+        with self._lock:
+            return (self._global,) + tuple(self._years.get(y, 0) for y in years)
+
+
+class CachedReport:
+    __slots__ = ("body", "etag", "size")
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.size = len(body)
+
+
+class ReportCache:
+    """线程安全的 LRU 报表缓存"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, pinned_years=()):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # 完整键 -> CachedReport，末尾为最近使用
+        self._latest = {}               # 不含版本的键 -> 当前缓存中的完整键
+        self._bytes = 0
+        self._pinned_years = set(pinned_years)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "replaced": 0}
+
+    @staticmethod
+    def make_key(report, year, params, version):
+        """params 为其余查询参数（如 engine），按名称排序后参与组成键"""
+        base = (report, year, tuple(sorted(params)))
+        return base, version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, key, body):
+        entry = CachedReport(body)
+        base = key[0]
+        with self._lock:
+            # 同一报表/年度/参数只保留最新版本，旧版本立即释放
+            old_key = self._latest.get(base)
+            if old_key is not None and old_key != key:
+                self._remove(old_key)
+                self._stats["replaced"] += 1
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._latest[base] = key
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if self._latest.get(key[0]) == key:
+            del self._latest[key[0]]
+
+    def _is_pinned(self, key):
+        return key[0][1] in self._pinned_years
+
+    def _evict(self):
+        """从最久未用的一端开始淘汰，跳过钉住年度的条目"""
+        if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            if self._is_pinned(key):
+                continue
+            self._remove(key)
+            self._stats["evictions"] += 1
+
+    def pin_year(self, year, pinned=True):
+        """钉住（或取消钉住）某个已结账年度的缓存"""
+        with self._lock:
+            if pinned:
+                self._pinned_years.add(year)
+            else:
+                self._pinned_years.discard(year)
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+            snapshot["max_entries"] = self.max_entries
+            snapshot["max_bytes"] = self.max_bytes
+            snapshot["pinned_years"] = sorted(self._pinned_years)
+            snapshot["pinned_entries"] = sum(1 for key in self._entries if self._is_pinned(key))
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+ledger_versions = LedgerVersions()
+report_cache = ReportCache(**REPORT_CACHE_CONFIG)
+
+
+def bump_ledger_version(year=None):
+    """账簿数据提交后调用；year 为空表示所有年度（如科目表变化）"""
+    ledger_versions.bump(year)
+
+
+def report_key(report, year, depends_on_years, params):
+    """生成缓存键：depends_on_years 为报表所读取的年度（资产负债表还依赖上一年）"""
+    return ReportCache.make_key(report, year, params, ledger_versions.version_of(depends_on_years))
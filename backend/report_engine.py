@@ -0,0 +1,657 @@
+# backend/report_engine.py
+"""
+Python 报表引擎：一次批量读取余额快照，计算全部财务报表。
+
+存储过程版本的报表为每个项目、每个年度各发起一到两次标量子查询。本模块改为：
+1. 一条 SQL 读取本年和上年的 account_balances，按列存入以“分”为单位的整数数组；
+2. 用声明式的项目定义（科目集合、取数口径、符号规则、小计公式）描述报表；
+3. 每张报表在内存中一次遍历求值，输出与存储过程逐行一致的结果。
+
+期间报表（月份或月份区间）由 account_period_balances 的按月发生额合并得到，
+全年数据也可以由 1-12 月的期间行推出。
+
+多年度对比报表（?years=2021-2025）用同一条查询读取全部年度的余额，
+对报表定义只遍历一次，每个项目同时算出各年度的金额（每个年度一列）。
+
+命令行校验（对同一份数据分别运行存储过程和本引擎，逐行比对）：
+    python report_engine.py verify 2025
+    python report_engine.py verify-periods 2025   # 1-12 月期间行合计与年度余额是否一致
+"""
+import argparse
+import re
+import sys
+from array import array
+from decimal import Decimal
+
+import account_tree
+from db_utils import get_db_connection, call_procedure
+
+
+def to_cents(value):
+    """DECIMAL(…,2) 金额转换为整数“分”"""
+    return int(Decimal(value or 0).scaleb(2))
+
+
+def from_cents(cents):
+    """整数“分”转换回两位小数的 Decimal，与数据库返回的类型一致"""
+    return Decimal(cents).scaleb(-2)
+
+
+# ==========================================
+# 余额快照：按年度存放的列式数组
+# ==========================================
+
+class YearBalances:
+    """某一年度的科目余额，按列存放（金额单位：分）"""
+
+    def __init__(self, year):
+        self.year = year
+        self.codes = []
+        self.index = {}
+        self.opening = array('q')
+        self.debit = array('q')
+        self.credit = array('q')
+        self.closing = array('q')
+
+    def append(self, code, opening, debit, credit, closing):
+        self.index[code] = len(self.codes)
+        self.codes.append(code)
+        self.opening.append(to_cents(opening))
+        self.debit.append(to_cents(debit))
+        self.credit.append(to_cents(credit))
+        self.closing.append(to_cents(closing))
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def load_balances(cursor, years):
+    """一条查询读取多个年度的 account_balances，返回 {年度: YearBalances}"""
+    years = sorted(set(years))
+    snapshots = {year: YearBalances(year) for year in years}
+    placeholders = ", ".join(["%s"] * len(years))
+    cursor.execute(f"""
+        SELECT fiscal_year, account_code, opening_balance, period_debit, period_credit, closing_balance
+        FROM account_balances
+        WHERE fiscal_year IN ({placeholders})
+        ORDER BY fiscal_year, account_code
+    """, tuple(years))
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            row = (row["fiscal_year"], row["account_code"], row["opening_balance"],
+                   row["period_debit"], row["period_credit"], row["closing_balance"])
+        snapshots[row[0]].append(*row[1:])
+    return snapshots
+
+
+# ==========================================
+# 期间快照：由按月发生额合并得到
+# ==========================================
+
+def parse_period_args(args):
+    """
+    解析报表的期间参数，返回 (年度, (起始月, 截止月) 或 None)：
+      ?year=2025                     全年（使用年度余额）
+      ?period=2025-03                单月
+      ?from=2025-01&to=2025-03       月份区间（不能跨年）
+    参数不合法时抛出 ValueError。
+    """
+    def parse_month(value, name):
+        match = re.fullmatch(r"(\d{4})-(\d{1,2})", value or "")
+        if not match or not 1 <= int(match.group(2)) <= 12:
+            raise ValueError(f"{name} 格式应为 YYYY-MM")
+        return int(match.group(1)), int(match.group(2))
+
+    if args.get('period'):
+        year, month = parse_month(args.get('period'), 'period')
+        return year, (month, month)
+    if args.get('from') or args.get('to'):
+        if not (args.get('from') and args.get('to')):
+            raise ValueError("from 和 to 必须同时提供")
+        from_year, from_month = parse_month(args.get('from'), 'from')
+        to_year, to_month = parse_month(args.get('to'), 'to')
+        if from_year != to_year:
+            raise ValueError("期间区间不能跨年")
+        if from_month > to_month:
+            raise ValueError("from 不能晚于 to")
+        return from_year, (from_month, to_month)
+    try:
+        year = int(args.get('year') or 0)
+    except ValueError:
+        year = 0
+    if not year:
+        raise ValueError("必须提供年份参数")
+    return year, None
+
+
+MAX_COMPARATIVE_YEARS = 10
+
+
+def parse_years_arg(args):
+    """
+    解析多年度对比参数 ?years=2021-2025 或 ?years=2023,2024,2025，返回升序的年度列表；
+    未提供时返回 None。不能与期间参数同时使用，参数不合法时抛出 ValueError。
+    """
+    value = (args.get('years') or '').strip()
+    if not value:
+        return None
+    if args.get('period') or args.get('from') or args.get('to'):
+        raise ValueError("years 不能与期间参数同时使用")
+    range_match = re.fullmatch(r"(\d{4})\s*-\s*(\d{4})", value)
+    if range_match:
+        first, last = int(range_match.group(1)), int(range_match.group(2))
+        if first > last:
+            raise ValueError("years 的起始年度不能晚于截止年度")
+        years = list(range(first, last + 1))
+    elif re.fullmatch(r"\d{4}(\s*,\s*\d{4})*", value):
+        years = sorted({int(part) for part in value.split(',')})
+    else:
+        raise ValueError("years 格式应为 YYYY-YYYY 或 YYYY,YYYY,...")
+    if len(years) > MAX_COMPARATIVE_YEARS:
+        raise ValueError(f"一次最多对比 {MAX_COMPARATIVE_YEARS} 个年度")
+    return years
+
+
+def load_period_balances(cursor, tree, year, from_month, to_month):
+    """
+    一条查询合并年初余额和按月发生额，得到某年 from_month 至 to_month 的期间快照：
+    期初 = 年初余额 + 之前各月的净发生额，本期借贷 = 区间内各月之和，期末 = 期初 + 本期净发生额。
+    """
+    snapshot = YearBalances(year)
+    cursor.execute("""
+        SELECT ab.account_code, ab.opening_balance,
+               COALESCE(SUM(CASE WHEN p.period_month < %s THEN p.period_debit END), 0),
+               COALESCE(SUM(CASE WHEN p.period_month < %s THEN p.period_credit END), 0),
+               COALESCE(SUM(CASE WHEN p.period_month >= %s THEN p.period_debit END), 0),
+               COALESCE(SUM(CASE WHEN p.period_month >= %s THEN p.period_credit END), 0)
+        FROM account_balances ab
+        LEFT JOIN account_period_balances p
+               ON p.fiscal_year = ab.fiscal_year AND p.account_code = ab.account_code AND p.period_month <= %s
+        WHERE ab.fiscal_year = %s
+        GROUP BY ab.account_code, ab.opening_balance
+        ORDER BY ab.account_code
+    """, (from_month, from_month, from_month, from_month, to_month, year))
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            row = tuple(row.values())
+        code, opening, debit_before, credit_before, debit, credit = row
+        sign = 1 if code not in tree or tree.direction(code) == 'debit' else -1
+        opening = opening + sign * (debit_before - credit_before)
+        closing = opening + sign * (debit - credit)
+        snapshot.append(code, opening, debit, credit, closing)
+    return snapshot
+
+
+# ==========================================
+# 声明式的报表项目定义
+# ==========================================
+#
+# 取数口径 (measure)：
+#   closing / opening / debit / credit —— 直接取对应列
+#   increase —— 期末 - 期初；decrease —— 期初 - 期末
+# 科目选择：codes 精确匹配，prefixes 前缀匹配（对应 SQL 中的 LIKE '1401%'）
+# by_direction：贷方科目取负数（用于“固定资产 - 累计折旧”这类净额）
+# positive_only：只累加结果为正的行（对应 SQL 中的 opening_balance > closing_balance 条件）
+
+def term(measure, codes=(), prefixes=(), sign=1, by_direction=False, positive_only=False):
+    return {"measure": measure, "codes": tuple(codes), "prefixes": tuple(prefixes),
+            "sign": sign, "by_direction": by_direction, "positive_only": positive_only}
+
+
+def item(line, name, *terms):
+    """普通项目：若干取数项之和"""
+    return {"line": line, "name": name, "terms": terms}
+
+
+def formula(line, name, *parts):
+    """计算项目：其他行次的加减，parts 为 (行次, 符号)"""
+    return {"line": line, "name": name, "formula": parts}
+
+
+def subtotal(line, name, lines):
+    """小计项目：对已计算的若干行次求和（lines 为判断行次是否计入的函数）"""
+    return {"line": line, "name": name, "subtotal": lines}
+
+
+def header(line, name):
+    """标题行：没有金额"""
+    return {"line": line, "name": name, "header": True}
+
+
+def fixed(line, name, cents=0):
+    """固定金额（存储过程中简化处理为常数的项目）"""
+    return {"line": line, "name": name, "fixed": cents}
+
+
+BALANCE_SHEET_ASSETS = [
+    item(1, '  货币资金', term('closing', codes=('1001', '1002'))),
+    item(2, '  应收票据', term('closing', codes=('1121',))),
+    item(3, '  应收账款', term('closing', codes=('1122',))),
+    item(4, '  存货', term('closing', prefixes=('1401', '1402', '1403', '1405'))),
+    subtotal(15, '流动资产合计', lambda line: line < 15),
+    item(16, '  固定资产', term('closing', codes=('1601', '1602'), by_direction=True)),
+    item(17, '  无形资产', term('closing', codes=('1701', '1702'), by_direction=True)),
+    subtotal(29, '非流动资产合计', lambda line: 15 < line < 29),
+    subtotal(30, '资产总计', lambda line: line in (15, 29)),
+]
+
+BALANCE_SHEET_LIABILITIES_EQUITY = [
+    item(31, '  短期借款', term('closing', codes=('2001',))),
+    item(32, '  应付账款', term('closing', codes=('2202',))),
+    subtotal(44, '流动负-债合计', lambda line: line < 44),
+    subtotal(52, '负-债合计', lambda line: line == 44),
+    item(53, '实收资本', term('closing', codes=('4001',))),
+    item(54, '资本公积', term('closing', codes=('4002',))),
+    item(55, '盈余公积', term('closing', codes=('4101',))),
+    item(56, '未分配利润', term('closing', codes=('4103', '4104'))),
+    subtotal(58, '所有者权益合计', lambda line: 53 <= line < 58),
+    subtotal(59, '负-债和所有者权益总计', lambda line: line in (52, 58)),
+]
+
+# 资产负债表左右两栏按“负债行次 - 30 = 资产行次”对齐
+BALANCE_SHEET_ROW_OFFSET = 30
+
+INCOME_STATEMENT = [
+    item(1, '一、主营业务收入', term('credit', codes=('6001',))),
+    item(2, '  减：主营业务成本', term('debit', codes=('6401',))),
+    item(3, '       税金及附加', term('debit', codes=('6403',))),
+    item(6, '  减：销售费用', term('debit', codes=('6601',))),
+    item(7, '       管理费用', term('debit', codes=('6602',))),
+    item(8, '       财务费用', term('debit', codes=('6603',))),
+    formula(9, '二、营业利润（亏损以“-”号填列）', (1, 1), (2, -1), (3, -1), (6, -1), (7, -1), (8, -1)),
+    item(12, '  加：营业外收入', term('credit', codes=('6301',))),
+    item(13, '  减：营业外支出', term('debit', codes=('6711',))),
+    formula(14, '三、利润总额（亏损总额以“-”号填列）', (9, 1), (12, 1), (13, -1)),
+    item(15, '  减：所得税费用', term('debit', codes=('6801',))),
+    formula(16, '四、净利润（净亏损以“-”号填列）', (14, 1), (15, -1)),
+]
+
+CASH_FLOW_STATEMENT = [
+    item(2, '  销售商品、提供劳务收到的现金',
+         term('credit', codes=('6001',)),
+         term('decrease', codes=('1122', '1121')),
+         term('increase', codes=('2203', '2205'))),
+    item(3, '  收到的税费返还', term('credit', codes=('6301',))),
+    fixed(4, '  收到其他与经营活动有关的现金'),
+    formula(5, '经营活动现金流入小计', (2, 1), (3, 1), (4, 1)),
+    item(6, '  购买商品、接受劳务支付的现金',
+         term('debit', codes=('6401',)),
+         term('increase', prefixes=('14',)),
+         term('decrease', codes=('2202', '2201')),
+         term('increase', codes=('1123',))),
+    item(7, '  支付给职工以及为职工支付的现金', term('debit', codes=('2211',))),
+    item(8, '  支付的各项税费', term('debit', codes=('2221',))),
+    item(9, '  支付其他与经营活动有关的现金', term('debit', codes=('6601', '6602'))),
+    formula(10, '经营活动现金流出小计', (6, 1), (7, 1), (8, 1), (9, 1)),
+    formula(11, '经营活动产生的现金流量净额', (5, 1), (10, -1)),
+    item(14, '  处置固定资产等收回的现金净额',
+         term('decrease', codes=('1601', '1604', '1701'), positive_only=True)),
+    formula(18, '投资活动现金流入小计', (14, 1)),
+    item(19, '  购建固定资产等支付的现金',
+         term('increase', codes=('1601', '1604', '1701'), positive_only=True)),
+    formula(22, '投资活动现金流出小计', (19, 1)),
+    formula(23, '投资活动产生的现金流量净额', (18, 1), (22, -1)),
+    item(25, '  吸收投资收到的现金', term('increase', codes=('4001', '4002'))),
+    item(26, '  取得借款收到的现金', term('increase', codes=('2001', '2501'), positive_only=True)),
+    formula(29, '筹资活动现金流入小计', (25, 1), (26, 1)),
+    item(30, '  偿还债务支付的现金', term('decrease', codes=('2001', '2501'), positive_only=True)),
+    item(31, '  分配股利、利润或偿付利息支付的现金', term('debit', codes=('6603', '4104'))),
+    formula(33, '筹资活动现金流出小计', (30, 1), (31, 1)),
+    formula(34, '筹资活动产生的现金流量净额', (29, 1), (33, -1)),
+    formula(36, '四、现金及现金等价物净增加额', (11, 1), (23, 1), (34, 1)),
+    item(37, '  加：期初现金及现金等价物余额', term('opening', codes=('1001', '1002', '1012'))),
+    item(38, '五、期末现金及现金等价物余额', term('closing', codes=('1001', '1002', '1012'))),
+    header(1, '一、经营活动产生的现金流量：'),
+    header(12, '二、投资活动产生的现金流量：'),
+    header(24, '三、筹资活动产生的现金流量：'),
+]
+
+
+# ==========================================
+# 求值
+# ==========================================
+
+class StatementEvaluator:
+    """
+    对一个年度快照求值报表项目。
+    account_level 不为空时只使用该级别的科目（利润表、现金流量表只取一级科目）。
+    """
+
+    def __init__(self, balances, tree, account_level=None):
+        self.balances = balances
+        self.tree = tree
+        self.account_level = account_level
+        self._selection_cache = {}
+
+    def _selected_rows(self, codes, prefixes):
+        """把科目选择条件解析为快照中的行号列表（同一条件只解析一次）"""
+        key = (codes, prefixes)
+        rows = self._selection_cache.get(key)
+        if rows is None:
+            balances = self.balances
+            rows = []
+            for code in codes:
+                if code in balances.index:
+                    rows.append(balances.index[code])
+            if prefixes:
+                rows.extend(i for i, code in enumerate(balances.codes) if code.startswith(prefixes))
+            if self.account_level is not None:
+                rows = [i for i in rows
+                        if balances.codes[i] in self.tree
+                        and self.tree.level(balances.codes[i]) == self.account_level]
+            self._selection_cache[key] = rows
+        return rows
+
+    def _term_value(self, spec):
+        b = self.balances
+        total = 0
+        for i in self._selected_rows(spec["codes"], spec["prefixes"]):
+            measure = spec["measure"]
+            if measure == 'closing':
+                value = b.closing[i]
+            elif measure == 'opening':
+                value = b.opening[i]
+            elif measure == 'debit':
+                value = b.debit[i]
+            elif measure == 'credit':
+                value = b.credit[i]
+            elif measure == 'increase':
+                value = b.closing[i] - b.opening[i]
+            elif measure == 'decrease':
+                value = b.opening[i] - b.closing[i]
+            else:
+                raise ValueError(f"未知的取数口径: {measure}")
+            if spec["by_direction"] and self.tree.direction(b.codes[i]) != 'debit':
+                value = -value
+            if spec["positive_only"] and value <= 0:
+                continue
+            total += value
+        return total * spec["sign"]
+
+    def amount(self, spec, values):
+        """求一个项目的金额（分），values 为本年度已算出的 {行次: 金额}"""
+        if spec.get("header"):
+            return None
+        if "fixed" in spec:
+            return spec["fixed"]
+        if "formula" in spec:
+            return sum(values[part] * sign for part, sign in spec["formula"])
+        if "subtotal" in spec:
+            return sum(v for l, v in values.items() if spec["subtotal"](l) and v is not None)
+        return sum(self._term_value(t) for t in spec["terms"])
+
+    def evaluate(self, definition):
+        """按定义顺序求值，返回 [(行次, 项目名称, 金额分或 None), ...]"""
+        return [(line, name, amounts[0]) for line, name, amounts in evaluate_columns([self], definition)]
+
+
+def evaluate_columns(evaluators, definition):
+    """
+    一次遍历报表定义，同时对多个年度（每个 evaluator 一个年度）求值，
+    返回 [(行次, 项目名称, [各年度金额分或 None]), ...]。
+    """
+    values = [{} for _ in evaluators]
+    results = []
+    for spec in definition:
+        line = spec["line"]
+        amounts = []
+        for evaluator, year_values in zip(evaluators, values):
+            amount = evaluator.amount(spec, year_values)
+            year_values[line] = amount
+            amounts.append(amount)
+        results.append((line, spec["name"], amounts))
+    return results
+
+
+def _empty(year):
+    return YearBalances(year)
+
+
+def align_balance_sheet(assets, liabilities):
+    """
+    资产与负债权益两栏按行次对齐，与存储过程相同的两步合并：先写资产行（带上对齐的负债行），
+    再写其余负债行。assets / liabilities 为 [(行次, 名称, 金额), ...]，
+    返回 [(行次, 资产名称, 资产金额, 负债名称, 负债金额), ...]（按写入顺序）。
+    """
+    liabilities_by_asset_line = {line - BALANCE_SHEET_ROW_OFFSET: (name, amount)
+                                 for line, name, amount in liabilities}
+    rows = []
+    for line, name, amount in assets:
+        le_name, le_amount = liabilities_by_asset_line.get(line, (None, None))
+        rows.append((line, name, amount, le_name, le_amount))
+    asset_lines = {line for line, _, _ in assets}
+    for line, name, amount in liabilities:
+        if line not in asset_lines:
+            rows.append((line, None, None, name, amount))
+    return rows
+
+
+def balance_sheet(snapshots, tree, year):
+    """资产负债表：期初数取上年期末，期末数取本年期末；输出与 balance_sheet_report 逐行一致"""
+    evaluators = [StatementEvaluator(snapshots.get(y) or _empty(y), tree) for y in (year - 1, year)]
+    assets = evaluate_columns(evaluators, BALANCE_SHEET_ASSETS)
+    liabilities = evaluate_columns(evaluators, BALANCE_SHEET_LIABILITIES_EQUITY)
+
+    rows = []
+    for row_id, (line, name, amounts, le_name, le_amounts) in enumerate(
+            align_balance_sheet(assets, liabilities), start=1):
+        opening, closing = (from_cents(a) for a in amounts) if amounts else (None, None)
+        le_opening, le_closing = (from_cents(a) for a in le_amounts) if le_amounts else (None, None)
+        rows.append({
+            "id": row_id, "line_index": line,
+            "asset_item": name, "asset_opening": opening, "asset_closing": closing,
+            "liability_equity_item": le_name,
+            "liability_equity_opening": le_opening, "liability_equity_closing": le_closing,
+        })
+    rows.sort(key=lambda r: r["line_index"])
+    return rows
+
+
+def income_statement(snapshots, tree, year):
+    """利润表：只取一级科目的本期发生额；输出与 income_statement_report 逐行一致"""
+    evaluator = StatementEvaluator(snapshots.get(year) or _empty(year), tree, account_level=1)
+    rows = [{"id": row_id, "line_index": line, "item": name, "amount": from_cents(amount)}
+            for row_id, (line, name, amount) in enumerate(evaluator.evaluate(INCOME_STATEMENT), start=1)]
+    rows.sort(key=lambda r: r["line_index"])
+    return rows
+
+
+def cash_flow_statement(snapshots, tree, year):
+    """现金流量表：只取一级科目，上期金额按同一口径取上一年度；输出与 cash_flow_statement_report 逐行一致"""
+    evaluators = [StatementEvaluator(snapshots.get(y) or _empty(y), tree, account_level=1) for y in (year, year - 1)]
+    rows = []
+    for row_id, (line, name, (current, prior)) in enumerate(
+            evaluate_columns(evaluators, CASH_FLOW_STATEMENT), start=1):
+        rows.append({
+            "id": row_id, "line_index": line, "item": name,
+            "current_period_amount": None if current is None else from_cents(current),
+            "prior_period_amount": None if prior is None else from_cents(prior),
+        })
+    rows.sort(key=lambda r: r["line_index"])
+    return rows
+
+
+STATEMENTS = {
+    "balance_sheet": (balance_sheet, (-1, 0)),
+    "income_statement": (income_statement, (0,)),
+    "cash_flow_statement": (cash_flow_statement, (-1, 0)),
+}
+
+
+def generate_report(cursor, report, year, months=None):
+    """
+    读取所需年度的余额快照（一条查询）并生成指定报表。
+    months=(起始月, 截止月) 时本年数据改用期间快照；资产负债表的期初数仍取上年期末（即年初数）。
+    """
+    builder, year_offsets = STATEMENTS[report]
+    tree = account_tree.get_account_tree(cursor)
+    if months is None:
+        snapshots = load_balances(cursor, [year + offset for offset in year_offsets])
+    elif report == 'balance_sheet':
+        # 期初数是上年期末（即本年年初），与所选期间无关
+        snapshots = load_balances(cursor, [year - 1])
+        snapshots[year] = load_period_balances(cursor, tree, year, *months)
+    else:
+        # 现金流量表的上期金额取上年同一期间
+        snapshots = {year + offset: load_period_balances(cursor, tree, year + offset, *months)
+                     for offset in year_offsets}
+    return builder(snapshots, tree, year)
+
+
+def comparative_report(cursor, report, years):
+    """
+    多年度对比报表：一条查询读取全部年度的余额，一次遍历报表定义得到各年度的金额。
+    返回 {"years": [...], "rows": [...]}，每行的金额字段是与 years 对应的列表：
+      资产负债表   asset_item / asset_amounts、liability_equity_item / liability_equity_amounts（各年末数）
+      利润表       item / amounts（各年度发生额）
+      现金流量表   item / amounts（各年度金额）
+    """
+    if report not in STATEMENTS:
+        raise ValueError(f"{report} 不支持多年度对比")
+    years = sorted(set(years))
+    tree = account_tree.get_account_tree(cursor)
+    snapshots = load_balances(cursor, years)
+    level = None if report == 'balance_sheet' else 1
+    evaluators = [StatementEvaluator(snapshots[year], tree, account_level=level) for year in years]
+
+    def money(amounts):
+        return None if amounts is None else [None if a is None else from_cents(a) for a in amounts]
+
+    if report == 'balance_sheet':
+        aligned = align_balance_sheet(evaluate_columns(evaluators, BALANCE_SHEET_ASSETS),
+                                      evaluate_columns(evaluators, BALANCE_SHEET_LIABILITIES_EQUITY))
+        rows = [{"line_index": line, "asset_item": name, "asset_amounts": money(amounts),
+                 "liability_equity_item": le_name, "liability_equity_amounts": money(le_amounts)}
+                for line, name, amounts, le_name, le_amounts in aligned]
+    else:
+        definition = INCOME_STATEMENT if report == 'income_statement' else CASH_FLOW_STATEMENT
+        rows = [{"line_index": line, "item": name, "amounts": money(amounts)}
+                for line, name, amounts in evaluate_columns(evaluators, definition)]
+    rows.sort(key=lambda r: r["line_index"])
+    return {"report": report, "years": years, "rows": rows}
+
+
+def account_summary(snapshot, tree):
+    """由快照生成科目汇总表（字段与 /api/reports/account_summary 一致）"""
+    rows = []
+    for i, code in enumerate(snapshot.codes):
+        node = tree.nodes.get(code)
+        rows.append({
+            "account_code": code,
+            "account_name": node.row["account_name"] if node else None,
+            "opening_balance": from_cents(snapshot.opening[i]),
+            "period_debit": from_cents(snapshot.debit[i]),
+            "period_credit": from_cents(snapshot.credit[i]),
+            "closing_balance": from_cents(snapshot.closing[i]),
+        })
+    return rows
+
+
+def generate_all(cursor, year):
+    """一次读取本年和上年余额，生成全部三张报表"""
+    tree = account_tree.get_account_tree(cursor)
+    snapshots = load_balances(cursor, [year - 1, year])
+    return {name: builder(snapshots, tree, year) for name, (builder, _) in STATEMENTS.items()}
+
+
+# ==========================================
+# 校验：与存储过程的结果逐行比对
+# ==========================================
+
+PROCEDURES = {
+    "balance_sheet": "proc_generate_balance_sheet",
+    "income_statement": "proc_generate_income_statement",
+    "cash_flow_statement": "proc_generate_cash_flow_statement",
+}
+
+
+def run_procedure(conn, report, year):
+    """运行存储过程并读取其返回的结果集（与原有接口的取数方式相同）"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return call_procedure(cursor, PROCEDURES[report], (year,))
+    finally:
+        cursor.close()
+
+
+def diff_report(expected, actual):
+    """逐行逐列比对，返回差异描述列表"""
+    diffs = []
+    if len(expected) != len(actual):
+        diffs.append(f"行数不同: 存储过程 {len(expected)} 行, 引擎 {len(actual)} 行")
+    for i, (exp, act) in enumerate(zip(expected, actual)):
+        for key in sorted(set(exp) | set(act)):
+            if exp.get(key) != act.get(key):
+                diffs.append(f"第 {i + 1} 行 {key}: 存储过程={exp.get(key)!r}, 引擎={act.get(key)!r}")
+    return diffs
+
+
+def verify(conn, year, reports=None):
+    """对同一份数据分别运行存储过程和本引擎，返回 {报表: 差异列表}"""
+    cursor = conn.cursor()
+    try:
+        tree = account_tree.build_tree(cursor)
+        snapshots = load_balances(cursor, [year - 1, year])
+    finally:
+        cursor.close()
+    results = {}
+    for report in reports or STATEMENTS:
+        builder, _ = STATEMENTS[report]
+        results[report] = diff_report(run_procedure(conn, report, year), builder(snapshots, tree, year))
+    return results
+
+
+def verify_periods(conn, year):
+    """由 1-12 月期间行推出的全年快照应与 account_balances 完全一致，返回差异描述列表"""
+    cursor = conn.cursor()
+    try:
+        tree = account_tree.build_tree(cursor)
+        yearly = load_balances(cursor, [year])[year]
+        derived = load_period_balances(cursor, tree, year, 1, 12)
+    finally:
+        cursor.close()
+    diffs = []
+    for column in ("opening", "debit", "credit", "closing"):
+        for i, code in enumerate(yearly.codes):
+            expected, actual = getattr(yearly, column)[i], getattr(derived, column)[derived.index[code]]
+            if expected != actual:
+                diffs.append(f"{code} {column}: 年度余额={from_cents(expected)}, 期间合计={from_cents(actual)}")
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Python 报表引擎")
+    sub = parser.add_subparsers(dest="command", required=True)
+    verify_parser = sub.add_parser("verify", help="与存储过程的结果逐行比对")
+    verify_parser.add_argument("year", type=int, help="会计年度")
+    verify_parser.add_argument("--report", choices=sorted(STATEMENTS), action="append",
+                               help="只校验指定报表（可重复）")
+    periods_parser = sub.add_parser("verify-periods", help="校验 1-12 月期间行合计与年度余额一致")
+    periods_parser.add_argument("year", type=int, help="会计年度")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if conn is None:
+        sys.exit(1)
+    try:
+        if args.command == "verify-periods":
+            results = {"periods": verify_periods(conn, args.year)}
+        else:
+            results = verify(conn, args.year, args.report)
+    finally:
+        conn.close()
+
+    failed = False
+    for report, diffs in results.items():
+        if diffs:
+            failed = True
+            print(f"[不一致] {report}")
+            for line in diffs:
+                print(f"    {line}")
+        else:
+            print(f"[一致] {report}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
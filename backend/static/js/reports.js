@@ -19,6 +19,120 @@ $(document).ready(function() {
     });
     // ==================================================================
 
+    // ==================== 报表渲染函数（单张报表和一次加载全部共用） ====================
+    // 资产负债表
+    function renderBalanceSheet(data, year) {
+        // 【修正】使用反引号(`)来创建多行字符串，并移除行尾的反斜杠(\)
+        let html = `
+            <h3>资产负债表</h3>
+            <table border="1" style="width:100%">
+                <thead>
+                    <tr>
+                        <th>资产项目</th>
+                        <th>期初数</th>
+                        <th>期末数</th>
+                        <th>负债和所有者权益</th>
+                        <th>期初数</th>
+                        <th>期末数</th>
+                    </tr>
+                </thead>
+                <tbody>`;
+        data.forEach(function(row) {
+            html += `<tr>
+                <td style="text-align: left;">${row.asset_item || ''}</td>
+                <td style="text-align: right;">${formatNumber(row.asset_opening)}</td>
+                <td style="text-align: right;">${formatNumber(row.asset_closing)}</td>
+                <td style="text-align: left;">${row.liability_equity_item || ''}</td>
+                <td style="text-align: right;">${formatNumber(row.liability_equity_opening)}</td>
+                <td style="text-align: right;">${formatNumber(row.liability_equity_closing)}</td>
+            </tr>`;
+        });
+        html += '</tbody></table>';
+        return html;
+    }
+
+    // 利润表
+    function renderIncomeStatement(data, year) {
+        let html = `
+            <h3>利润表</h3>
+            <p style="text-align:center;">${year}年度</p>
+            <table border="1" style="width:100%">
+                <thead>
+                    <tr>
+                        <th>项目</th>
+                        <th>行次</th>
+                        <th>金额</th>
+                    </tr>
+                </thead>
+                <tbody>`;
+        data.forEach(function(row) {
+            let amount = row.amount;
+            let itemText = row.item || '';
+            html += `
+                    <tr>
+                        <td style="text-align: left;">${itemText}</td>
+                        <td>${row.line_index || ''}</td>
+                        <td style="text-align: right;">${formatNumber(amount)}</td>
+                    </tr>`;
+        });
+        html += '</tbody></table>';
+        return html;
+    }
+
+    // 现金流量表
+    function renderCashFlowStatement(data, year) {
+        let html = `
+            <h3>现金流量表</h3>
+            <table border="1" style="width:100%">
+                <thead>
+                    <tr>
+                        <th>项目</th>
+                        <th>本期金额</th>
+                        <th>上期金额</th>
+                    </tr>
+                </thead>
+                <tbody>`;
+        data.forEach(function(row) {
+            html += `<tr>
+                <td>${row.item || ''}</td>
+                <td style="text-align: right;">${formatNumber(row.current_period_amount)}</td>
+                <td style="text-align: right;">${formatNumber(row.prior_period_amount)}</td>
+            </tr>`;
+        });
+        html += '</tbody></table>';
+        return html;
+    }
+
+    // 科目汇总表
+    function renderAccountSummary(data, year) {
+        let html = `
+            <h3>科目汇总表</h3>
+            <table border="1" style="width:100%">
+                <thead>
+                    <tr>
+                        <th>科目代码</th>
+                        <th>科目名称</th>
+                        <th>期初余额</th>
+                        <th>本期借方</th>
+                        <th>本期贷方</th>
+                        <th>期末余额</th>
+                    </tr>
+                </thead>
+                <tbody>`;
+        data.forEach(function(row) {
+            html += `<tr>
+                <td>${row.account_code}</td>
+                <td>${row.account_name}</td>
+                <td>${formatNumber(row.opening_balance)}</td>
+                <td>${formatNumber(row.period_debit)}</td>
+                <td>${formatNumber(row.period_credit)}</td>
+                <td>${formatNumber(row.closing_balance)}</td>
+            </tr>`;
+        });
+        html += '</tbody></table>';
+        return html;
+    }
+
     // --- 步骤一：生成并查看科目汇总表 ---
     $('#btn-generate-summary').on('click', function() {
         const year = $yearInput.val();
@@ -32,9 +146,11 @@ $(document).ready(function() {
             type: 'POST',
             contentType: 'application/json',
             data: JSON.stringify({ year: parseInt(year) }),
-            success: function(response) {
-                alert(response.message);
-                fetchAndDisplaySummary(year);
+            success: function(job) {
+                // 汇总在后台执行，轮询任务状态，完成后再加载汇总表
+                waitForJob(job, function() {
+                    fetchAndDisplaySummary(year);
+                });
             },
             error: function(xhr) { 
                 alert('汇总数据生成失败: ' + (xhr.responseJSON ? xhr.responseJSON.error : '未知错误'));
@@ -42,37 +158,35 @@ $(document).ready(function() {
         });
     });
 
+    // 轮询后台任务：服务端最多挂起 wait 秒，任务结束即返回
+    function waitForJob(job, onSuccess) {
+        $displayArea.html(`<p>${job.message}（${job.progress}%）</p>`);
+        if (job.status === 'succeeded') {
+            onSuccess(job);
+            return;
+        }
+        if (job.status === 'failed') {
+            $displayArea.html(`<p style="color: red;">汇总数据生成失败: ${job.error}</p>`);
+            return;
+        }
+        $.ajax({
+            url: `${job.status_url || '/api/jobs/' + job.job_id}?wait=2`,
+            type: 'GET',
+            success: function(latest) {
+                waitForJob(latest, onSuccess);
+            },
+            error: function(xhr) {
+                $displayArea.html(`<p style="color: red;">查询任务状态失败: ${xhr.responseJSON ? xhr.responseJSON.error : '未知错误'}</p>`);
+            }
+        });
+    }
+
     function fetchAndDisplaySummary(year) {
         $.ajax({
             url: `/api/reports/account_summary?year=${year}`,
             type: 'GET',
             success: function(data) {
-                let html = `
-                    <h3>科目汇总表</h3>
-                    <table border="1" style="width:100%">
-                        <thead>
-                            <tr>
-                                <th>科目代码</th>
-                                <th>科目名称</th>
-                                <th>期初余额</th>
-                                <th>本期借方</th>
-                                <th>本期贷方</th>
-                                <th>期末余额</th>
-                            </tr>
-                        </thead>
-                        <tbody>`;
-                data.forEach(function(row) {
-                    html += `<tr>
-                        <td>${row.account_code}</td>
-                        <td>${row.account_name}</td>
-                        <td>${formatNumber(row.opening_balance)}</td>
-                        <td>${formatNumber(row.period_debit)}</td>
-                        <td>${formatNumber(row.period_credit)}</td>
-                        <td>${formatNumber(row.closing_balance)}</td>
-                    </tr>`;
-                });
-                html += '</tbody></table>';
-                $displayArea.html(html);
+                $displayArea.html(renderAccountSummary(data, year));
             },
             error: function(xhr) {
                 alert('获取科目汇总表失败: ' + (xhr.responseJSON ? xhr.responseJSON.error : '未知错误'));
@@ -91,33 +205,7 @@ $(document).ready(function() {
             url: `/api/reports/balance_sheet?year=${year}`,
             type: 'GET',
             success: function(data) {
-                // 【修正】使用反引号(`)来创建多行字符串，并移除行尾的反斜杠(\)
-                let html = `
-                    <h3>资产负债表</h3>
-                    <table border="1" style="width:100%">
-                        <thead>
-                            <tr>
-                                <th>资产项目</th>
-                                <th>期初数</th>
-                                <th>期末数</th>
-                                <th>负债和所有者权益</th>
-                                <th>期初数</th>
-                                <th>期末数</th>
-                            </tr>
-                        </thead>
-                        <tbody>`;
-                data.forEach(function(row) {
-                    html += `<tr>
-                        <td style="text-align: left;">${row.asset_item || ''}</td>
-                        <td style="text-align: right;">${formatNumber(row.asset_opening)}</td>
-                        <td style="text-align: right;">${formatNumber(row.asset_closing)}</td>
-                        <td style="text-align: left;">${row.liability_equity_item || ''}</td>
-                        <td style="text-align: right;">${formatNumber(row.liability_equity_opening)}</td>
-                        <td style="text-align: right;">${formatNumber(row.liability_equity_closing)}</td>
-                    </tr>`;
-                });
-                html += '</tbody></table>';
-                $displayArea.html(html);
+                $displayArea.html(renderBalanceSheet(data, year));
             },
             error: function(xhr) { 
                 alert('获取资产负债表失败: ' + (xhr.responseJSON ? xhr.responseJSON.error : '未知错误'));
@@ -136,30 +224,7 @@ $(document).ready(function() {
             url: `/api/reports/income_statement?year=${year}`,
             type: 'GET',
             success: function(data) {
-                let html = `
-                    <h3>利润表</h3>
-                    <p style="text-align:center;">${year}年度</p>
-                    <table border="1" style="width:100%">
-                        <thead>
-                            <tr>
-                                <th>项目</th>
-                                <th>行次</th>
-                                <th>金额</th>
-                            </tr>
-                        </thead>
-                        <tbody>`;
-                data.forEach(function(row) {
-                    let amount = row.amount;
-                    let itemText = row.item || '';
-                    html += `
-                            <tr>
-                                <td style="text-align: left;">${itemText}</td>
-                                <td>${row.line_index || ''}</td>
-                                <td style="text-align: right;">${formatNumber(amount)}</td>
-                            </tr>`;
-                });
-                html += '</tbody></table>';
-                $displayArea.html(html);
+                $displayArea.html(renderIncomeStatement(data, year));
             },
             error: function(xhr) { 
                 alert('获取利润表失败: ' + (xhr.responseJSON ? xhr.responseJSON.error : '未知错误'));
@@ -178,24 +243,7 @@ $(document).ready(function() {
             url: `/api/reports/cash_flow_statement?year=${year}`,
             type: 'GET',
             success: function(data) {
-                let html = `
-                    <h3>现金流量表</h3>
-                    <table border="1" style="width:100%">
-                        <thead>
-                            <tr>
-                                <th>项目</th>
-                                <th>金额</th>
-                            </tr>
-                        </thead>
-                        <tbody>`;
-                data.forEach(function(row) {
-                    html += `<tr>
-                        <td>${row.item || ''}</td>
-                        <td style="text-align: right;">${formatNumber(row.current_period_amount)}</td>
-                    </tr>`;
-                });
-                html += '</tbody></table>';
-                $displayArea.html(html);
+                $displayArea.html(renderCashFlowStatement(data, year));
             },
             error: function(xhr) { 
                 alert('获取现金流量表失败: ' + (xhr.responseJSON ? xhr.responseJSON.error : '未知错误'));
@@ -217,16 +265,8 @@ $(document).ready(function() {
             success: function(data) {
                 let html = '<h3>一级科目试算平衡表</h3><table><thead><tr><th>项目</th><th style="text-align: right;">借方总额</th><th style="text-align: right;">贷方总额</th><th>平衡状态</th></tr></thead><tbody>';
 
-                let opening_balanced = false;
-                let closing_balanced = false;
-
-                data.forEach(function(row) {
-                    let is_balanced = parseFloat(row.total_debit).toFixed(2) === parseFloat(row.total_credit).toFixed(2);
-                    let status_badge = is_balanced ? '<span style="color: green;">✔ 平衡</span>' : '<span style="color: red;">❌ 不平衡</span>';
-
-                    if (row.item_name === '期初余额') opening_balanced = is_balanced;
-                    if (row.item_name === '期末余额') closing_balanced = is_balanced;
-
+                data.rows.forEach(function(row) {
+                    let status_badge = row.balanced ? '<span style="color: green;">✔ 平衡</span>' : '<span style="color: red;">❌ 不平衡</span>';
                     html += `<tr>
                         <td><strong>${row.item_name}</strong></td>
                         <td style="text-align: right;">${formatNumber(row.total_debit)}</td>
@@ -235,12 +275,29 @@ $(document).ready(function() {
                     </tr>`;
                 });
                 html += '</tbody></table>';
-                
-                if (opening_balanced && closing_balanced) {
-                    html += '<p style="color: green; font-weight: bold; margin-top: 10px;">结论：账务系统在期初和期末均保持平衡。</p>';
+
+                html += '<h3>账簿完整性检查</h3><table><thead><tr><th>检查项</th><th style="text-align: right;">问题数</th></tr></thead><tbody>';
+                const issueTitles = {
+                    unbalanced_vouchers: '问题凭证（借贷不平衡、金额不符、非末级科目）',
+                    closing_mismatches: '期初 + 发生额 ≠ 期末',
+                    parent_mismatches: '上级科目 ≠ 下级科目之和',
+                    movement_mismatches: '余额表发生额与分录不符'
+                };
+                Object.entries(issueTitles).forEach(function([name, title]) {
+                    const count = data.issues[name].count;
+                    const color = count ? 'red' : 'green';
+                    html += `<tr><td>${title}</td><td style="text-align: right; color: ${color};">${count}</td></tr>`;
+                });
+                html += '</tbody></table>';
+
+                if (data.ok) {
+                    html += '<p style="color: green; font-weight: bold; margin-top: 10px;">结论：账务系统在期初和期末均保持平衡，余额表与分录一致。</p>';
+                } else if (data.balanced) {
+                    html += '<p style="color: red; font-weight: bold; margin-top: 10px;">警告：试算平衡，但完整性检查发现问题，请检查凭证和科目余额（批量模式下请先重新汇总）！</p>';
                 } else {
                     html += '<p style="color: red; font-weight: bold; margin-top: 10px;">警告：账务系统存在不平衡，请检查您的凭证和期初数据！</p>';
                 }
+                html += `<p style="color: #888;">分录 ${data.ledger.entries} 条，凭证 ${data.ledger.vouchers} 张，耗时 ${(data.timings.total_seconds * 1000).toFixed(0)}ms</p>`;
                 $displayArea.html(html);
             },
             error: function(xhr) {
@@ -249,5 +306,44 @@ $(document).ready(function() {
         });
     });
 
+    // --- 一次加载全部报表：服务端并行生成，总耗时取决于最慢的一张 ---
+    const bundleRenderers = [
+        ['account_summary', renderAccountSummary],
+        ['balance_sheet', renderBalanceSheet],
+        ['income_statement', renderIncomeStatement],
+        ['cash_flow_statement', renderCashFlowStatement]
+    ];
+
+    $('#btn-get-bundle').on('click', function() {
+        const year = $yearInput.val();
+        if (!year) {
+            alert('请输入年份！');
+            return;
+        }
+        $displayArea.html('<p>正在生成全部报表...</p>');
+        $.ajax({
+            url: `/api/reports/bundle?year=${year}&reports=${bundleRenderers.map(r => r[0]).join(',')}`,
+            type: 'GET',
+            success: function(bundle) {
+                let html = '';
+                bundleRenderers.forEach(function([name, render]) {
+                    if (bundle.reports[name]) {
+                        html += render(bundle.reports[name], year);
+                    } else if (bundle.errors[name]) {
+                        html += `<p style="color: red;">${bundle.errors[name]}</p>`;
+                    }
+                });
+                const timings = Object.entries(bundle.timings)
+                    .map(([name, t]) => `${name} ${(t.seconds * 1000).toFixed(0)}ms${t.cached ? '（缓存）' : ''}`)
+                    .join('，');
+                html += `<p style="color: #888;">总耗时 ${(bundle.total_seconds * 1000).toFixed(0)}ms：${timings}</p>`;
+                $displayArea.html(html);
+            },
+            error: function(xhr) {
+                $displayArea.html(`<p style="color: red;">获取报表失败: ${xhr.responseJSON ? xhr.responseJSON.error : '未知错误'}</p>`);
+            }
+        });
+    });
+
 });
 
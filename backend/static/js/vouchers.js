@@ -2,18 +2,30 @@
 $(document).ready(function() {
     const $tableBody = $('#vouchers-table tbody');
     const $modal = $('#voucher-details-modal');
+    const $loadMore = $('#load-more-vouchers');
+    let nextCursor = null;
 
     function formatNumber(value) {
         return parseFloat(value).toFixed(2);
     }
 
-    function loadVouchers() {
+    // append 为 true 时从上一页的游标继续加载并追加到表格末尾
+    function loadVouchers(append) {
+        const params = {};
+        if (append && nextCursor) {
+            params.cursor = nextCursor;
+        }
         $.ajax({
             url: '/api/vouchers',
             type: 'GET',
-            success: function(vouchers) {
-                $tableBody.empty();
-                vouchers.forEach(function(voucher) {
+            data: params,
+            success: function(data) {
+                if (!append) {
+                    $tableBody.empty();
+                }
+                nextCursor = data.next_cursor;
+                $loadMore.toggle(Boolean(nextCursor));
+                data.vouchers.forEach(function(voucher) {
                     const row = `
                         <tr data-id="${voucher.id}" class="view-details" style="cursor: pointer;">
                             <td>${voucher.voucher_date}</td>
@@ -97,7 +109,37 @@ sp;&nbsp; 贷方 ${formatNumber(totalCredit)}</span>`);
             });
         }
     });
+    // --- 按月导出凭证（头+分录），用于打印 ---
+    function exportMonth(format) {
+        const month = $('#export-month').val();
+        if (!month) {
+            alert('请先选择导出月份');
+            return;
+        }
+        const [year, mon] = month.split('-').map(Number);
+        const lastDay = new Date(year, mon, 0).getDate();
+        const params = $.param({
+            date_from: `${month}-01`,
+            date_to: `${month}-${String(lastDay).padStart(2, '0')}`,
+            format: format
+        });
+        window.location.href = `/api/vouchers/details?${params}`;
+    }
+
+    $('#btn-export-csv').on('click', function() {
+        exportMonth('csv');
+    });
+
+    $('#btn-export-xlsx').on('click', function() {
+        exportMonth('xlsx');
+    });
+
+    // --- 加载更多 ---
+    $loadMore.on('click', function() {
+        loadVouchers(true);
+    });
+
     // --- 初始加载 ---
-    loadVouchers();
+    loadVouchers(false);
 });
 
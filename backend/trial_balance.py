@@ -0,0 +1,293 @@
+# backend/trial_balance.py
+"""
+试算平衡与账簿完整性检查。
+
+- 分录用非缓冲游标按 voucher_id 顺序分批 fetchmany，一次遍历同时得到：
+  各末级科目的借贷发生额合计（再汇总到全部上级科目）、全账借贷合计，
+  以及借贷不平衡、与凭证头金额不符、使用了非末级科目的凭证；
+  内存中只保留按科目的合计和当前这一张凭证，几百万行分录也不会整体读入；
+- 对照 account_balances 检查：
+  1. 期初余额 + 本期发生额 = 期末余额（按科目余额方向）；
+  2. 上级科目的期初、借方、贷方、期末等于其直接下级科目之和（方向相反的下级按负数计入）；
+  3. 余额表中的本期借贷发生额与分录汇总一致（批量模式下未重新汇总时会在这里体现）；
+- 试算平衡表：一级科目的期初、期末余额按方向分列借贷，本期发生额取分录的全账合计，
+  每行给出借贷是否相等。
+
+全部查询在同一个事务（同一个一致性快照）中执行。
+
+命令行（适合夜间定时运行，有问题时退出码为 1）：
+    python trial_balance.py 2025
+    python trial_balance.py 2025 --output trial_balance_2025.json
+"""
+import argparse
+import datetime
+import json
+import sys
+import time
+
+import account_tree
+import archive
+from config import TRIAL_BALANCE_CONFIG
+from db_utils import db_cursor
+from ledger_balances import ZERO, rollup_deltas
+
+BALANCE_FIELDS = ("opening_balance", "period_debit", "period_credit", "closing_balance")
+
+
+def split_balance(direction, balance):
+    """按余额方向把余额分列到 (借方, 贷方)，余额为负时列到相反一方"""
+    if direction == "credit":
+        balance = -balance
+    return (balance, ZERO) if balance >= 0 else (ZERO, -balance)
+
+
+def signed(direction, debit, credit):
+    return debit - credit if direction == "debit" else credit - debit
+
+
+class IssueList:
+    """只保留前 limit 条明细，数量完整统计"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self.items = []
+
+    def add(self, item):
+        self.count += 1
+        if len(self.items) < self.limit:
+            self.items.append(item)
+
+    def to_dict(self):
+        return {"count": self.count, "items": self.items}
+
+
+def load_balances(cursor, year):
+    cursor.execute("""
+        SELECT account_code, opening_balance, period_debit, period_credit, closing_balance
+        FROM account_balances WHERE fiscal_year = %s
+    """, (year,))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def scan_entries(cursor, tree, year, vouchers, fetch_size):
+    """
+    遍历本年全部分录，返回 ({末级科目: [借方, 贷方]}, 统计)。
+    问题凭证追加到 vouchers（IssueList）。已归档的年度读取归档表。
+    """
+    sources = archive.table_sources(cursor, datetime.date(year, 1, 1), datetime.date(year, 12, 31))
+    sql, params = archive.union_all("""
+        SELECT je.voucher_id, v.voucher_date, v.voucher_type, v.voucher_number, v.total_amount,
+               je.account_code, je.debit_amount, je.credit_amount
+        FROM {entries} je
+        JOIN {vouchers} v ON je.voucher_id = v.id
+        WHERE v.voucher_date >= %s AND v.voucher_date < %s
+    """, (f"{year}-01-01", f"{year + 1}-01-01"), sources)
+    cursor.execute(sql + " ORDER BY voucher_id", params)
+
+    totals = {}
+    stats = {"entries": 0, "vouchers": 0, "total_debit": ZERO, "total_credit": ZERO}
+    current = None   # 当前凭证: [voucher_id, 日期, 凭证号, 凭证头金额, 借方, 贷方, 非末级科目集合]
+
+    def finish(voucher):
+        voucher_id, voucher_date, ref, total_amount, debit, credit, non_leaf = voucher
+        problems = []
+        if debit != credit:
+            problems.append(f"借贷不平衡（差额 {debit - credit}）")
+        if total_amount != debit:
+            problems.append(f"凭证头金额 {total_amount} 与借方合计不符")
+        if non_leaf:
+            problems.append(f"使用了非末级科目 {', '.join(sorted(non_leaf))}")
+        if problems:
+            vouchers.add({"voucher_id": voucher_id, "voucher_date": voucher_date, "voucher_ref": ref,
+                          "total_debit": debit, "total_credit": credit, "total_amount": total_amount,
+                          "problems": problems})
+
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        stats["entries"] += len(rows)
+        for voucher_id, voucher_date, voucher_type, voucher_number, total_amount, code, debit, credit in rows:
+            if current is None or current[0] != voucher_id:
+                if current is not None:
+                    finish(current)
+                stats["vouchers"] += 1
+                current = [voucher_id, voucher_date, f"{voucher_type}-{voucher_number:04d}", total_amount,
+                           ZERO, ZERO, set()]
+            current[4] += debit
+            current[5] += credit
+            if not tree.is_leaf(code):
+                current[6].add(code)
+            bucket = totals.get(code)
+            if bucket is None:
+                bucket = totals[code] = [ZERO, ZERO]
+            bucket[0] += debit
+            bucket[1] += credit
+            stats["total_debit"] += debit
+            stats["total_credit"] += credit
+    if current is not None:
+        finish(current)
+    return totals, stats
+
+
+def check_balances(tree, balances, movements, issues):
+    """余额表的三项检查，问题追加到 issues 中对应的 IssueList"""
+    for code, (opening, debit, credit, closing) in balances.items():
+        if code not in tree:
+            continue
+        expected = opening + signed(tree.direction(code), debit, credit)
+        if closing != expected:
+            issues["closing_mismatches"].add({"account_code": code, "opening_balance": opening,
+                                              "period_debit": debit, "period_credit": credit,
+                                              "closing_balance": closing, "expected_closing": expected})
+
+    empty = (ZERO, ZERO, ZERO, ZERO)
+    for code in tree.codes:
+        node = tree.nodes[code]
+        if not node.children:
+            continue
+        expected = [ZERO, ZERO, ZERO, ZERO]
+        for child in node.children:
+            opening, debit, credit, closing = balances.get(child, empty)
+            sign = 1 if tree.direction(child) == node.direction else -1
+            expected[0] += opening * sign
+            expected[1] += debit
+            expected[2] += credit
+            expected[3] += closing * sign
+        recorded = balances.get(code, empty)
+        for field, value, total in zip(BALANCE_FIELDS, recorded, expected):
+            if value != total:
+                issues["parent_mismatches"].add({"account_code": code, "field": field,
+                                                 "recorded": value, "children_total": total})
+
+    for code in sorted(set(movements) | {c for c, row in balances.items() if row[1] or row[2]}):
+        debit, credit = movements.get(code, (ZERO, ZERO))
+        recorded = balances.get(code, empty)
+        if (recorded[1], recorded[2]) != (debit, credit):
+            issues["movement_mismatches"].add({"account_code": code,
+                                               "recorded_debit": recorded[1], "recorded_credit": recorded[2],
+                                               "ledger_debit": debit, "ledger_credit": credit})
+
+
+def summary_rows(tree, balances, stats):
+    """试算平衡表三行：一级科目期初余额、本期发生额（全账分录合计）、一级科目期末余额"""
+    opening = [ZERO, ZERO]
+    closing = [ZERO, ZERO]
+    for code, (opening_balance, _debit, _credit, closing_balance) in balances.items():
+        if code not in tree or tree.level(code) != 1:
+            continue
+        direction = tree.direction(code)
+        for bucket, balance in ((opening, opening_balance), (closing, closing_balance)):
+            debit, credit = split_balance(direction, balance)
+            bucket[0] += debit
+            bucket[1] += credit
+
+    rows = []
+    for name, (debit, credit) in (("期初余额", opening), ("本期发生额", (stats["total_debit"], stats["total_credit"])),
+                                  ("期末余额", closing)):
+        rows.append({"item_name": name, "total_debit": debit, "total_credit": credit,
+                     "difference": debit - credit, "balanced": debit == credit})
+    return rows
+
+
+def account_rows(tree, balances, movements):
+    """一级科目的六栏试算平衡表（期初、本期、期末各分借贷）"""
+    rows = []
+    empty = (ZERO, ZERO, ZERO, ZERO)
+    for code in tree.codes:
+        if tree.level(code) != 1:
+            continue
+        opening, _debit, _credit, closing = balances.get(code, empty)
+        if code not in balances and code not in movements:
+            continue
+        direction = tree.direction(code)
+        debit, credit = movements.get(code, (ZERO, ZERO))
+        opening_debit, opening_credit = split_balance(direction, opening)
+        closing_debit, closing_credit = split_balance(direction, closing)
+        rows.append({"account_code": code, "account_name": tree.nodes[code].row["account_name"],
+                     "opening_debit": opening_debit, "opening_credit": opening_credit,
+                     "period_debit": debit, "period_credit": credit,
+                     "closing_debit": closing_debit, "closing_credit": closing_credit})
+    return rows
+
+
+def run_trial_balance(year, fetch_size=None, max_issues=None):
+    """生成 year 年度的试算平衡表和完整性检查结果"""
+    fetch_size = fetch_size or TRIAL_BALANCE_CONFIG['fetch_size']
+    max_issues = max_issues or TRIAL_BALANCE_CONFIG['max_reported_issues']
+    issues = {name: IssueList(max_issues) for name in
+              ("unbalanced_vouchers", "closing_mismatches", "parent_mismatches", "movement_mismatches")}
+
+    started = time.perf_counter()
+    with db_cursor() as (conn, cursor):
+        tree = account_tree.get_account_tree(cursor)
+        balances = load_balances(cursor, year)
+        loaded = time.perf_counter()
+        leaf_totals, stats = scan_entries(cursor, tree, year, issues["unbalanced_vouchers"], fetch_size)
+        scanned = time.perf_counter()
+        conn.rollback()   # 只读事务，结束快照
+
+    movements = rollup_deltas(tree, [(code, debit, credit) for code, (debit, credit) in leaf_totals.items()])
+    check_balances(tree, balances, movements, issues)
+    rows = summary_rows(tree, balances, stats)
+    finished = time.perf_counter()
+
+    scan_seconds = scanned - loaded
+    return {
+        "year": year,
+        "rows": rows,
+        "balanced": all(row["balanced"] for row in rows),
+        "ok": all(row["balanced"] for row in rows) and not any(issue.count for issue in issues.values()),
+        "accounts": account_rows(tree, balances, movements),
+        "ledger": {"entries": stats["entries"], "vouchers": stats["vouchers"],
+                   "total_debit": stats["total_debit"], "total_credit": stats["total_credit"]},
+        "issues": {name: issue.to_dict() for name, issue in issues.items()},
+        "timings": {
+            "load_seconds": round(loaded - started, 3),
+            "scan_seconds": round(scan_seconds, 3),
+            "check_seconds": round(finished - scanned, 3),
+            "total_seconds": round(finished - started, 3),
+            "entries_per_second": round(stats["entries"] / scan_seconds) if scan_seconds > 0 else None,
+        },
+    }
+
+
+ISSUE_TITLES = {
+    "unbalanced_vouchers": "问题凭证",
+    "closing_mismatches": "期初 + 发生额 ≠ 期末",
+    "parent_mismatches": "上级科目 ≠ 下级科目之和",
+    "movement_mismatches": "余额表发生额与分录不符",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="试算平衡与账簿完整性检查")
+    parser.add_argument("year", type=int, help="会计年度")
+    parser.add_argument("--fetch-size", type=int, help="每批读取的分录行数")
+    parser.add_argument("--output", help="把完整结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    result = run_trial_balance(args.year, fetch_size=args.fetch_size)
+    for row in result["rows"]:
+        status = "平衡" if row["balanced"] else f"不平衡（差额 {row['difference']}）"
+        print(f"{row['item_name']:<8} 借方 {row['total_debit']:>18}  贷方 {row['total_credit']:>18}  {status}")
+    for name, issue in result["issues"].items():
+        print(f"{ISSUE_TITLES[name]}: {issue['count']}")
+        for item in issue["items"][:10]:
+            print(f"    {json.dumps(item, ensure_ascii=False, default=str)}")
+    ledger, timings = result["ledger"], result["timings"]
+    print(f"分录 {ledger['entries']} 条 / 凭证 {ledger['vouchers']} 张  "
+          f"读取余额 {timings['load_seconds']}s  遍历分录 {timings['scan_seconds']}s"
+          f"（{timings['entries_per_second']} 条/秒）  检查 {timings['check_seconds']}s  "
+          f"合计 {timings['total_seconds']}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(result, out, ensure_ascii=False, indent=2, default=str)
+    if not result["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# backend/voucher_export.py
+"""
+凭证批量取数与导出：按凭证 id 列表或日期区间一次取出多张凭证的凭证头和分录。
+
+- 无论多少张凭证都只执行两条查询：先取全部凭证头（每张凭证一行），
+  再用非缓冲游标按批 fetchmany 取全部分录；两条查询按相同顺序
+  (voucher_date, voucher_number, id) 排列，边读分录边按凭证归并输出，不再逐张凭证往返数据库；
+  两条查询在同一个事务（同一个一致性快照）中执行，中间新增的凭证不会导致凭证头和分录对不上；
+- 科目名称取自内存科目树，分录查询不再关联科目表；
+- 只读查询，有从库时走从库（db_utils.read_cursor）；
+- 按 id 查询时最多 MAX_IDS 张，结果同样按凭证日期和凭证号排列，不存在的 id 在 json 格式末尾列出；
+- 日期区间涉及已归档年度（按 id 查询时只要有已归档年度）时，两条查询都用 UNION ALL 同时查询归档表。
+
+输出格式：
+  ndjson（默认）：每行一张凭证，结构与 GET /api/vouchers/<id> 相同 {"header": {...}, "entries": [...]}
+  json：{"vouchers": [...], "voucher_count": ..., "missing_ids": [...]}
+  csv：每行一条分录，前 8 列与凭证导入（voucher_import）的 CSV 格式相同，导出的文件可以直接再导入；
+       另附 voucher_ref、account_name 两列便于阅读。带 BOM，Excel 可直接打开
+  xlsx：与 csv 相同的列（中文表头），每张凭证后加一行合计，用于打印；需要安装 openpyxl
+"""
+import csv
+import io
+import json
+
+import archive
+from db_utils import read_cursor
+from ledger_balances import ZERO
+from voucher_queries import InvalidQueryError, parse_date
+
+try:
+    import openpyxl
+except ImportError:  # 可选依赖：只有导出 xlsx 时需要
+    openpyxl = None
+
+FORMATS = ("ndjson", "json", "csv", "xlsx")
+MAX_IDS = 1000
+FETCH_SIZE = 1000
+
+CSV_COLUMNS = ("voucher_key", "date", "type", "summary", "account_code", "entry_summary", "debit", "credit",
+               "voucher_ref", "account_name")
+XLSX_TITLES = ("凭证ID", "凭证日期", "凭证字", "凭证摘要", "科目代码", "分录摘要", "借方金额", "贷方金额",
+               "凭证号", "科目名称")
+
+MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def parse_ids(value):
+    """ids 可以是逗号分隔的字符串或整数列表"""
+    items = value.split(",") if isinstance(value, str) else value
+    try:
+        ids = [int(item) for item in items if str(item).strip()]
+    except (TypeError, ValueError):
+        raise InvalidQueryError("ids 必须是整数列表")
+    if not ids:
+        raise InvalidQueryError("ids 不能为空")
+    if len(ids) > MAX_IDS:
+        raise InvalidQueryError(f"一次最多查询 {MAX_IDS} 张凭证，更多凭证请按日期区间导出")
+    return list(dict.fromkeys(ids))
+
+
+def parse_export_args(args):
+    """
+    解析 ids 或 date_from + date_to（二选一），以及可选的 type、format。
+    args 可以是查询参数，也可以是 POST 的 JSON 请求体（ids 较多时使用）。
+    """
+    fmt = args.get('format') or 'ndjson'
+    if fmt not in FORMATS:
+        raise InvalidQueryError(f"format 只能是 {', '.join(FORMATS)}")
+    if fmt == 'xlsx' and openpyxl is None:
+        raise InvalidQueryError("服务器未安装 openpyxl，无法导出 xlsx，请使用 csv")
+
+    params = {"format": fmt, "ids": None, "date_from": None, "date_to": None,
+              "voucher_type": args.get('type') or None}
+    if args.get('ids'):
+        params["ids"] = parse_ids(args['ids'])
+    elif args.get('date_from') and args.get('date_to'):
+        params["date_from"] = parse_date(args['date_from'], 'date_from')
+        params["date_to"] = parse_date(args['date_to'], 'date_to')
+        if params["date_from"] > params["date_to"]:
+            raise InvalidQueryError("date_from 不能晚于 date_to")
+    else:
+        raise InvalidQueryError("请提供 ids，或同时提供 date_from 和 date_to")
+    return params
+
+
+def build_condition(params):
+    """两条查询共用的凭证筛选条件（作用于别名 v）"""
+    if params["ids"]:
+        conditions = [f"v.id IN ({', '.join(['%s'] * len(params['ids']))})"]
+        values = list(params["ids"])
+    else:
+        conditions = ["v.voucher_date >= %s", "v.voucher_date <= %s"]
+        values = [params["date_from"], params["date_to"]]
+    if params["voucher_type"]:
+        conditions.append("v.voucher_type = %s")
+        values.append(params["voucher_type"])
+    return " AND ".join(conditions), values
+
+
+def fetch_headers(cursor, params, sources):
+    """第一条查询：全部凭证头，每张凭证一行"""
+    condition, values = build_condition(params)
+    sql, values = archive.union_all(f"""
+        SELECT v.* FROM {{vouchers}} v
+        WHERE {condition}
+    """, values, sources)
+    cursor.execute(sql + " ORDER BY voucher_date, voucher_number, id", values)
+    return cursor.fetchall()
+
+
+def iter_vouchers(cursor, tree, params, headers, sources):
+    """
+    第二条查询按批读取分录，归并到 headers 中所属的凭证，依次产生 (header, entries)。
+    没有分录的凭证同样输出（entries 为空列表）。
+    """
+    if not headers:
+        return
+    condition, values = build_condition(params)
+    # 排序用的凭证日期、凭证号随分录一起取出（UNION ALL 只能按结果列排序），归并时去掉
+    sql, values = archive.union_all(f"""
+        SELECT je.*, v.voucher_date AS sort_date, v.voucher_number AS sort_number
+        FROM {{entries}} je
+        JOIN {{vouchers}} v ON je.voucher_id = v.id
+        WHERE {condition}
+    """, values, sources)
+    cursor.execute(sql + " ORDER BY sort_date, sort_number, voucher_id, id", values)
+
+    index = 0
+    entries = []
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for entry in rows:
+            del entry["sort_date"], entry["sort_number"]
+            # 两条查询顺序一致：分录换到下一张凭证时，输出当前凭证（以及中间没有分录的凭证）
+            while headers[index]["id"] != entry["voucher_id"]:
+                yield headers[index], entries
+                index += 1
+                entries = []
+            node = tree.nodes.get(entry["account_code"])
+            entry["account_name"] = node.row["account_name"] if node else None
+            entries.append(entry)
+    for header in headers[index:]:
+        yield header, entries
+        entries = []
+
+
+def to_json(record):
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def voucher_ref(header):
+    return f"{header['voucher_type']}-{header['voucher_number']:04d}"
+
+
+def entry_row(header, entry):
+    return (header["id"], header["voucher_date"].isoformat(), header["voucher_type"], header["summary"],
+            entry["account_code"], entry["summary"], entry["debit_amount"], entry["credit_amount"],
+            voucher_ref(header), entry["account_name"])
+
+
+def render_ndjson(vouchers):
+    chunk = []
+    for header, entries in vouchers:
+        chunk.append(to_json({"header": header, "entries": entries}) + "\n")
+        if len(chunk) >= 100:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk)
+
+
+def render_json(vouchers, ids):
+    yield '{"vouchers": ['
+    count = 0
+    found = set()
+    for header, entries in vouchers:
+        yield ("," if count else "") + to_json({"header": header, "entries": entries})
+        found.add(header["id"])
+        count += 1
+    missing = [voucher_id for voucher_id in ids if voucher_id not in found] if ids else []
+    yield f'], "voucher_count": {count}, "missing_ids": {to_json(missing)}}}'
+
+
+def render_csv(vouchers):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(CSV_COLUMNS)
+    for header, entries in vouchers:
+        for entry in entries:
+            writer.writerow(entry_row(header, entry))
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def render_xlsx(vouchers):
+    """xlsx 需要整体打包，使用只写模式逐行写入，最后一次性输出文件内容"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("凭证")
+    sheet.append(XLSX_TITLES)
+    for header, entries in vouchers:
+        total_debit = total_credit = ZERO
+        for entry in entries:
+            sheet.append(entry_row(header, entry))
+            total_debit += entry["debit_amount"]
+            total_credit += entry["credit_amount"]
+        sheet.append((None, None, None, None, None, f"{voucher_ref(header)} 合计", total_debit, total_credit))
+    output = io.BytesIO()
+    workbook.save(output)
+    yield output.getvalue()
+
+
+def stream_vouchers(tree, params):
+    """
+    生成输出片段。第一次 next() 时借出连接并执行查询，
+    调用方可以先取出第一个片段，以便在开始发送响应前暴露数据库错误。
+    """
+    with read_cursor(dictionary=True) as (conn, cursor):
+        try:
+            sources = archive.table_sources(cursor, params["date_from"], params["date_to"])
+            headers = fetch_headers(cursor, params, sources)
+            vouchers = iter_vouchers(cursor, tree, params, headers, sources)
+            fmt = params["format"]
+            if fmt == "ndjson":
+                yield from render_ndjson(vouchers)
+            elif fmt == "json":
+                yield from render_json(vouchers, params["ids"])
+            elif fmt == "csv":
+                yield from render_csv(vouchers)
+            else:
+                yield from render_xlsx(vouchers)
+        except GeneratorExit:
+            # 客户端断开或生成器被提前关闭：服务器端还有未读的行，连接不再放回连接池
+            conn.discard()
+            raise
+
+
+def export_filename(params):
+    if params["ids"]:
+        return f"vouchers-{len(params['ids'])}.{params['format']}"
+    return f"vouchers-{params['date_from'].isoformat()}-{params['date_to'].isoformat()}.{params['format']}"
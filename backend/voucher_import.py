@@ -0,0 +1,334 @@
+# backend/voucher_import.py
+"""
+凭证批量导入：流式解析 CSV / NDJSON，分批写入。
+
+- 逐行读取，内存中只保留当前一批凭证，文件再大也不会整体读入；
+- 每张凭证校验借贷平衡、科目是否为末级科目（对照内存中的科目树），已归档年度的凭证直接拒绝；
+- 每批凭证在一个事务中用多行 INSERT 写入凭证主表和分录表，
+  凭证号按（凭证字, 年, 月）整批分配，增量余额也按批汇总后一次写入；
+- 校验失败或写入失败的凭证写入 rejects（NDJSON，每行一张凭证及其错误原因），
+  不影响其余凭证；
+- 结束时给出读取/导入/拒绝数量和每秒导入凭证数。
+
+文件格式：
+  NDJSON：每行一张凭证，结构与 POST /api/vouchers 的请求体相同：
+      {"header": {"date": "2025-01-05", "type": "记", "summary": "..."},
+       "entries": [{"account_code": "1001", "summary": "...", "debit": "100.00", "credit": "0"}, ...]}
+  CSV：每行一条分录，表头为
+      voucher_key,date,type,summary,account_code,entry_summary,debit,credit
+      voucher_key 相同的连续行属于同一张凭证（文件需按凭证分组排列），
+      entry_summary 为空时沿用凭证摘要。
+
+命令行用法：
+    python voucher_import.py vouchers.csv --rejects rejects.ndjson
+    python voucher_import.py vouchers.ndjson --batch-size 1000
+"""
+import argparse
+import csv
+import datetime
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+import archive
+from account_tree import get_account_tree
+from config import IMPORT_CONFIG, INCREMENTAL_BALANCES
+from db_utils import db_cursor
+from ledger_balances import ZERO, apply_entry_deltas
+from report_cache import bump_ledger_version
+from voucher_numbers import reserve_numbers
+
+FORMATS = ("csv", "ndjson")
+CSV_COLUMNS = ("voucher_key", "date", "type", "summary", "account_code", "entry_summary", "debit", "credit")
+
+
+def guess_format(name_or_mimetype):
+    """根据文件扩展名或 Content-Type 推断格式，无法判断时返回 None"""
+    value = (name_or_mimetype or "").lower()
+    if value.endswith(".csv") or "csv" in value:
+        return "csv"
+    if value.endswith((".ndjson", ".jsonl")) or "ndjson" in value or "jsonl" in value:
+        return "ndjson"
+    return None
+
+
+# ==========================================
+# 解析：把输入流转换为一张张待校验的凭证
+# ==========================================
+
+def parse_amount(value, errors, label):
+    if value is None or str(value).strip() == "":
+        return ZERO
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        errors.append(f"{label} 金额无效: {value}")
+        return ZERO
+    if not amount.is_finite() or amount < 0 or amount.as_tuple().exponent < -2:
+        errors.append(f"{label} 金额应为非负数且最多两位小数: {value}")
+        return ZERO
+    return amount
+
+
+def make_voucher(line, key, raw, date, voucher_type, summary):
+    voucher = {"line": line, "key": key, "raw": raw, "errors": [], "entries": [],
+               "date": None, "type": (voucher_type or "").strip(), "summary": (summary or "").strip()}
+    try:
+        voucher["date"] = datetime.date.fromisoformat(str(date).strip())
+    except ValueError:
+        voucher["errors"].append(f"凭证日期无效: {date}")
+    return voucher
+
+
+def add_entry(voucher, account_code, summary, debit, credit):
+    label = f"第{len(voucher['entries']) + 1}条分录"
+    errors = voucher["errors"]
+    voucher["entries"].append((
+        str(account_code or "").strip(),
+        (summary or "").strip() or voucher["summary"],
+        parse_amount(debit, errors, label + "借方"),
+        parse_amount(credit, errors, label + "贷方"),
+    ))
+
+
+def iter_ndjson(lines):
+    """每行一张凭证；空行跳过"""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            header = record["header"]
+            entries = record["entries"]
+        except (ValueError, KeyError, TypeError) as e:
+            yield {"line": line_no, "key": None, "raw": line.rstrip("\n"), "errors": [f"无法解析的记录: {e}"],
+                   "entries": [], "date": None, "type": "", "summary": ""}
+            continue
+        voucher = make_voucher(line_no, header.get("key"), record,
+                               header.get("date"), header.get("type"), header.get("summary"))
+        for entry in entries:
+            add_entry(voucher, entry.get("account_code"), entry.get("summary"), entry.get("debit"), entry.get("credit"))
+        yield voucher
+
+
+def iter_csv(lines):
+    """每行一条分录，voucher_key 相同的连续行组成一张凭证"""
+    reader = csv.DictReader(lines)
+    missing = [c for c in CSV_COLUMNS if c != "entry_summary" and c not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"CSV 缺少列: {', '.join(missing)}")
+
+    voucher = None
+    for row in reader:
+        key = (row.get("voucher_key") or "").strip()
+        if voucher is None or key != voucher["key"]:
+            if voucher is not None:
+                yield voucher
+            voucher = make_voucher(reader.line_num, key, [], row.get("date"), row.get("type"), row.get("summary"))
+        voucher["raw"].append(row)
+        add_entry(voucher, row.get("account_code"), row.get("entry_summary"), row.get("debit"), row.get("credit"))
+    if voucher is not None:
+        yield voucher
+
+
+def iter_vouchers(lines, fmt):
+    if fmt == "csv":
+        return iter_csv(lines)
+    if fmt == "ndjson":
+        return iter_ndjson(lines)
+    raise ValueError(f"不支持的格式: {fmt}")
+
+
+def validate_voucher(voucher, tree):
+    """借贷平衡、末级科目、必填字段校验，错误追加到 voucher['errors']"""
+    errors = voucher["errors"]
+    if not voucher["type"]:
+        errors.append("凭证字不能为空")
+    if not voucher["summary"]:
+        errors.append("凭证摘要不能为空")
+    if not voucher["entries"]:
+        errors.append("凭证没有分录")
+
+    total_debit = total_credit = ZERO
+    for index, (account_code, _summary, debit, credit) in enumerate(voucher["entries"], start=1):
+        if account_code not in tree:
+            errors.append(f"第{index}条分录科目 {account_code} 不存在")
+        elif not tree.is_leaf(account_code):
+            errors.append(f"第{index}条分录科目 {account_code} 不是末级科目")
+        if (debit == ZERO) == (credit == ZERO):
+            errors.append(f"第{index}条分录借方、贷方必须且只能填写一方")
+        total_debit += debit
+        total_credit += credit
+
+    if total_debit != total_credit:
+        errors.append(f"借贷不平衡: 借方 {total_debit}，贷方 {total_credit}")
+    voucher["total_amount"] = total_debit
+    return not errors
+
+
+# ==========================================
+# 写入：一批凭证一个事务
+# ==========================================
+
+def insert_rows(cursor, sql_prefix, placeholder, rows, chunk_rows):
+    """把 rows 拆成每 chunk_rows 行一条的多行 INSERT 语句执行"""
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        sql = sql_prefix + ", ".join([placeholder] * len(chunk))
+        cursor.execute(sql, [value for row in chunk for value in row])
+
+
+class VoucherImporter:
+    """
+    在一个连接上按批导入凭证。
+    rejects: 接收被拒绝凭证（字典）的回调函数。
+    """
+
+    def __init__(self, conn, cursor, tree, rejects, batch_size=None, chunk_rows=None):
+        self.conn = conn
+        self.cursor = cursor
+        self.tree = tree
+        self.rejects = rejects
+        self.batch_size = batch_size or IMPORT_CONFIG["batch_size"]
+        self.chunk_rows = chunk_rows or IMPORT_CONFIG["insert_chunk_rows"]
+        self.years = set()
+        self.archived_years = archive.archived_years(cursor)
+        self.stats = {"vouchers_read": 0, "vouchers_imported": 0, "entries_imported": 0,
+                      "vouchers_rejected": 0, "batches": 0, "failed_batches": 0}
+
+    def reject(self, voucher, errors=None):
+        self.stats["vouchers_rejected"] += 1
+        raw = voucher["raw"]
+        if isinstance(raw, list):
+            raw = [dict(row) for row in raw]
+        self.rejects({"line": voucher["line"], "key": voucher["key"],
+                      "errors": errors or voucher["errors"], "record": raw})
+
+    def run(self, vouchers):
+        start = time.perf_counter()
+        batch = []
+        for voucher in vouchers:
+            self.stats["vouchers_read"] += 1
+            if voucher["errors"] or not validate_voucher(voucher, self.tree):
+                self.reject(voucher)
+                continue
+            if voucher["date"].year in self.archived_years:
+                self.reject(voucher, [f"{voucher['date'].year} 年度已归档，不能再写入凭证"])
+                continue
+            batch.append(voucher)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+
+        for year in sorted(self.years):
+            bump_ledger_version(year)
+        elapsed = time.perf_counter() - start
+        self.stats["elapsed_seconds"] = round(elapsed, 3)
+        self.stats["vouchers_per_second"] = round(self.stats["vouchers_imported"] / elapsed, 1) if elapsed else 0.0
+        return self.stats
+
+    def flush(self, batch):
+        """在一个事务中写入一批凭证；失败时整批回滚并全部计入 rejects"""
+        self.stats["batches"] += 1
+        try:
+            self.conn.start_transaction()
+            self.write_batch(batch)
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            self.stats["failed_batches"] += 1
+            for voucher in batch:
+                self.reject(voucher, [f"写入失败（整批回滚）: {e}"])
+            return
+        self.stats["vouchers_imported"] += len(batch)
+        self.stats["entries_imported"] += sum(len(v["entries"]) for v in batch)
+        self.years.update(v["date"].year for v in batch)
+
+    def write_batch(self, batch):
+        cursor = self.cursor
+        for year in sorted({v["date"].year for v in batch}):
+            archive.ensure_writable(cursor, year)   # 导入过程中开始归档的年度整批回滚
+
+        # 1. 按（凭证字, 年, 月）整批预留凭证号，每个期间只取一次号
+        by_period = {}
+        for voucher in sorted(batch, key=lambda v: (v["date"], v["line"])):
+            by_period.setdefault((voucher["type"], voucher["date"].year, voucher["date"].month), []).append(voucher)
+        for (voucher_type, year, month), vouchers in sorted(by_period.items()):
+            first = reserve_numbers(cursor, voucher_type, vouchers[0]["date"], len(vouchers))
+            for offset, voucher in enumerate(vouchers):
+                voucher["number"] = first + offset
+
+        # 2. 多行 INSERT 凭证主表；同一语句插入的自增 id 连续，插入后核对一遍再使用
+        for start in range(0, len(batch), self.chunk_rows):
+            chunk = batch[start:start + self.chunk_rows]
+            insert_rows(cursor, "INSERT INTO vouchers (voucher_date, voucher_type, voucher_number, summary, total_amount) VALUES ",
+                        "(%s, %s, %s, %s, %s)",
+                        [(v["date"], v["type"], v["number"], v["summary"], v["total_amount"]) for v in chunk],
+                        self.chunk_rows)
+            first_id = cursor.lastrowid
+            cursor.execute("""
+                SELECT id, voucher_type, voucher_number FROM vouchers
+                WHERE id BETWEEN %s AND %s ORDER BY id
+            """, (first_id, first_id + len(chunk) - 1))
+            expected = [(first_id + offset, v["type"], v["number"]) for offset, v in enumerate(chunk)]
+            if [tuple(row) for row in cursor.fetchall()] != expected:
+                raise RuntimeError("多行插入返回的自增 id 不连续")
+            for voucher_id, voucher in zip(range(first_id, first_id + len(chunk)), chunk):
+                voucher["id"] = voucher_id
+
+        # 3. 多行 INSERT 分录
+        entry_rows = [(v["id"], code, summary, debit, credit)
+                      for v in batch for code, summary, debit, credit in v["entries"]]
+        insert_rows(cursor, "INSERT INTO journal_entries (voucher_id, account_code, summary, debit_amount, credit_amount) VALUES ",
+                    "(%s, %s, %s, %s, %s)", entry_rows, self.chunk_rows)
+
+        # 4. 增量模式：整批发生额按会计期间汇总后一次写入余额表
+        if INCREMENTAL_BALANCES:
+            by_period = {}
+            for voucher in batch:
+                deltas = by_period.setdefault((voucher["date"].year, voucher["date"].month), [])
+                deltas.extend((code, debit, credit) for code, _summary, debit, credit in voucher["entries"])
+            for year, month in sorted(by_period):
+                apply_entry_deltas(cursor, self.tree, year, month, by_period[(year, month)])
+
+
+def import_vouchers(lines, fmt, rejects, batch_size=None):
+    """借用一个连接完成整个导入，返回统计信息"""
+    with db_cursor() as (conn, cursor):
+        tree = get_account_tree(cursor)
+        importer = VoucherImporter(conn, cursor, tree, rejects, batch_size=batch_size)
+        return importer.run(iter_vouchers(lines, fmt))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="凭证批量导入（CSV / NDJSON）")
+    parser.add_argument("path", help="导入文件路径")
+    parser.add_argument("--format", choices=FORMATS, help="文件格式，默认按扩展名判断")
+    parser.add_argument("--batch-size", type=int, help="每个事务写入的凭证数")
+    parser.add_argument("--rejects", default="rejects.ndjson", help="被拒绝凭证的输出文件")
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.path)
+    if fmt is None:
+        sys.exit("无法根据扩展名判断文件格式，请使用 --format 指定")
+
+    with open(args.path, encoding="utf-8-sig", newline="") as source, \
+            open(args.rejects, "w", encoding="utf-8") as rejects_file:
+        def write_reject(record):
+            rejects_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        stats = import_vouchers(source, fmt, write_reject, batch_size=args.batch_size)
+
+    print(f"读取凭证: {stats['vouchers_read']}  导入: {stats['vouchers_imported']}  "
+          f"分录: {stats['entries_imported']}  拒绝: {stats['vouchers_rejected']}")
+    print(f"批次: {stats['batches']}（失败 {stats['failed_batches']}）  "
+          f"耗时: {stats['elapsed_seconds']}s  速度: {stats['vouchers_per_second']} 张/秒")
+    if stats["vouchers_rejected"]:
+        print(f"被拒绝的凭证及原因见 {args.rejects}")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# backend/voucher_numbers.py
+"""
+凭证号分配。
+
+凭证号按（凭证字, 年, 月）独立编号，当前已用到的最大号保存在 voucher_number_sequences 中。
+分配在保存凭证的事务内完成：对序列行执行 UPDATE … LAST_INSERT_ID(last_number + n) 加号，
+只锁序列表的这一行，行锁一直持有到事务提交，同一凭证字同一月份的并发保存因此依次取号，不会重号；
+事务回滚时号码一并回退，不会留下空号。vouchers 上的唯一键
+(voucher_type, voucher_period, voucher_number) 作为最后一道保障。
+
+取号时不再读 vouchers：若用 INSERT … SELECT MAX(...) FROM vouchers 取号，每次保存都要重新扫描该月凭证，
+而且在 REPEATABLE READ 下会对 vouchers 的索引范围加共享的 next-key 锁，与另一个会话随后的
+INSERT INTO vouchers 互相等待而死锁。
+某月第一次取号时序列行尚不存在，才用该月已有凭证的最大号（一致性读，不加锁）初始化该行，
+因此对已有数据的库无需预先填充序列表。
+"""
+import datetime
+
+
+def first_value(row):
+    """取单列查询结果的值，兼容字典游标和元组游标"""
+    if row is None:
+        return None
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def month_range(year, month):
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + (month == 12), month % 12 + 1, 1)
+    return start, end
+
+
+def reserve_numbers(cursor, voucher_type, voucher_date, count=1):
+    """
+    在当前事务中为某凭证字、凭证日期所在月份预留 count 个连续凭证号，返回第一个号码。
+    批量导入时一次预留整批所需的号码；序列行已存在时只需两条语句，且只锁序列行。
+    """
+    if count < 1:
+        raise ValueError("预留的凭证号数量必须大于 0")
+    if isinstance(voucher_date, str):
+        voucher_date = datetime.date.fromisoformat(voucher_date)
+    year, month = voucher_date.year, voucher_date.month
+    cursor.execute("""
+        UPDATE voucher_number_sequences SET last_number = LAST_INSERT_ID(last_number + %s)
+        WHERE voucher_type = %s AND period_year = %s AND period_month = %s
+    """, (count, voucher_type, year, month))
+    if cursor.rowcount == 0:
+        seed_sequence(cursor, voucher_type, year, month, count)
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    return first_value(cursor.fetchone()) - count + 1
+
+
+def seed_sequence(cursor, voucher_type, year, month, count):
+    """
+    序列行不存在时按该月已有凭证的最大号初始化并预留 count 个号码（结果放在 LAST_INSERT_ID() 中）。
+    最大号用普通查询（一致性读）取得，不对 vouchers 加锁；并发会话抢先插入了序列行时，
+    ON DUPLICATE KEY UPDATE 退化为在该行上加号，同样排他锁住该行。
+    """
+    start, end = month_range(year, month)
+    cursor.execute("""
+        SELECT COALESCE(MAX(voucher_number), 0) FROM vouchers
+        WHERE voucher_type = %s AND voucher_date >= %s AND voucher_date < %s
+    """, (voucher_type, start, end))
+    last_used = first_value(cursor.fetchone())
+    cursor.execute("""
+        INSERT INTO voucher_number_sequences (voucher_type, period_year, period_month, last_number)
+        VALUES (%s, %s, %s, LAST_INSERT_ID(%s))
+        ON DUPLICATE KEY UPDATE last_number = LAST_INSERT_ID(last_number + %s)
+    """, (voucher_type, year, month, last_used + count, count))
+
+
+def allocate_number(cursor, voucher_type, voucher_date):
+    """在当前事务中分配一个凭证号"""
+    return reserve_numbers(cursor, voucher_type, voucher_date, 1)
+
+
+def peek_next_number(cursor, voucher_type, voucher_date):
+    """
+    预览下一个凭证号（仅用于录入界面显示，不占号；实际号码在保存时分配）。
+    只读序列表主键；该月还没有序列行时退回到按日期范围查询最大号。
+    """
+    if isinstance(voucher_date, str):
+        voucher_date = datetime.date.fromisoformat(voucher_date)
+    year, month = voucher_date.year, voucher_date.month
+    cursor.execute("""
+        SELECT last_number FROM voucher_number_sequences
+        WHERE voucher_type = %s AND period_year = %s AND period_month = %s
+    """, (voucher_type, year, month))
+    row = cursor.fetchone()
+    if row is None:
+        start, end = month_range(year, month)
+        cursor.execute("""
+            SELECT MAX(voucher_number) FROM vouchers
+            WHERE voucher_type = %s AND voucher_date >= %s AND voucher_date < %s
+        """, (voucher_type, start, end))
+        row = cursor.fetchone()
+    return (first_value(row) or 0) + 1
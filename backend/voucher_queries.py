@@ -0,0 +1,124 @@
+# backend/voucher_queries.py
+"""
+凭证查询：凭证列表的键集（游标）分页与筛选条件。
+
+列表按 (voucher_date, voucher_number, id) 倒序排列，翻页时用上一页最后一行的这三个值
+作为游标，查询条件落在 idx_voucher_date_number 索引上，无论翻到第几页都只扫描一页的数据，
+不会像 OFFSET 分页那样越翻越慢。
+筛选范围涉及已归档年度时，当前表和归档表各取一页再合并排序。
+"""
+import base64
+import datetime
+
+import archive
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidQueryError(ValueError):
+    """查询参数不合法（接口返回 400）"""
+
+
+def encode_cursor(row):
+    """把一行凭证的排序键编码为不透明的游标字符串"""
+    raw = f"{row['voucher_date'].isoformat()},{row['voucher_number']},{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode("ascii")).decode("ascii")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("ascii")
+        date_str, number, voucher_id = raw.split(",")
+        return datetime.date.fromisoformat(date_str), int(number), int(voucher_id)
+    except (ValueError, UnicodeError):
+        raise InvalidQueryError("无效的分页游标")
+
+
+def parse_date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise InvalidQueryError(f"{name} 日期格式应为 YYYY-MM-DD")
+
+
+def parse_list_args(args):
+    """解析凭证列表的查询参数：limit、cursor、date_from、date_to、type、account_code"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidQueryError("limit 必须是整数")
+    if limit < 1:
+        raise InvalidQueryError("limit 必须大于 0")
+    filters = {
+        "limit": min(limit, MAX_PAGE_SIZE),
+        "cursor": decode_cursor(args['cursor']) if args.get('cursor') else None,
+        "date_from": parse_date(args['date_from'], 'date_from') if args.get('date_from') else None,
+        "date_to": parse_date(args['date_to'], 'date_to') if args.get('date_to') else None,
+        "voucher_type": args.get('type') or None,
+        "account_code": args.get('account_code') or None,
+    }
+    return filters
+
+
+def build_list_query(filters, account_codes=None, sources=(archive.CURRENT,)):
+    """
+    生成凭证列表查询。
+    account_codes 为按科目筛选时要匹配的科目代码（科目本身及其所有下级）；
+    sources 为要查询的 (凭证表, 分录表)，见 archive.table_sources。
+    多取一行用于判断是否还有下一页。
+    """
+    conditions = []
+    params = []
+    if filters["date_from"]:
+        conditions.append("v.voucher_date >= %s")
+        params.append(filters["date_from"])
+    if filters["date_to"]:
+        conditions.append("v.voucher_date <= %s")
+        params.append(filters["date_to"])
+    if filters["voucher_type"]:
+        conditions.append("v.voucher_type = %s")
+        params.append(filters["voucher_type"])
+    if account_codes:
+        placeholders = ", ".join(["%s"] * len(account_codes))
+        conditions.append(f"v.id IN (SELECT je.voucher_id FROM {{entries}} je WHERE je.account_code IN ({placeholders}))")
+        params.extend(account_codes)
+    if filters["cursor"]:
+        last_date, last_number, last_id = filters["cursor"]
+        # 展开的行比较：(date, number, id) < (last_date, last_number, last_id)
+        # 额外的 voucher_date <= %s 让优化器可以直接做索引范围扫描
+        conditions.append("""v.voucher_date <= %s AND (
+            v.voucher_date < %s
+            OR (v.voucher_date = %s AND (v.voucher_number < %s OR (v.voucher_number = %s AND v.id < %s)))
+        )""")
+        params.extend([last_date, last_date, last_date, last_number, last_number, last_id])
+
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    params.append(filters["limit"] + 1)
+    sql, params = archive.union_all(f"""
+        SELECT
+            v.id,
+            v.voucher_date,
+            v.voucher_number,
+            CONCAT(v.voucher_type, '-', LPAD(v.voucher_number, 4, '0')) as voucher_ref,
+            v.summary,
+            v.total_amount
+        FROM {{vouchers}} v
+        {where}
+        ORDER BY v.voucher_date DESC, v.voucher_number DESC, v.id DESC
+        LIMIT %s
+    """, params, sources)
+    if len(sources) > 1:
+        sql += "\nORDER BY voucher_date DESC, voucher_number DESC, id DESC\nLIMIT %s"
+        params.append(filters["limit"] + 1)
+    return sql, params
+
+
+def paginate(rows, limit):
+    """截取一页数据，并生成下一页的游标（没有下一页时为 None）"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+    for row in rows:
+        row.pop('voucher_number', None)
+    return rows, next_cursor
@@ -0,0 +1,177 @@
+# backend/year_end.py
+"""
+年末结转：用本年各科目的期末余额生成下一年度的期初余额。
+
+- 每个年度一条 INSERT ... SELECT ... ON DUPLICATE KEY UPDATE，按科目表一次写入下一年度全部科目的期初余额；
+  已有下一年度余额行的科目，期末余额同步平移（期末 = 原期末 - 原期初 + 新期初），本年发生额不受影响；
+- 损益类科目（YEAR_END_CONFIG['profit_prefixes']，默认 6 开头的各科目和本年利润 4103）下年期初归零，
+  其一级科目的期末余额按方向合计为本年净利润，转入留存收益科目（默认 4104 利润分配）及其各级上级科目；
+- 可以一次结转连续多个年度（2022→2023→2024…），整个链条在一个事务中完成；
+- 每次结转记录本年期末余额的指纹（year_end_closes 表）。再次运行时，期末余额没有变化的年度直接跳过，
+  因此修改了较早年度的凭证后重新运行，只会重算受影响的年度；重复运行结果不变。
+
+要求被结转年度的期末余额是最新的：增量模式下随凭证自动维护，批量模式下请先运行科目汇总。
+结转会改写下一年度的期初余额，因此下一年度已归档（archive.py）时拒绝结转。
+
+命令行：
+    python year_end.py 2024                # 把 2024 年末余额结转为 2025 年期初
+    python year_end.py 2022 --to 2025      # 依次结转 2022、2023、2024 三个年度
+    python year_end.py 2022 --to 2025 --force   # 忽略指纹，全部重新结转
+"""
+import argparse
+
+import account_tree
+import archive
+from config import YEAR_END_CONFIG
+from db_utils import get_db_connection
+from ledger_balances import ZERO
+
+MAX_CHAIN_YEARS = 50
+
+
+def profit_condition(prefixes, column="coa.account_code"):
+    """损益类科目的 SQL 条件（前缀匹配）及参数"""
+    return "(" + " OR ".join([f"{column} LIKE %s"] * len(prefixes)) + ")", [f"{p}%" for p in prefixes]
+
+
+def retained_earnings_path(tree, account_code):
+    """留存收益科目及其全部上级科目，按余额方向分成 (贷方科目列表, 借方科目列表)"""
+    if account_code not in tree:
+        raise ValueError(f"留存收益科目 {account_code} 不存在")
+    if not tree.is_leaf(account_code):
+        raise ValueError(f"留存收益科目 {account_code} 不是末级科目，请在 YEAR_END_CONFIG 中配置其下级科目")
+    credit, debit = [], []
+    for code in (account_code, *tree.ancestors(account_code)):
+        (credit if tree.direction(code) == 'credit' else debit).append(code)
+    return credit, debit
+
+
+def closing_fingerprint(cursor, year, settings):
+    """
+    本年期末余额的指纹：科目数、余额合计和逐科目 CRC 合计，加上结转设置。
+    指纹不变说明本年期末余额（以及结转口径）与上次结转时相同。
+    """
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(closing_balance), 0),
+               COALESCE(SUM(CRC32(CONCAT(account_code, '=', closing_balance))), 0)
+        FROM account_balances WHERE fiscal_year = %s
+    """, (year,))
+    count, total, checksum = cursor.fetchone()
+    return f"{count}:{total}:{checksum}:{settings}"
+
+
+def net_income(cursor, year, prefixes):
+    """本年净利润：损益类一级科目的期末余额，贷方科目为正、借方科目为负"""
+    condition, params = profit_condition(prefixes)
+    cursor.execute(f"""
+        SELECT COALESCE(SUM(CASE WHEN coa.balance_direction = 'credit'
+                                 THEN ab.closing_balance ELSE -ab.closing_balance END), 0)
+        FROM account_balances ab
+        JOIN chart_of_accounts coa ON ab.account_code = coa.account_code
+        WHERE ab.fiscal_year = %s AND coa.level = 1 AND {condition}
+    """, (year, *params))
+    return cursor.fetchone()[0] or ZERO
+
+
+def carry_forward_year(cursor, year, profit, prefixes, credit_path, debit_path):
+    """
+    一条语句把 year 的期末余额写成 year + 1 的期初余额，返回影响的行数（MySQL 口径：新增 1、修改 2、不变 0）。
+    科目表中的每个科目都会得到下一年度的余额行（本年没有余额行的按 0 结转），新增的行期末即期初。
+    """
+    condition, params = profit_condition(prefixes)
+    credit_in = ", ".join(["%s"] * len(credit_path)) or "NULL"
+    debit_in = ", ".join(["%s"] * len(debit_path)) or "NULL"
+    cursor.execute(f"""
+        INSERT INTO account_balances (account_code, fiscal_year, opening_balance, closing_balance)
+        SELECT code, next_year, new_opening, new_opening FROM (
+            SELECT coa.account_code AS code, %s AS next_year,
+                   CASE
+                       WHEN {condition} THEN 0
+                       WHEN coa.account_code IN ({credit_in}) THEN COALESCE(ab.closing_balance, 0) + %s
+                       WHEN coa.account_code IN ({debit_in}) THEN COALESCE(ab.closing_balance, 0) - %s
+                       ELSE COALESCE(ab.closing_balance, 0)
+                   END AS new_opening
+            FROM chart_of_accounts coa
+            LEFT JOIN account_balances ab ON ab.account_code = coa.account_code AND ab.fiscal_year = %s
+        ) AS carried
+        ON DUPLICATE KEY UPDATE
+            closing_balance = closing_balance - opening_balance + new_opening,
+            opening_balance = new_opening
+    """, (year + 1, *params, *credit_path, profit, *debit_path, profit, year))
+    return cursor.rowcount
+
+
+def close_years(conn, from_year, to_year=None, force=False, retained_account=None):
+    """
+    依次结转 from_year 至 to_year - 1 各年度（to_year 默认为 from_year + 1），在一个事务中完成。
+    retained_account 为空时使用 YEAR_END_CONFIG 中的留存收益科目。
+    返回每个年度的结果 [{"year", "status": "closed"|"unchanged", "net_income", "affected_rows"}, ...]。
+    """
+    to_year = to_year or from_year + 1
+    if to_year <= from_year:
+        raise ValueError("截止年度必须晚于起始年度")
+    if to_year - from_year > MAX_CHAIN_YEARS:
+        raise ValueError(f"一次最多结转 {MAX_CHAIN_YEARS} 个年度")
+
+    retained = retained_account or YEAR_END_CONFIG['retained_earnings_account']
+    prefixes = tuple(YEAR_END_CONFIG['profit_prefixes'])
+    settings = f"{retained}|{','.join(prefixes)}"
+
+    cursor = conn.cursor()
+    results = []
+    try:
+        tree = account_tree.build_tree(cursor)
+        credit_path, debit_path = retained_earnings_path(tree, retained)
+        # 以下语句处于同一个事务中（连接未开启自动提交）；锁住结转记录，避免两个结转同时运行
+        cursor.execute("SELECT fiscal_year, source_fingerprint FROM year_end_closes "
+                       "WHERE fiscal_year >= %s AND fiscal_year < %s FOR UPDATE", (from_year, to_year))
+        recorded = dict(cursor.fetchall())
+        for year in range(from_year, to_year):
+            archive.ensure_writable(cursor, year + 1)
+
+            fingerprint = closing_fingerprint(cursor, year, settings)
+            if not force and recorded.get(year) == fingerprint:
+                results.append({"year": year, "status": "unchanged"})
+                continue
+            profit = net_income(cursor, year, prefixes)
+            rows = carry_forward_year(cursor, year, profit, prefixes, credit_path, debit_path)
+            cursor.execute("""
+                INSERT INTO year_end_closes (fiscal_year, source_fingerprint, net_income, accounts)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE source_fingerprint = VALUES(source_fingerprint),
+                    net_income = VALUES(net_income), accounts = VALUES(accounts), closed_at = CURRENT_TIMESTAMP
+            """, (year, fingerprint, profit, len(tree)))
+            results.append({"year": year, "status": "closed", "net_income": profit, "affected_rows": rows})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="年末结转：本年期末余额结转为下一年度期初余额")
+    parser.add_argument("year", type=int, help="结转的起始年度")
+    parser.add_argument("--to", type=int, help="连续结转到该年度的期初（默认 year + 1）")
+    parser.add_argument("--force", action="store_true", help="忽略指纹，重新结转全部年度")
+    parser.add_argument("--retained-account", help="留存收益科目（默认取 YEAR_END_CONFIG）")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if conn is None:
+        raise SystemExit(1)
+    try:
+        results = close_years(conn, args.year, args.to, force=args.force, retained_account=args.retained_account)
+    finally:
+        conn.close()
+    for result in results:
+        if result["status"] == "closed":
+            print(f"{result['year']} -> {result['year'] + 1}: 已结转，净利润 {result['net_income']}")
+        else:
+            print(f"{result['year']} -> {result['year'] + 1}: 期末余额未变化，跳过")
+
+
+if __name__ == "__main__":
+    main()
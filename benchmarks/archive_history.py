@@ -0,0 +1,121 @@
+# benchmarks/archive_history.py
+"""
+历史年度归档压测：当年数据量固定，历史年度逐渐增多，比较当年科目汇总的耗时。
+
+对每个历史年数 H（当年之前有 H 个已结转年度）：
+1. 重建压测数据：H + 1 个年度，每个年度约 --entries-per-year 条分录；
+2. 各历史年度运行科目汇总并依次年末结转到当年；
+3. before —— 所有年度的凭证都在当前表中，计时当年的 proc_generate_account_summary；
+4. 把 H 个历史年度全部归档（archive.archive_year）；
+5. after  —— 当前表只剩当年数据，再次计时当年的科目汇总。
+
+核对：归档前后当年的 account_balances 完全一致。
+预期 after 列基本不随 H 增长，before 列随历史数据增多而变慢（缓冲池容纳不下时更明显）。
+
+每轮都会清空业务表，只允许在库名包含 bench 的数据库上执行（或显式加 --force）。
+用法（在项目根目录执行）：
+    python benchmarks/archive_history.py --history 0 2 4 8 --entries-per-year 50000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive  # noqa: E402
+import datagen  # noqa: E402
+import year_end  # noqa: E402
+from db_utils import db_cursor  # noqa: E402
+
+
+def run_summary(year):
+    with db_cursor() as (conn, cursor):
+        cursor.callproc('proc_generate_account_summary', (year,))
+        conn.commit()
+
+
+def timed_summary(year, repeat):
+    values = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_summary(year)
+        values.append(time.perf_counter() - start)
+    return statistics.median(values)
+
+
+def snapshot(year):
+    with db_cursor() as (conn, cursor):
+        cursor.execute("""
+            SELECT account_code, opening_balance, period_debit, period_credit, closing_balance
+            FROM account_balances WHERE fiscal_year = %s ORDER BY account_code
+        """, (year,))
+        return cursor.fetchall()
+
+
+def count_entries():
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT COUNT(*) FROM journal_entries")
+        return cursor.fetchone()[0]
+
+
+def prepare(seed, current, history, entries_per_year, depth, branching):
+    """生成 history 个历史年度加当年的数据，汇总并结转历史年度"""
+    years = list(range(current - history, current + 1))
+    datagen.load(seed, years, entries_per_year * len(years), depth, branching)
+    if not history:
+        return
+    for year in years[:-1]:
+        run_summary(year)
+    # datagen.load 用同一个种子首先生成科目表，这里重新生成一份以找到留存收益的末级科目
+    chart = datagen.generate_chart(random.Random(seed), depth, branching)
+    retained = next(c for c in datagen.leaf_codes(chart) if c.startswith("4104"))
+    with db_cursor() as (conn, cursor):
+        year_end.close_years(conn, years[0], current, retained_account=retained)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史年度归档压测")
+    parser.add_argument("--seed", type=int, default=20250101, help="随机种子")
+    parser.add_argument("--year", type=int, default=datetime.date.today().year, help="当年")
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 2, 4, 8], help="历史年度数（可给多个）")
+    parser.add_argument("--entries-per-year", type=int, default=20000, help="每个年度的分录条数（约数）")
+    parser.add_argument("--depth", type=int, default=4, help=f"科目最大级别（1-{datagen.MAX_DEPTH}）")
+    parser.add_argument("--branching", type=int, default=4, help="每个科目最多的下级科目数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种情况的计时次数（取中位数）")
+    parser.add_argument("--force", action="store_true", help="允许清空库名不含 bench 的数据库")
+    args = parser.parse_args()
+
+    datagen.check_target(args.force)
+    print(f"{'历史年度':>8}{'分录总数':>12}{'归档后当前表':>14}{'before':>10}{'after':>10}{'归档耗时':>10}  结果核对")
+    failed = False
+    for history in args.history:
+        prepare(args.seed, args.year, history, args.entries_per_year, args.depth, args.branching)
+        total_entries = count_entries()
+
+        before = timed_summary(args.year, args.repeat)
+        expected = snapshot(args.year)
+
+        start = time.perf_counter()
+        for year in range(args.year - history, args.year):
+            with db_cursor() as (conn, cursor):
+                # 生成的数据借贷平衡，跳过试算平衡检查以缩短准备时间
+                archive.archive_year(conn, year, force=True)
+        archive_seconds = time.perf_counter() - start
+
+        after = timed_summary(args.year, args.repeat)
+        same = snapshot(args.year) == expected
+        failed = failed or not same
+        print(f"{history:>8}{total_entries:>12}{count_entries():>14}{before:>9.3f}s{after:>9.3f}s"
+              f"{archive_seconds:>9.2f}s  {'一致' if same else '不一致'}")
+    datagen.reset_database()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
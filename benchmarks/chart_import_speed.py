@@ -0,0 +1,104 @@
+# benchmarks/chart_import_speed.py
+"""
+科目表导入压测：同一张生成的大科目表用三种方式写入空库，比较耗时并核对结果。
+1. per-row   —— 每个科目一条 INSERT、一次提交（原来逐个调用 POST /api/accounts 的做法），
+                触发器逐行推导级别并查询上级科目；
+2. per-level —— 按代码长度分级多行 INSERT（原 datagen 的做法），仍由触发器逐行推导和查询上级；
+3. bulk      —— chart_import.import_chart：内存中校验排序，一个事务多行写入，跳过触发器中的逐行查询。
+bulk 的输入行顺序被打乱，用来确认导入不依赖“上级在前”的文件顺序。
+
+核对：三种方式写入后的 (科目代码, 上级代码, 级别, 余额方向) 完全一致。
+
+每种方式都会清空业务表，只允许在库名包含 bench 的数据库上执行（或显式加 --force）。
+用法（在项目根目录执行）：
+    python benchmarks/chart_import_speed.py --depth 6 --branching 6
+    python benchmarks/chart_import_speed.py --depth 7 --branching 8 --modes per-level bulk
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import chart_import  # noqa: E402
+import datagen  # noqa: E402
+from db_utils import db_cursor  # noqa: E402
+
+MODES = ("per-row", "per-level", "bulk")
+INSERT_SQL = "INSERT INTO chart_of_accounts (account_code, account_name, balance_direction) VALUES "
+
+
+def load_per_row(chart):
+    with db_cursor() as (conn, cursor):
+        for row in chart:
+            cursor.execute(INSERT_SQL + "(%s, %s, %s)", row)
+            conn.commit()
+
+
+def load_per_level(chart):
+    with db_cursor() as (conn, cursor):
+        for length in sorted({len(code) for code, _, _ in chart}):
+            rows = [row for row in chart if len(row[0]) == length]
+            chart_import.insert_rows(cursor, INSERT_SQL, "(%s, %s, %s)", rows, 1000)
+        conn.commit()
+
+
+def load_bulk(chart, seed):
+    rows = list(chart)
+    random.Random(seed).shuffle(rows)
+    result = chart_import.import_chart(datagen.chart_records(rows))
+    if result["errors"]:
+        raise RuntimeError(f"导入失败: {result['errors'][:5]}")
+
+
+def snapshot():
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT account_code, parent_code, level, balance_direction FROM chart_of_accounts "
+                       "ORDER BY account_code")
+        return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="科目表导入压测")
+    parser.add_argument("--seed", type=int, default=20250101, help="随机种子")
+    parser.add_argument("--depth", type=int, default=6, help=f"科目最大级别（1-{datagen.MAX_DEPTH}）")
+    parser.add_argument("--branching", type=int, default=6, help="每个科目最多的下级科目数")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="参与比较的方式")
+    parser.add_argument("--force", action="store_true", help="允许清空库名不含 bench 的数据库")
+    args = parser.parse_args()
+
+    datagen.check_target(args.force)
+    chart = datagen.generate_chart(random.Random(args.seed), args.depth, args.branching)
+    levels = max(len(code) for code, _, _ in chart) // 2 - 1
+    print(f"科目: {len(chart)} 个，最深 {levels} 级")
+    print(f"{'方式':<12}{'耗时':>10}{'科目/秒':>12}")
+
+    loaders = {
+        "per-row": lambda: load_per_row(chart),
+        "per-level": lambda: load_per_level(chart),
+        "bulk": lambda: load_bulk(chart, args.seed),
+    }
+    results = {}
+    for mode in args.modes:
+        datagen.reset_database()
+        start = time.perf_counter()
+        loaders[mode]()
+        elapsed = time.perf_counter() - start
+        results[mode] = snapshot()
+        print(f"{mode:<12}{elapsed:>9.2f}s{len(chart) / elapsed:>12.0f}")
+    datagen.reset_database()
+
+    expected = results[args.modes[0]]
+    different = [mode for mode in args.modes if results[mode] != expected]
+    if len(expected) != len(chart):
+        different.append(f"{args.modes[0]}（写入 {len(expected)} 行）")
+    print(f"结果核对: {'各方式写入的科目一致' if not different else '不一致: ' + ', '.join(different)}")
+    if different:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
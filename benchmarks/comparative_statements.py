@@ -0,0 +1,104 @@
+# benchmarks/comparative_statements.py
+"""
+多年度对比报表压测：同一组年度分别用三种方式生成报表，比较耗时并核对结果。
+1. procedure   —— 每个年度调用一次存储过程（原来前端逐年请求的做法）；
+2. per-year    —— 每个年度调用一次 Python 引擎 generate_report；
+3. comparative —— report_engine.comparative_report 一次读取全部年度、一次遍历得到各年度列。
+
+核对：对比报表中每个年度的列与该年度单独生成的报表逐行相等
+（资产负债表比较年末数，利润表和现金流量表比较本期金额）。
+
+用法（在项目根目录执行，数据可由 benchmarks/datagen.py 生成）：
+    python benchmarks/comparative_statements.py --years 2021 2022 2023 2024 2025 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import report_engine  # noqa: E402
+from db_utils import call_procedure, db_cursor  # noqa: E402
+
+# 每张报表中与对比报表的金额列对应的字段
+CURRENT_COLUMNS = {
+    "balance_sheet": ("asset_closing", "liability_equity_closing"),
+    "income_statement": ("amount",),
+    "cash_flow_statement": ("current_period_amount",),
+}
+COMPARATIVE_COLUMNS = {
+    "balance_sheet": ("asset_amounts", "liability_equity_amounts"),
+    "income_statement": ("amounts",),
+    "cash_flow_statement": ("amounts",),
+}
+
+
+def timed(func, repeat):
+    values = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        values.append(time.perf_counter() - start)
+    return statistics.median(values), result
+
+
+def check(report, years, per_year, comparative):
+    """返回对比报表与逐年报表不一致之处的描述列表"""
+    problems = []
+    rows = comparative["rows"]
+    for column_index, year in enumerate(years):
+        expected = per_year[year]
+        if len(expected) != len(rows):
+            problems.append(f"{year}: 行数不同 {len(expected)} / {len(rows)}")
+            continue
+        for single, combined in zip(expected, rows):
+            for field, amounts_field in zip(CURRENT_COLUMNS[report], COMPARATIVE_COLUMNS[report]):
+                amounts = combined[amounts_field]
+                value = None if amounts is None else amounts[column_index]
+                if single[field] != value:
+                    problems.append(f"{year} 行次 {single['line_index']} {field}: {single[field]} != {value}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多年度对比报表压测")
+    parser.add_argument("--years", type=int, nargs="+", required=True, help="对比的年度")
+    parser.add_argument("--reports", nargs="+", default=list(report_engine.STATEMENTS), help="报表")
+    parser.add_argument("--repeat", type=int, default=5, help="每种方式的计时次数（取中位数）")
+    parser.add_argument("--skip-procedure", action="store_true", help="不测存储过程（库中未安装时使用）")
+    args = parser.parse_args()
+    years = sorted(set(args.years))
+
+    problems = []
+    with db_cursor(dictionary=True) as (conn, cursor):
+        print(f"年度: {years[0]}-{years[-1]}（{len(years)} 个）  每种方式计时 {args.repeat} 次取中位数")
+        print(f"{'报表':<22}{'procedure':>12}{'per-year':>12}{'comparative':>14}{'加速比':>10}")
+        for report in args.reports:
+            procedure_seconds = None
+            if not args.skip_procedure:
+                procedure = report_engine.PROCEDURES[report]
+                procedure_seconds, _ = timed(
+                    lambda: [call_procedure(cursor, procedure, (year,)) for year in years], args.repeat)
+            per_year_seconds, per_year = timed(
+                lambda: {year: report_engine.generate_report(cursor, report, year) for year in years}, args.repeat)
+            comparative_seconds, comparative = timed(
+                lambda: report_engine.comparative_report(cursor, report, years), args.repeat)
+            problems += [f"{report} {p}" for p in check(report, years, per_year, comparative)]
+
+            baseline = procedure_seconds if procedure_seconds is not None else per_year_seconds
+            procedure_text = f"{procedure_seconds * 1000:.1f}ms" if procedure_seconds is not None else "-"
+            print(f"{report:<22}{procedure_text:>12}{per_year_seconds * 1000:>10.1f}ms"
+                  f"{comparative_seconds * 1000:>12.1f}ms{baseline / comparative_seconds:>9.1f}x")
+
+    print(f"结果核对: {'对比报表各列与逐年报表一致' if not problems else '发现差异'}")
+    for problem in problems[:50]:
+        print(f"    {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
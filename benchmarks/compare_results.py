@@ -0,0 +1,74 @@
+# benchmarks/compare_results.py
+"""
+比较两次 run_suite.py 的结果，找出变慢的接口和存储过程。
+
+按（分录条数, 用例名称）配对，默认比较中位数；候选结果比基准慢超过阈值（默认 20%）
+且绝对差值超过 --min-delta-ms 的用例视为回退，此时退出码为 1，可直接用于 CI。
+
+用法：
+    python benchmarks/compare_results.py results/base.json results/head.json
+    python benchmarks/compare_results.py base.json head.json --metric p95_ms --threshold 0.3
+"""
+import argparse
+import json
+import sys
+
+
+def load_timings(path):
+    with open(path, encoding="utf-8") as source:
+        result = json.load(source)
+    timings = {}
+    for run in result["runs"]:
+        for name, stats in run["timings"].items():
+            timings[(run["entries"], name)] = stats
+    return result, timings
+
+
+def compare(base, head, metric, threshold, min_delta_ms):
+    """返回 (行列表, 回退数)；行为 (分录条数, 名称, 基准, 候选, 变化比例, 是否回退)"""
+    rows = []
+    regressions = 0
+    for key in sorted(set(base) | set(head)):
+        before = base.get(key, {}).get(metric)
+        after = head.get(key, {}).get(metric)
+        if before is None or after is None:
+            rows.append((*key, before, after, None, False))
+            continue
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold and after - before > min_delta_ms
+        regressions += regressed
+        rows.append((*key, before, after, change, regressed))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较两次压测结果")
+    parser.add_argument("base", help="基准结果文件")
+    parser.add_argument("head", help="候选结果文件")
+    parser.add_argument("--metric", default="median_ms", choices=["min_ms", "median_ms", "p95_ms", "mean_ms"])
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为回退的变慢比例")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="忽略小于该毫秒数的波动")
+    parser.add_argument("--only-changes", action="store_true", help="只显示超过阈值的用例")
+    args = parser.parse_args()
+
+    base_result, base = load_timings(args.base)
+    head_result, head = load_timings(args.head)
+    if base_result.get("parameters") != head_result.get("parameters"):
+        print(f"注意：两次压测参数不同\n    基准: {base_result.get('parameters')}\n    候选: {head_result.get('parameters')}")
+    print(f"基准 {str(base_result.get('commit'))[:10]}  候选 {str(head_result.get('commit'))[:10]}  指标 {args.metric}")
+
+    rows, regressions = compare(base, head, args.metric, args.threshold, args.min_delta_ms)
+    for entries, name, before, after, change, regressed in rows:
+        if change is None:
+            print(f"{entries:>9} {name:<60} {'仅基准' if after is None else '仅候选'}")
+            continue
+        if args.only_changes and abs(change) <= args.threshold:
+            continue
+        flag = "  <-- 回退" if regressed else ""
+        print(f"{entries:>9} {name:<60} {before:>10.2f} -> {after:>10.2f}ms  {change:+7.1%}{flag}")
+    print(f"回退用例: {regressions}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
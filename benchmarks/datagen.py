@@ -0,0 +1,199 @@
+# benchmarks/datagen.py
+"""
+压测数据生成器：按随机种子生成多级科目表和若干年度的借贷平衡凭证。
+
+- 科目表：以报表用到的一级科目为根，按 4/6/8/10... 位代码逐级生成下级科目
+  （与 chart_import 默认的分段规则和 trg_before_insert_chart_of_accounts 一致），
+  每个科目随机决定是否继续细分，得到深浅不一的多级科目树；
+- 凭证：日期均匀分布在指定年度内，每张凭证 2-4 条分录、借贷平衡，只使用末级科目；
+- 同一组参数和种子总是生成完全相同的数据，不同提交之间的压测结果才有可比性。
+
+写入数据库会清空科目、凭证、余额等业务表，只允许在库名包含 bench 的数据库上执行
+（或显式加 --force）。科目通过 chart_import、凭证通过 voucher_import 的批量导入写入。
+
+用法（在项目根目录执行）：
+    python benchmarks/datagen.py --entries 100000 --years 2023 2024 2025 --load
+    python benchmarks/datagen.py --entries 10000 --output vouchers.ndjson   # 只生成文件
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import chart_import  # noqa: E402
+from config import DB_CONFIG  # noqa: E402
+from db_utils import db_cursor  # noqa: E402
+from voucher_import import import_vouchers  # noqa: E402
+
+# 一级科目：覆盖各报表项目引用的科目
+ROOT_ACCOUNTS = [
+    ('1001', '库存现金', 'debit'), ('1002', '银行存款', 'debit'), ('1012', '其他货币资金', 'debit'),
+    ('1121', '应收票据', 'debit'), ('1122', '应收账款', 'debit'), ('1123', '预付账款', 'debit'),
+    ('1221', '其他应收款', 'debit'), ('1401', '材料采购', 'debit'), ('1403', '原材料', 'debit'),
+    ('1405', '库存商品', 'debit'), ('1601', '固定资产', 'debit'), ('1602', '累计折旧', 'credit'),
+    ('1604', '在建工程', 'debit'), ('1701', '无形资产', 'debit'), ('1702', '累计摊销', 'credit'),
+    ('2001', '短期借款', 'credit'), ('2201', '应付票据', 'credit'), ('2202', '应付账款', 'credit'),
+    ('2203', '预收账款', 'credit'), ('2205', '合同负债', 'credit'), ('2211', '应付职工薪酬', 'credit'),
+    ('2221', '应交税费', 'credit'), ('2501', '长期借款', 'credit'), ('4001', '实收资本', 'credit'),
+    ('4002', '资本公积', 'credit'), ('4101', '盈余公积', 'credit'), ('4103', '本年利润', 'credit'),
+    ('4104', '利润分配', 'credit'), ('6001', '主营业务收入', 'credit'), ('6301', '营业外收入', 'credit'),
+    ('6401', '主营业务成本', 'debit'), ('6403', '税金及附加', 'debit'), ('6601', '销售费用', 'debit'),
+    ('6602', '管理费用', 'debit'), ('6603', '财务费用', 'debit'), ('6711', '营业外支出', 'debit'),
+    ('6801', '所得税费用', 'debit'),
+]
+
+VOUCHER_TYPES = ('记', '收', '付', '转')
+
+# 科目代码最长 16 位：一级 4 位 + 6 级 × 2 位
+MAX_DEPTH = 7
+
+# 清空顺序无关（关闭外键检查后执行）
+BUSINESS_TABLES = ('journal_entries', 'vouchers', 'voucher_number_sequences', 'year_end_closes',
+                   'account_period_balances', 'account_balances', 'chart_of_accounts',
+                   'journal_entries_archive', 'vouchers_archive', 'fiscal_year_archives')
+
+
+def generate_chart(rng, depth=4, branching=4, split_probability=0.6):
+    """
+    生成科目表行 (account_code, account_name, balance_direction)，按级别排列（上级在前）。
+    depth 为最大级别（1-7，对应 4/6/8/.../16 位代码），branching 为每个科目最多的下级数。
+    """
+    depth = max(1, min(depth, MAX_DEPTH))
+    rows = [list(root) for root in ROOT_ACCOUNTS]
+    current = rows
+    for level in range(2, depth + 1):
+        children = []
+        for code, name, direction in current:
+            # 一级科目一律细分，保证每个科目树至少有两级；更深的级别按概率细分
+            if level > 2 and rng.random() > split_probability:
+                continue
+            for index in range(1, rng.randint(1, branching) + 1):
+                children.append([f"{code}{index:02d}", f"{name}-{index:02d}", direction])
+        rows.extend(children)
+        current = children
+    return [tuple(row) for row in rows]
+
+
+def leaf_codes(chart):
+    codes = {code for code, _, _ in chart}
+    parents = {code[:-2] for code in codes if len(code) > 4}
+    return sorted(codes - parents)
+
+
+def generate_vouchers(rng, chart, years, entries):
+    """
+    生成约 entries 条分录的凭证（NDJSON 记录，结构与 POST /api/vouchers 相同），按日期排序输出。
+    """
+    leaves = leaf_codes(chart)
+    first_day = datetime.date(min(years), 1, 1)
+    days = (datetime.date(max(years), 12, 31) - first_day).days + 1
+
+    plans = []
+    total = 0
+    while total < entries:
+        size = rng.randint(2, 4)
+        plans.append((first_day + datetime.timedelta(days=rng.randrange(days)), size))
+        total += size
+    plans.sort(key=lambda plan: plan[0])
+
+    for number, (voucher_date, size) in enumerate(plans, start=1):
+        # 一借多贷或多借一贷，金额以分为单位拆分，保证借贷相等
+        amount = rng.randint(100, 10_000_000)
+        splits = sorted(rng.sample(range(1, amount), size - 2)) if size > 2 and amount > size else []
+        parts = [b - a for a, b in zip([0] + splits, splits + [amount])]
+        debit_side = rng.random() < 0.5
+        codes = rng.sample(leaves, size)
+        summary = f"压测凭证 {number}"
+        entries_out = [{"account_code": codes[0], "summary": summary,
+                        "debit": f"{amount / 100:.2f}" if debit_side else "0",
+                        "credit": "0" if debit_side else f"{amount / 100:.2f}"}]
+        for code, part in zip(codes[1:], parts):
+            entries_out.append({"account_code": code, "summary": summary,
+                                "debit": "0" if debit_side else f"{part / 100:.2f}",
+                                "credit": f"{part / 100:.2f}" if debit_side else "0"})
+        yield {"header": {"date": voucher_date.isoformat(), "type": rng.choice(VOUCHER_TYPES), "summary": summary},
+               "entries": entries_out}
+
+
+def check_target(force):
+    if not force and "bench" not in DB_CONFIG["database"]:
+        sys.exit(f"数据库 {DB_CONFIG['database']} 的名称不含 bench，拒绝清空（确认无误请加 --force）")
+
+
+def reset_database():
+    """清空所有业务表"""
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in BUSINESS_TABLES:
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        conn.commit()
+
+
+def chart_records(chart):
+    """把生成的科目表行转换为 chart_import 的科目记录"""
+    return chart_import.parse_records(
+        [{"account_code": code, "account_name": name, "balance_direction": direction}
+         for code, name, direction in chart], "json")
+
+
+def load_chart(chart):
+    """用科目批量导入写入（内存中推导级别和上级代码，一个事务完成）"""
+    result = chart_import.import_chart(chart_records(chart))
+    if result["errors"]:
+        raise RuntimeError(f"生成的科目有 {len(result['errors'])} 处错误，第一处: {result['errors'][0]}")
+    return result["stats"]
+
+
+def load(seed, years, entries, depth=4, branching=4, batch_size=None):
+    """重建压测数据，返回生成与导入的统计信息"""
+    rng = random.Random(seed)
+    chart = generate_chart(rng, depth, branching)
+    start = time.perf_counter()
+    reset_database()
+    load_chart(chart)
+    rejects = []
+    lines = (json.dumps(record, ensure_ascii=False) for record in generate_vouchers(rng, chart, years, entries))
+    stats = import_vouchers(lines, "ndjson", rejects.append, batch_size=batch_size)
+    if rejects:
+        raise RuntimeError(f"生成的凭证有 {len(rejects)} 张被拒绝，第一张: {rejects[0]}")
+    stats.update({"accounts": len(chart), "leaf_accounts": len(leaf_codes(chart)),
+                  "load_seconds": round(time.perf_counter() - start, 3)})
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压测数据生成器")
+    parser.add_argument("--seed", type=int, default=20250101, help="随机种子")
+    parser.add_argument("--entries", type=int, default=10000, help="分录条数（约数）")
+    parser.add_argument("--years", type=int, nargs="+", default=[datetime.date.today().year], help="凭证所在年度")
+    parser.add_argument("--depth", type=int, default=4, help=f"科目最大级别（1-{MAX_DEPTH}）")
+    parser.add_argument("--branching", type=int, default=4, help="每个科目最多的下级科目数")
+    parser.add_argument("--batch-size", type=int, help="导入时每个事务的凭证数")
+    parser.add_argument("--output", help="只把凭证写入 NDJSON 文件，不访问数据库")
+    parser.add_argument("--load", action="store_true", help="清空业务表并写入生成的数据")
+    parser.add_argument("--force", action="store_true", help="允许清空库名不含 bench 的数据库")
+    args = parser.parse_args()
+
+    if args.output:
+        rng = random.Random(args.seed)
+        chart = generate_chart(rng, args.depth, args.branching)
+        with open(args.output, "w", encoding="utf-8") as out:
+            for record in generate_vouchers(rng, chart, args.years, args.entries):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"已写入 {args.output}（科目 {len(chart)} 个）")
+    if args.load:
+        check_target(args.force)
+        stats = load(args.seed, args.years, args.entries, args.depth, args.branching, args.batch_size)
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if not args.output and not args.load:
+        parser.error("请指定 --output 或 --load")
+
+
+if __name__ == "__main__":
+    main()
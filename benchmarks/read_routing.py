@@ -0,0 +1,124 @@
+# benchmarks/read_routing.py
+"""
+读写分离检查：用本机的两个（或更多）MySQL 实例验证 db_utils 的读请求路由。
+
+主库取 config.DB_CONFIG，从库由 --replica 指定（不需要真的配置复制，只要能连上、有同名数据库即可；
+各实例的 server_id 必须不同，用 SELECT @@server_id 判断查询落在哪个实例上）。检查项：
+1. 轮询：会话没有写入时，读请求在各从库之间轮流分配，不落到主库；
+2. 读己之写：会话在主库提交后，窗口内的读请求走主库；客户端带回的截止时间（Cookie）同样生效，
+   截止时间已过则恢复读从库；
+3. 故障回退：加入一个连不上的从库（--dead-port），读请求跳过它并计入 replica_failures；
+   只剩连不上的从库时读请求回退主库并计入 fallbacks。
+最后输出各目标数据库的语句数和连接池借出次数。
+
+用法（在项目根目录执行，例如主库 3306、从库 3307）：
+    python benchmarks/read_routing.py --replica 127.0.0.1:3307
+    python benchmarks/read_routing.py --replica 127.0.0.1:3307 --replica 127.0.0.1:3308 --reads 300
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import db_utils  # noqa: E402
+import metrics  # noqa: E402
+from db_utils import db_cursor, read_cursor  # noqa: E402
+
+
+def parse_replica(value):
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        raise argparse.ArgumentTypeError("从库格式应为 host:port")
+    return {"host": host, "port": int(port)}
+
+
+def server_id(cursor):
+    cursor.execute("SELECT @@server_id")
+    return cursor.fetchone()[0]
+
+
+def read_server():
+    with read_cursor() as (conn, cursor):
+        return server_id(cursor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="读写分离检查")
+    parser.add_argument("--replica", type=parse_replica, action="append", required=True,
+                        help="从库 host:port（可重复）")
+    parser.add_argument("--reads", type=int, default=100, help="轮询检查的读请求数")
+    parser.add_argument("--dead-port", type=int, default=1, help="用于故障回退检查的不可连接端口")
+    parser.add_argument("--window", type=float, default=2.0, help="读己之写窗口（秒）")
+    args = parser.parse_args()
+
+    replicas = [{**replica, "name": f"replica-{index}"} for index, replica in enumerate(args.replica, start=1)]
+    db_utils.configure_replicas(replicas, window=args.window, retry_seconds=60)
+    with db_cursor() as (conn, cursor):
+        primary_id = server_id(cursor)
+    replica_ids = {}
+    for replica in replicas:
+        with db_utils.get_pool(replica["name"]).connection() as conn:
+            cursor = conn.cursor()
+            replica_ids[replica["name"]] = server_id(cursor)
+            cursor.close()
+    names = {primary_id: db_utils.PRIMARY, **{sid: name for name, sid in replica_ids.items()}}
+    if len(names) != len(replicas) + 1:
+        sys.exit(f"各实例的 server_id 必须不同（主库 {primary_id}，从库 {replica_ids}）")
+
+    failures = []
+
+    def check(label, ok, detail):
+        print(f"[{'通过' if ok else '失败'}] {label}: {detail}")
+        if not ok:
+            failures.append(label)
+
+    # 1. 轮询
+    db_utils.begin_session()
+    counts = {}
+    for _ in range(args.reads):
+        target = names[read_server()]
+        counts[target] = counts.get(target, 0) + 1
+    expected = args.reads / len(replicas)
+    balanced = (db_utils.PRIMARY not in counts
+                and all(abs(counts.get(r["name"], 0) - expected) <= 1 for r in replicas))
+    check("轮询", balanced, counts)
+
+    # 2. 读己之写
+    with db_cursor() as (conn, cursor):
+        conn.commit()
+    check("提交后读主库", names[read_server()] == db_utils.PRIMARY,
+          f"截止时间 {db_utils.session_primary_until():.3f}")
+    time.sleep(args.window + 0.1)
+    check("窗口结束后读从库", names[read_server()] != db_utils.PRIMARY, f"等待 {args.window + 0.1}s")
+    db_utils.begin_session(time.time() + args.window)
+    check("带回截止时间时读主库", names[read_server()] == db_utils.PRIMARY, "Cookie 截止时间未到")
+    db_utils.begin_session(time.time() - 1)
+    check("截止时间已过读从库", names[read_server()] != db_utils.PRIMARY, "Cookie 截止时间已过")
+    db_utils.end_session()
+
+    # 3. 故障回退
+    dead = {"host": "127.0.0.1", "port": args.dead_port, "name": "unreachable"}
+    db_utils.configure_replicas([dead, *replicas], window=args.window, retry_seconds=60)
+    db_utils.begin_session()
+    targets = [names[read_server()] for _ in range(len(replicas) * 2 + 2)]
+    routing = db_utils.read_router.stats()
+    check("跳过连不上的从库", db_utils.PRIMARY not in targets and routing["replicas_down"] == ["unreachable"],
+          f"目标 {sorted(set(targets))}，连接失败 {routing['replica_failures']} 次")
+    db_utils.configure_replicas([dead], window=args.window, retry_seconds=60)
+    targets = [names[read_server()] for _ in range(3)]
+    routing = db_utils.read_router.stats()
+    check("从库全部不可用时回退主库", targets == [db_utils.PRIMARY] * 3,
+          f"回退 {routing['fallbacks']} 次，连接失败 {routing['replica_failures']} 次")
+    db_utils.end_session()
+
+    print("各目标数据库的语句数:", json.dumps(metrics.query_counts(), ensure_ascii=False))
+    print("主库连接池借出次数:", db_utils.get_pool_stats()["checkouts"])
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/report_concurrency.py
+"""
+报表接口并发压测：N 个线程同时请求不同年度的报表，检查
+1. 每个响应都与单线程顺序请求得到的结果完全一致（不会拿到别人的年度）；
+2. 压测期间数据库没有出现锁等待。
+
+用法（在项目根目录执行，需要本地 MySQL 中已有数据）：
+    python benchmarks/report_concurrency.py --years 2023 2024 2025 --threads 16 --rounds 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app import app  # noqa: E402
+from db_utils import db_cursor  # noqa: E402
+
+REPORTS = ["balance_sheet", "income_statement", "cash_flow_statement"]
+
+LOCK_STATUS_VARIABLES = ("Table_locks_waited", "Innodb_row_lock_waits")
+
+
+def read_lock_counters():
+    """读取数据库全局状态中的锁等待计数器"""
+    with db_cursor() as (conn, cursor):
+        placeholders = ", ".join(["%s"] * len(LOCK_STATUS_VARIABLES))
+        cursor.execute(f"SHOW GLOBAL STATUS WHERE Variable_name IN ({placeholders})", LOCK_STATUS_VARIABLES)
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+class LockWaitMonitor(threading.Thread):
+    """
+    压测期间定时查看 PROCESSLIST，统计处于“Waiting for … lock”状态的会话。
+    元数据锁（TRUNCATE 争用的就是它）不计入上面的全局计数器，只能这样采样。
+    """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = 0
+        self.max_waiting = 0
+        self.states = set()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        with db_cursor() as (conn, cursor):
+            while not self._stop_event.is_set():
+                cursor.execute("""
+                    SELECT STATE FROM information_schema.PROCESSLIST
+                    WHERE STATE LIKE 'Waiting for%lock%'
+                """)
+                waiting = [row[0] for row in cursor.fetchall()]
+                conn.rollback()
+                self.samples += 1
+                self.max_waiting = max(self.max_waiting, len(waiting))
+                self.states.update(waiting)
+                self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def fetch(client, report, year, engine):
+    start = time.perf_counter()
+    response = client.get(f"/api/reports/{report}?year={year}&engine={engine}")
+    elapsed = time.perf_counter() - start
+    return report, year, response.status_code, response.get_json(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="报表接口并发压测")
+    parser.add_argument("--years", type=int, nargs="+", required=True, help="参与压测的会计年度")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--rounds", type=int, default=10, help="每个（报表, 年度）组合的请求次数")
+    parser.add_argument("--engine", choices=["procedure", "python"], default="procedure")
+    args = parser.parse_args()
+
+    client = app.test_client()
+
+    # 1. 顺序请求一遍，作为期望结果
+    expected = {}
+    for report in REPORTS:
+        for year in args.years:
+            _, _, status, data, _ = fetch(client, report, year, args.engine)
+            if status != 200:
+                sys.exit(f"{report} {year} 顺序请求失败: {data}")
+            expected[(report, year)] = data
+
+    # 2. 并发请求，不同年度交错提交
+    jobs = [(report, year) for _ in range(args.rounds) for year in args.years for report in REPORTS]
+    before = read_lock_counters()
+    monitor = LockWaitMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda job: fetch(app.test_client(), job[0], job[1], args.engine), jobs))
+    wall = time.perf_counter() - start
+    monitor.stop()
+    after = read_lock_counters()
+
+    mismatches = [(report, year, status) for report, year, status, data, _ in results
+                  if status != 200 or data != expected[(report, year)]]
+    latencies = sorted(elapsed for *_, elapsed in results)
+    lock_waits = {name: after[name] - before.get(name, 0) for name in after}
+
+    print(f"请求数: {len(results)}  线程数: {args.threads}  引擎: {args.engine}")
+    print(f"总耗时: {wall:.3f}s  吞吐: {len(results) / wall:.1f} req/s")
+    print(f"延迟 p50: {latencies[len(latencies) // 2] * 1000:.1f}ms  "
+          f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms  "
+          f"max: {latencies[-1] * 1000:.1f}ms")
+    print(f"锁等待增量: {lock_waits}")
+    print(f"锁等待会话（{monitor.samples} 次采样）: 最多 {monitor.max_waiting} 个  状态: {sorted(monitor.states) or '无'}")
+    print(f"结果不一致: {len(mismatches)}")
+    for report, year, status in mismatches[:20]:
+        print(f"    {report} {year} status={status}")
+
+    if mismatches or any(lock_waits.values()) or monitor.max_waiting:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# benchmarks/run_suite.py
+"""
+端到端压测：在若干数据规模下，逐个计时全部 /api/* 接口和存储过程，结果写成 JSON 供跨提交比较。
+
+每个数据规模的流程：
+1. 用 datagen 按固定种子重建数据（科目表 + N 条分录，写入耗时一并记录）；
+2. 计时存储过程：每个年度的 proc_generate_account_summary，以及最后一个年度的三张报表过程；
+3. 通过 Flask 测试客户端计时每个 /api/* 接口（报表接口每次请求前清空报表缓存，测的是计算耗时）；
+   写接口成对执行（新增后立即删除），尽量不改变数据规模；
+4. 没有被覆盖到的 /api/* 路由列在结果的 uncovered_routes 中，新增接口时记得补上用例。
+
+结果文件默认写入 benchmarks/results/<提交号>-<时间>.json，可用 compare_results.py 比较两次结果。
+
+用法（在项目根目录执行，需要一个库名含 bench 的本地 MySQL 数据库）：
+    python benchmarks/run_suite.py --sizes 10000 100000 1000000 --years 2023 2024 2025
+    python benchmarks/run_suite.py --sizes 10000 --repeat 3 --output /tmp/bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "backend"))
+sys.path.insert(0, BENCH_DIR)
+
+import datagen  # noqa: E402
+from account_tree import get_account_tree  # noqa: E402
+from app import app  # noqa: E402
+from db_utils import db_cursor, call_procedure  # noqa: E402
+from report_cache import report_cache  # noqa: E402
+
+RESULT_SCHEMA = 1
+REPORT_PROCEDURES = ("proc_generate_balance_sheet", "proc_generate_income_statement",
+                     "proc_generate_cash_flow_statement")
+BENCH_ACCOUNT_CODE = "9901"
+
+
+def summarize(samples):
+    """把一组耗时（秒）汇总为毫秒统计值"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[max(int(len(ordered) * 0.95) - 1, 0)] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+# ==========================================
+# 接口用例
+# ==========================================
+
+def route_cases(ctx):
+    """
+    返回 [(名称, 方法, 路由规则, 执行函数), ...]。执行函数接收测试客户端，返回响应。
+    名称中的规则与 app.url_map 一致，用于统计覆盖情况。
+    """
+    year = ctx["year"]
+    code = ctx["account_code"]
+    leaves = ctx["leaves"]
+
+    def get(path, clear_cache=False):
+        def run(client):
+            if clear_cache:
+                report_cache.clear()
+            return client.get(path)
+        return run
+
+    def create_voucher(client):
+        response = client.post("/api/vouchers", json={
+            "header": {"date": f"{year}-06-15", "type": "记", "summary": "压测凭证"},
+            "entries": [
+                {"account_code": leaves[0], "summary": "压测", "debit": "100.00", "credit": "0"},
+                {"account_code": leaves[1], "summary": "压测", "debit": "0", "credit": "100.00"},
+            ]})
+        ctx["voucher_id"] = (response.get_json() or {}).get("voucher_id")
+        return response
+
+    def delete_voucher(client):
+        return client.delete(f"/api/vouchers/{ctx.pop('voucher_id', 0)}")
+
+    def save_balances(client):
+        balances = client.get(f"/api/account_balances?year={year}").get_json()["balances"]
+        payload = [{"account_code": c, "balance": b or 0} for c, b in balances.items()]
+        return client.post("/api/account_balances", json={"year": year, "balances": payload})
+
+    def generate_summary(client):
+        """汇总在后台任务中执行：提交后等待任务结束，计时包含完整的重算过程"""
+        response = client.post("/api/reports/generate_summary", json={"year": year})
+        job_id = (response.get_json() or {}).get("job_id")
+        ctx["job_id"] = job_id
+        while job_id:
+            response = client.get(f"/api/jobs/{job_id}?wait=5")
+            if (response.get_json() or {}).get("status") not in ("queued", "running"):
+                break
+        return response
+
+    def import_vouchers(client):
+        rng = random.Random(ctx["seed"])
+        records = datagen.generate_vouchers(rng, ctx["chart"], [year], 100)
+        body = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        return client.post("/api/vouchers/import?format=ndjson", data=body.encode("utf-8"),
+                           content_type="application/x-ndjson")
+
+    def import_accounts(client):
+        """只校验不写入：一个新的一级科目及其下 3 级共 1 + 10 + 100 + 1000 个科目"""
+        accounts = [{"account_code": "9999", "account_name": "压测导入", "balance_direction": "debit"}]
+        parents = ["9999"]
+        for _ in range(3):
+            parents = [f"{parent}{index:02d}" for parent in parents for index in range(1, 11)]
+            accounts.extend({"account_code": c, "account_name": f"压测导入{c}"} for c in parents)
+        return client.post("/api/accounts/import?dry_run=1", json=accounts)
+
+    return [
+        ("GET /api/accounts", "GET", "/api/accounts", get("/api/accounts")),
+        ("GET /api/accounts/leaf", "GET", "/api/accounts/leaf", get("/api/accounts/leaf")),
+        ("GET /api/accounts/<account_code>", "GET", "/api/accounts/<string:account_code>",
+         get(f"/api/accounts/{code}")),
+        ("POST /api/accounts", "POST", "/api/accounts", lambda client: client.post("/api/accounts", json={
+            "account_code": BENCH_ACCOUNT_CODE, "account_name": "压测科目", "balance_direction": "debit"})),
+        ("PUT /api/accounts/<account_code>", "PUT", "/api/accounts/<string:account_code>",
+         lambda client: client.put(f"/api/accounts/{BENCH_ACCOUNT_CODE}", json={"account_name": "压测科目2"})),
+        ("DELETE /api/accounts/<account_code>", "DELETE", "/api/accounts/<string:account_code>",
+         lambda client: client.delete(f"/api/accounts/{BENCH_ACCOUNT_CODE}")),
+        ("POST /api/accounts/import", "POST", "/api/accounts/import", import_accounts),
+        ("GET /api/account_balances", "GET", "/api/account_balances", get(f"/api/account_balances?year={year}")),
+        ("POST /api/account_balances", "POST", "/api/account_balances", save_balances),
+        ("POST /api/reports/generate_summary", "POST", "/api/reports/generate_summary", generate_summary),
+        ("GET /api/jobs/<job_id>", "GET", "/api/jobs/<job_id>", lambda client: client.get(f"/api/jobs/{ctx['job_id']}")),
+        ("GET /api/jobs", "GET", "/api/jobs", get("/api/jobs")),
+        ("GET /api/reports/account_summary", "GET", "/api/reports/account_summary",
+         get(f"/api/reports/account_summary?year={year}", clear_cache=True)),
+        ("GET /api/reports/account_summary (gzip)", "GET", "/api/reports/account_summary",
+         lambda client: client.get(f"/api/reports/account_summary?year={year}", headers={"Accept-Encoding": "gzip"})),
+        ("GET /api/reports/account_summary?period", "GET", "/api/reports/account_summary",
+         get(f"/api/reports/account_summary?from={year}-01&to={year}-06", clear_cache=True)),
+        ("GET /api/reports/balance_sheet", "GET", "/api/reports/balance_sheet",
+         get(f"/api/reports/balance_sheet?year={year}", clear_cache=True)),
+        ("GET /api/reports/balance_sheet?engine=python", "GET", "/api/reports/balance_sheet",
+         get(f"/api/reports/balance_sheet?year={year}&engine=python", clear_cache=True)),
+        ("GET /api/reports/balance_sheet?years", "GET", "/api/reports/balance_sheet",
+         get(f"/api/reports/balance_sheet?years={year - 2}-{year}", clear_cache=True)),
+        ("GET /api/reports/income_statement", "GET", "/api/reports/income_statement",
+         get(f"/api/reports/income_statement?year={year}", clear_cache=True)),
+        ("GET /api/reports/income_statement?engine=python", "GET", "/api/reports/income_statement",
+         get(f"/api/reports/income_statement?year={year}&engine=python", clear_cache=True)),
+        ("GET /api/reports/cash_flow_statement", "GET", "/api/reports/cash_flow_statement",
+         get(f"/api/reports/cash_flow_statement?year={year}", clear_cache=True)),
+        ("GET /api/reports/cash_flow_statement?engine=python", "GET", "/api/reports/cash_flow_statement",
+         get(f"/api/reports/cash_flow_statement?year={year}&engine=python", clear_cache=True)),
+        ("GET /api/reports/bundle", "GET", "/api/reports/bundle",
+         get(f"/api/reports/bundle?year={year}", clear_cache=True)),
+        ("GET /api/reports/trial_balance", "GET", "/api/reports/trial_balance",
+         get(f"/api/reports/trial_balance?year={year}", clear_cache=True)),
+        ("POST /api/year_end/close", "POST", "/api/year_end/close",
+         lambda client: client.post("/api/year_end/close", json={
+             "year": year - 1, "to_year": year, "force": True,
+             "retained_earnings_account": next(c for c in datagen.leaf_codes(ctx["chart"]) if c.startswith("4104"))})),
+        ("GET /api/year_end/closes", "GET", "/api/year_end/closes", get("/api/year_end/closes")),
+        ("GET /api/reports/cache", "GET", "/api/reports/cache", get("/api/reports/cache")),
+        ("POST /api/reports/cache/pinned_years", "POST", "/api/reports/cache/pinned_years",
+         lambda client: client.post("/api/reports/cache/pinned_years", json={"year": year, "pinned": False})),
+        ("GET /api/vouchers", "GET", "/api/vouchers", get("/api/vouchers")),
+        ("GET /api/vouchers?account_code", "GET", "/api/vouchers", get(f"/api/vouchers?account_code={code}")),
+        ("GET /api/vouchers/<voucher_id>", "GET", "/api/vouchers/<int:voucher_id>",
+         get(f"/api/vouchers/{ctx['sample_voucher_id']}")),
+        ("GET /api/vouchers/details", "GET", "/api/vouchers/details",
+         get(f"/api/vouchers/details?date_from={year}-06-01&date_to={year}-06-30")),
+        ("GET /api/vouchers/details?format=csv", "GET", "/api/vouchers/details",
+         get(f"/api/vouchers/details?date_from={year}-06-01&date_to={year}-06-30&format=csv")),
+        ("POST /api/vouchers/details", "POST", "/api/vouchers/details",
+         lambda client: client.post("/api/vouchers/details", json={
+             "ids": list(range(ctx["sample_voucher_id"], ctx["sample_voucher_id"] + 500)), "format": "json"})),
+        ("GET /api/vouchers/next_number", "GET", "/api/vouchers/next_number",
+         get(f"/api/vouchers/next_number?date={year}-06-15&type=记")),
+        ("POST /api/vouchers", "POST", "/api/vouchers", create_voucher),
+        ("DELETE /api/vouchers/<voucher_id>", "DELETE", "/api/vouchers/<int:voucher_id>", delete_voucher),
+        ("POST /api/vouchers/import", "POST", "/api/vouchers/import", import_vouchers),
+        ("GET /api/ledger/<account_code>", "GET", "/api/ledger/<string:account_code>",
+         get(f"/api/ledger/{code}?date_from={year}-01-01&date_to={year}-12-31")),
+        ("GET /api/system/db_pool", "GET", "/api/system/db_pool", get("/api/system/db_pool")),
+    ]
+
+
+def uncovered_routes(cases):
+    covered = {(method, rule) for _, method, rule, _ in cases}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if not rule.rule.startswith("/api/"):
+            continue
+        for method in sorted(rule.methods - {"HEAD", "OPTIONS"}):
+            if (method, rule.rule) not in covered:
+                missing.append(f"{method} {rule.rule}")
+    return sorted(missing)
+
+
+def time_routes(ctx, repeat):
+    client = app.test_client()
+    cases = route_cases(ctx)
+    samples = {name: [] for name, *_ in cases}
+    statuses = {name: set() for name, *_ in cases}
+    sizes = {}
+    for round_index in range(repeat + 1):  # 第一轮为预热，不计入
+        for name, _method, _rule, run in cases:
+            start = time.perf_counter()
+            response = run(client)
+            body = response.get_data()  # 流式响应在这里才真正读完
+            elapsed = time.perf_counter() - start
+            if round_index > 0:
+                samples[name].append(elapsed)
+                statuses[name].add(response.status_code)
+                sizes[name] = len(body)
+    results = {}
+    for name, values in samples.items():
+        results[f"route:{name}"] = {**summarize(values), "status": sorted(statuses[name]),
+                                    "response_bytes": sizes.get(name)}
+    return results, uncovered_routes(cases)
+
+
+def time_procedures(years, repeat):
+    results = {}
+    with db_cursor(dictionary=True) as (conn, cursor):
+        calls = [("proc_generate_account_summary", year) for year in years]
+        calls += [(proc, years[-1]) for proc in REPORT_PROCEDURES]
+        for proc, year in calls:
+            values = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if proc == "proc_generate_account_summary":
+                    cursor.callproc(proc, (year,))
+                    conn.commit()
+                else:
+                    call_procedure(cursor, proc, (year,))
+                values.append(time.perf_counter() - start)
+            results[f"procedure:{proc}({year})"] = summarize(values)
+    return results
+
+
+def run_size(entries, args):
+    dataset = datagen.load(args.seed, args.years, entries, args.depth, args.branching)
+    timings = time_procedures(args.years, args.repeat)
+
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT id FROM vouchers ORDER BY id LIMIT 1")
+        sample_voucher_id = cursor.fetchone()[0]
+    tree = get_account_tree()
+    rng = random.Random(args.seed)
+    ctx = {
+        "year": args.years[-1],
+        "seed": args.seed,
+        "chart": datagen.generate_chart(rng, args.depth, args.branching),
+        "account_code": "1002",
+        "leaves": sorted(tree.leaf_codes)[:2],
+        "sample_voucher_id": sample_voucher_id,
+    }
+    route_timings, uncovered = time_routes(ctx, args.repeat)
+    timings.update(route_timings)
+    return {"entries": entries, "dataset": dataset, "timings": timings, "uncovered_routes": uncovered}
+
+
+def git_revision():
+    root = os.path.join(BENCH_DIR, "..")
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def mysql_version():
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT VERSION()")
+        return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口与存储过程端到端压测")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="分录条数")
+    parser.add_argument("--years", type=int, nargs="+", default=[2023, 2024, 2025], help="凭证所在年度")
+    parser.add_argument("--seed", type=int, default=20250101, help="随机种子")
+    parser.add_argument("--depth", type=int, default=4, help="科目最大级别（1-4）")
+    parser.add_argument("--branching", type=int, default=4, help="每个科目最多的下级科目数")
+    parser.add_argument("--repeat", type=int, default=5, help="每个用例的计时次数（另有一次预热）")
+    parser.add_argument("--output", help="结果文件路径，默认 benchmarks/results/<提交号>-<时间>.json")
+    parser.add_argument("--force", action="store_true", help="允许清空库名不含 bench 的数据库")
+    args = parser.parse_args()
+    args.years = sorted(args.years)
+
+    datagen.check_target(args.force)
+    commit, dirty = git_revision()
+    started = datetime.datetime.now(datetime.timezone.utc)
+    result = {
+        "schema": RESULT_SCHEMA,
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mysql_version": mysql_version(),
+        "parameters": {"seed": args.seed, "years": args.years, "depth": args.depth,
+                       "branching": args.branching, "repeat": args.repeat},
+        "runs": [],
+    }
+    for entries in args.sizes:
+        print(f"== {entries} 条分录 ==")
+        run = run_size(entries, args)
+        result["runs"].append(run)
+        for name, stats in run["timings"].items():
+            print(f"    {name:<60} median {stats['median_ms']:>10.2f}ms  p95 {stats['p95_ms']:>10.2f}ms")
+        if run["uncovered_routes"]:
+            print(f"    未覆盖的接口: {', '.join(run['uncovered_routes'])}")
+
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"{(commit or 'nogit')[:10]}-{started:%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as out:
+        json.dump(result, out, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
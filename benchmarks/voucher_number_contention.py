@@ -0,0 +1,130 @@
+# benchmarks/voucher_number_contention.py
+"""
+凭证号分配的并发压测：N 个线程各自在事务中反复“取号 + 插入凭证”（与保存凭证的事务相同），
+统计事务延迟，并检查
+1. 同一期间内分配出的号码没有重复、没有空号；
+2. 没有死锁和锁等待超时（取号若对 vouchers 加了范围锁，会与并发的 INSERT INTO vouchers 死锁）；
+3. --periods 大于 1 时，不同期间的取号互不阻塞（延迟应明显低于单期间）。
+
+压测使用专用凭证字（默认 BENCH），默认所有线程争用 1900 年 1 月这一个期间，
+真实插入凭证主表（不写分录）；开始前和结束后删除该凭证字的凭证和序列行。
+
+用法（在项目根目录执行，需要本地 MySQL 中已建好 voucher_number_sequences 表）：
+    python benchmarks/voucher_number_contention.py --threads 8 --allocations 200
+    python benchmarks/voucher_number_contention.py --threads 8 --periods 4 --hold-ms 5
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from db_utils import db_cursor  # noqa: E402
+from voucher_numbers import allocate_number, reserve_numbers  # noqa: E402
+
+
+def period_date(index):
+    return datetime.date(1900, index % 12 + 1, 1)
+
+
+# 死锁、锁等待超时
+LOCK_ERRORS = (1213, 1205)
+
+
+def worker(thread_index, args):
+    """
+    返回 ([(期间, 号码列表, 延迟秒), ...], 锁错误次数)。
+    每个事务先取号再插入凭证，与保存凭证的顺序相同；hold-ms 模拟写分录和余额的耗时。
+    """
+    results = []
+    lock_errors = 0
+    with db_cursor() as (conn, cursor):
+        for i in range(args.allocations):
+            voucher_date = period_date((thread_index + i) % args.periods)
+            start = time.perf_counter()
+            try:
+                conn.start_transaction()
+                if args.block > 1:
+                    first = reserve_numbers(cursor, args.type, voucher_date, args.block)
+                    numbers = list(range(first, first + args.block))
+                else:
+                    numbers = [allocate_number(cursor, args.type, voucher_date)]
+                cursor.executemany(
+                    "INSERT INTO vouchers (voucher_date, voucher_type, voucher_number, summary) VALUES (%s, %s, %s, %s)",
+                    [(voucher_date, args.type, number, "取号压测") for number in numbers])
+                if args.hold_ms:
+                    time.sleep(args.hold_ms / 1000)
+                conn.commit()
+            except mysql.connector.Error as err:
+                conn.rollback()
+                if err.errno not in LOCK_ERRORS:
+                    raise
+                lock_errors += 1
+                continue
+            elapsed = time.perf_counter() - start
+            results.append((voucher_date, numbers, elapsed))
+    return results, lock_errors
+
+
+def cleanup(voucher_type):
+    with db_cursor() as (conn, cursor):
+        cursor.execute("DELETE FROM vouchers WHERE voucher_type = %s", (voucher_type,))
+        cursor.execute("DELETE FROM voucher_number_sequences WHERE voucher_type = %s", (voucher_type,))
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="凭证号分配并发压测")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数（不要超过连接池上限）")
+    parser.add_argument("--allocations", type=int, default=100, help="每个线程的取号事务数")
+    parser.add_argument("--periods", type=int, default=1, help="参与取号的期间数（1 表示所有线程争用同一期间）")
+    parser.add_argument("--block", type=int, default=1, help="每个事务预留的号码数（模拟批量导入）")
+    parser.add_argument("--hold-ms", type=float, default=0, help="取号后、提交前的等待时间（毫秒）")
+    parser.add_argument("--type", default="BENCH", help="压测使用的凭证字")
+    args = parser.parse_args()
+
+    cleanup(args.type)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            batches = list(pool.map(lambda index: worker(index, args), range(args.threads)))
+    finally:
+        wall = time.perf_counter() - start
+        cleanup(args.type)
+
+    transactions = [item for batch, _ in batches for item in batch]
+    lock_errors = sum(errors for _, errors in batches)
+    latencies = sorted(elapsed for _, _, elapsed in transactions)
+    by_period = {}
+    for voucher_date, numbers, _ in transactions:
+        by_period.setdefault(voucher_date, []).extend(numbers)
+    problems = []
+    for voucher_date, numbers in sorted(by_period.items()):
+        if sorted(numbers) != list(range(1, len(numbers) + 1)):
+            duplicates = len(numbers) - len(set(numbers))
+            problems.append(f"{voucher_date:%Y-%m}: {len(numbers)} 个号码，重复 {duplicates} 个，存在空号或重号")
+
+    count = len(latencies)
+    print(f"线程数: {args.threads}  期间数: {args.periods}  每事务号码数: {args.block}  持锁: {args.hold_ms}ms")
+    print(f"取号事务: {count}  号码: {sum(len(n) for n in by_period.values())}  总耗时: {wall:.3f}s  "
+          f"吞吐: {count / wall:.1f} 事务/s")
+    print(f"延迟 p50: {latencies[count // 2] * 1000:.2f}ms  "
+          f"p95: {latencies[max(int(count * 0.95) - 1, 0)] * 1000:.2f}ms  "
+          f"p99: {latencies[max(int(count * 0.99) - 1, 0)] * 1000:.2f}ms  "
+          f"max: {latencies[-1] * 1000:.2f}ms")
+    if lock_errors:
+        problems.append(f"死锁或锁等待超时 {lock_errors} 次（事务已回滚）")
+    print(f"号码检查: {'全部连续且无重复，无死锁' if not problems else '发现问题'}")
+    for problem in problems:
+        print(f"    {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
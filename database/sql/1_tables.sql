@@ -37,6 +37,35 @@ CREATE TABLE `account_balances` (
   UNIQUE KEY `uk_account_year` (`account_code`,`fiscal_year`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='科目余额表';
 
+-- ----------------------------
+-- Table structure for year_end_closes
+-- ----------------------------
+DROP TABLE IF EXISTS `year_end_closes`;
+CREATE TABLE `year_end_closes` (
+  `fiscal_year` int NOT NULL COMMENT '结转的会计年度（其期末余额结转为下一年度期初）',
+  `source_fingerprint` varchar(128) NOT NULL COMMENT '结转时本年期末余额的指纹，未变化时再次结转会跳过',
+  `net_income` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '转入留存收益的本年净利润',
+  `accounts` int NOT NULL DEFAULT '0' COMMENT '结转时的科目数',
+  `closed_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '结转时间',
+  PRIMARY KEY (`fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='年末结转记录';
+
+-- ----------------------------
+-- Table structure for account_period_balances
+-- ----------------------------
+-- 按月的科目发生额（含上级科目汇总）。某期间的期初 = 年初余额 + 之前各月发生额，
+-- 全年发生额 = 12 个月之和，因此任意月份或月份区间的报表都只需合并这里的行。
+DROP TABLE IF EXISTS `account_period_balances`;
+CREATE TABLE `account_period_balances` (
+  `fiscal_year` int NOT NULL COMMENT '会计年度',
+  `period_month` tinyint NOT NULL COMMENT '会计期间（月份 1-12）',
+  `account_code` varchar(16) NOT NULL COMMENT '科目代码',
+  `period_debit` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '本月借方发生额',
+  `period_credit` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '本月贷方发生额',
+  PRIMARY KEY (`fiscal_year`, `period_month`, `account_code`),
+  KEY `idx_account_year` (`account_code`, `fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='科目期间发生额表';
+
 -- ----------------------------
 -- Table structure for vouchers 
 -- ----------------------------
@@ -46,12 +75,32 @@ CREATE TABLE `vouchers` (
   `voucher_date` date NOT NULL COMMENT '凭证日期',
   `voucher_type` varchar(10) NOT NULL COMMENT '凭证字',
   `voucher_number` int NOT NULL COMMENT '凭证号',
+  `voucher_period` int AS (YEAR(`voucher_date`) * 100 + MONTH(`voucher_date`)) STORED COMMENT '凭证期间（如 202501），凭证号在期间内编号',
   `summary` varchar(255) NOT NULL COMMENT '摘要',
+  `total_amount` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '借方合计（保存凭证时写入）',
   `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
-  PRIMARY KEY (`id`)
+  PRIMARY KEY (`id`),
+  -- 凭证列表按 (日期, 凭证号, id) 键集分页；InnoDB 二级索引自带主键 id
+  KEY `idx_voucher_date_number` (`voucher_date`, `voucher_number`),
+  -- 按凭证字筛选后再按日期分页
+  KEY `idx_voucher_type_date` (`voucher_type`, `voucher_date`, `voucher_number`),
+  -- 同一凭证字同一期间内凭证号不得重复
+  UNIQUE KEY `uk_voucher_type_period_number` (`voucher_type`, `voucher_period`, `voucher_number`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='凭证主表';
 
+-- ----------------------------
+-- Table structure for voucher_number_sequences
+-- ----------------------------
+DROP TABLE IF EXISTS `voucher_number_sequences`;
+CREATE TABLE `voucher_number_sequences` (
+  `voucher_type` varchar(10) NOT NULL COMMENT '凭证字',
+  `period_year` smallint NOT NULL COMMENT '年度',
+  `period_month` tinyint NOT NULL COMMENT '月份',
+  `last_number` int NOT NULL DEFAULT '0' COMMENT '已分配的最大凭证号',
+  PRIMARY KEY (`voucher_type`, `period_year`, `period_month`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='凭证号序列（保存凭证时在同一事务中取号）';
+
 -- ----------------------------
 -- Table structure for journal_entries
 -- ----------------------------
@@ -69,6 +118,58 @@ CREATE TABLE `journal_entries` (
   CONSTRAINT `fk_entry_voucher` FOREIGN KEY (`voucher_id`) REFERENCES `vouchers` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='凭证分录表';
 
+-- ----------------------------
+-- Table structure for fiscal_year_archives
+-- ----------------------------
+-- 已归档（backend/archive.py）的年度：凭证和分录已移到归档表，该年度的科目余额为只读快照。
+-- status 为 archiving 表示正在分批搬移（中断后再次运行会继续），两种状态下该年度都不能再写入。
+DROP TABLE IF EXISTS `fiscal_year_archives`;
+CREATE TABLE `fiscal_year_archives` (
+  `fiscal_year` int NOT NULL COMMENT '归档的会计年度',
+  `status` enum('archiving','archived') NOT NULL DEFAULT 'archiving' COMMENT '归档状态',
+  `voucher_count` int NOT NULL DEFAULT '0' COMMENT '归档的凭证数',
+  `entry_count` int NOT NULL DEFAULT '0' COMMENT '归档的分录数',
+  `total_amount` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT '归档凭证的借方合计',
+  `balances_fingerprint` varchar(128) DEFAULT NULL COMMENT '归档时科目余额的指纹，用于核对快照未被改动',
+  `started_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '开始归档时间',
+  `archived_at` datetime DEFAULT NULL COMMENT '完成归档时间',
+  PRIMARY KEY (`fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='年度归档记录';
+
+-- ----------------------------
+-- Table structure for vouchers_archive / journal_entries_archive
+-- ----------------------------
+-- 已归档年度的凭证和分录，列与 vouchers / journal_entries 相同，保留原凭证 id 和分录 id。
+-- 只在归档时写入，不需要外键和唯一约束；压缩行格式减少历史数据占用的磁盘和缓冲池。
+DROP TABLE IF EXISTS `vouchers_archive`;
+CREATE TABLE `vouchers_archive` (
+  `id` int NOT NULL COMMENT '原凭证ID',
+  `voucher_date` date NOT NULL COMMENT '凭证日期',
+  `voucher_type` varchar(10) NOT NULL COMMENT '凭证字',
+  `voucher_number` int NOT NULL COMMENT '凭证号',
+  `voucher_period` int AS (YEAR(`voucher_date`) * 100 + MONTH(`voucher_date`)) STORED COMMENT '凭证期间',
+  `summary` varchar(255) NOT NULL COMMENT '摘要',
+  `total_amount` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '借方合计',
+  `created_at` datetime DEFAULT NULL COMMENT '创建时间',
+  `updated_at` datetime DEFAULT NULL COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_voucher_date_number` (`voucher_date`, `voucher_number`),
+  KEY `idx_voucher_type_date` (`voucher_type`, `voucher_date`, `voucher_number`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 ROW_FORMAT=COMPRESSED COMMENT='凭证主表（已归档年度）';
+
+DROP TABLE IF EXISTS `journal_entries_archive`;
+CREATE TABLE `journal_entries_archive` (
+  `id` int NOT NULL COMMENT '原分录ID',
+  `voucher_id` int NOT NULL COMMENT '凭证ID',
+  `account_code` varchar(16) NOT NULL COMMENT '科目代码',
+  `summary` varchar(255) NOT NULL COMMENT '摘要',
+  `debit_amount` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '借方金额',
+  `credit_amount` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '贷方金额',
+  PRIMARY KEY (`id`),
+  KEY `idx_voucher_id` (`voucher_id`),
+  KEY `idx_account_code` (`account_code`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 ROW_FORMAT=COMPRESSED COMMENT='凭证分录表（已归档年度）';
+
 -- 重新启用外键检查
 
 SET FOREIGN_KEY_CHECKS = 1;
@@ -58,27 +58,25 @@ BEFORE INSERT ON `chart_of_accounts`
 FOR EACH ROW
 BEGIN
     DECLARE code_len INT;
-    SET code_len = CHAR_LENGTH(NEW.account_code);
-
-    -- 根据科目代码长度计算科目级别和父级代码
-    IF code_len = 4 THEN
-        SET NEW.level = 1;
-        SET NEW.parent_code = NULL;
-    ELSEIF code_len = 6 THEN
-        SET NEW.level = 2;
-        SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, 4);
-    ELSEIF code_len = 8 THEN
-        SET NEW.level = 3;
-        SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, 6);
-    ELSEIF code_len = 10 THEN
-        SET NEW.level = 4;
-        SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, 8);
-    -- 可以根据需要继续扩展更多级别
-    END IF;
 
-    -- 校验父科目是否存在
-    IF NEW.parent_code IS NOT NULL AND NOT EXISTS (SELECT 1 FROM chart_of_accounts WHERE account_code = NEW.parent_code) THEN
-        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = '父科目代码不存在，无法添加子科目。';
+    -- 批量导入（backend/chart_import.py）已在内存中推导级别、上级代码并校验过层级，
+    -- 会话变量 @chart_bulk_import = 1 时直接使用插入的值，不再逐行查询上级科目
+    IF COALESCE(@chart_bulk_import, 0) <> 1 THEN
+        SET code_len = CHAR_LENGTH(NEW.account_code);
+
+        -- 根据科目代码长度计算科目级别和父级代码：一级科目 4 位，此后每级 2 位
+        IF code_len = 4 THEN
+            SET NEW.level = 1;
+            SET NEW.parent_code = NULL;
+        ELSEIF code_len > 4 AND MOD(code_len - 4, 2) = 0 THEN
+            SET NEW.level = (code_len - 4) DIV 2 + 1;
+            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, code_len - 2);
+        END IF;
+
+        -- 校验父科目是否存在
+        IF NEW.parent_code IS NOT NULL AND NOT EXISTS (SELECT 1 FROM chart_of_accounts WHERE account_code = NEW.parent_code) THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = '父科目代码不存在，无法添加子科目。';
+        END IF;
     END IF;
 END$$
 --  SIGNAL 语句就是用来主动抛出错误的命令。开发人员通常选择 SQLSTATE '45000' 作为一种“通用”的自定义错误代码
@@ -106,15 +104,9 @@ BEGIN
         IF code_len = 4 THEN
             SET NEW.level = 1;
             SET NEW.parent_code = NULL;
-        ELSEIF code_len = 6 THEN
-            SET NEW.level = 2;
-            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, 4);
-        ELSEIF code_len = 8 THEN
-            SET NEW.level = 3;
-            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, 6);
-        ELSEIF code_len = 10 THEN
-            SET NEW.level = 4;
-            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, 8);
+        ELSEIF code_len > 4 AND MOD(code_len - 4, 2) = 0 THEN
+            SET NEW.level = (code_len - 4) DIV 2 + 1;
+            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, code_len - 2);
         END IF;
     END IF;
 END$$
@@ -7,6 +7,10 @@
 -- 2.增加一个完整的、自下而上的循环，该循环会同时汇总
 --    opening_balance (期初余额), period_debit (本期借方), 和 period_credit (本期贷方)。
 -- 3. 这确保了在任何时候运行此过程，都能生成一个数据完全准确的科目汇总表。
+-- 4. 先用一次分组扫描生成按月发生额 (account_period_balances)，全年发生额再由 12 个月合计得出，
+--    月度、季度等期间报表直接合并期间行，无需再扫描凭证分录。
+-- 5. 凭证分录只按 voucher_date 的日期区间筛选（不对列套用 YEAR()），可以走 idx_voucher_date_number 索引。
+--    已归档的年度（fiscal_year_archives）凭证已移到归档表，余额为只读快照，直接报错，不会把发生额清零。
 -- =================================================================
 
 -- 确保在正确的数据库下执行
@@ -23,6 +27,11 @@ BEGIN
     DECLARE max_level INT;
     DECLARE current_level INT;
 
+    -- 步骤0: 已归档年度的余额是冻结的快照，不允许重新汇总
+    IF EXISTS (SELECT 1 FROM fiscal_year_archives WHERE fiscal_year = fiscal_year_param) THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = '该年度已归档，科目余额为只读快照，不能重新汇总';
+    END IF;
+
     -- 步骤1: 智能判断年份策略 (与之前版本相同，逻辑正确)
     -- (此处省略了判断初始年/后续年的代码，以保持简洁)
     -- 简单起见，我们先实现核心的汇总逻辑
@@ -51,17 +60,57 @@ BEGIN
     WHERE ab.fiscal_year = fiscal_year_param
       AND coa.account_code IN (SELECT DISTINCT parent_code FROM chart_of_accounts WHERE parent_code IS NOT NULL);
 
-    -- 步骤4: 仅计算【末级科目】的本期发生额，数据来源是凭证表
+    -- 步骤3.1: 一次分组扫描凭证分录，得到各科目每个月的发生额
+    DELETE FROM account_period_balances WHERE fiscal_year = fiscal_year_param;
+
+    INSERT INTO account_period_balances (fiscal_year, period_month, account_code, period_debit, period_credit)
+    SELECT
+        fiscal_year_param,
+        MONTH(v.voucher_date),
+        je.account_code,
+        SUM(je.debit_amount),
+        SUM(je.credit_amount)
+    FROM journal_entries je
+    JOIN vouchers v ON je.voucher_id = v.id
+    WHERE v.voucher_date >= MAKEDATE(fiscal_year_param, 1)
+      AND v.voucher_date < MAKEDATE(fiscal_year_param + 1, 1)
+    GROUP BY MONTH(v.voucher_date), je.account_code;
+
+    -- 步骤3.2: 按月发生额自下而上汇总到上级科目
+    SELECT MAX(level) INTO max_level FROM chart_of_accounts;
+    SET current_level = max_level;
+
+    WHILE current_level > 1 DO
+        INSERT INTO account_period_balances (fiscal_year, period_month, account_code, period_debit, period_credit)
+        SELECT * FROM (
+            SELECT
+                fiscal_year_param,
+                p.period_month,
+                coa.parent_code,
+                SUM(p.period_debit) AS total_debit,
+                SUM(p.period_credit) AS total_credit
+            FROM account_period_balances p
+            JOIN chart_of_accounts coa ON p.account_code = coa.account_code
+            WHERE p.fiscal_year = fiscal_year_param AND coa.level = current_level AND coa.parent_code IS NOT NULL
+            GROUP BY p.period_month, coa.parent_code
+        ) AS child_summary
+        ON DUPLICATE KEY UPDATE
+            period_debit = period_debit + total_debit,
+            period_credit = period_credit + total_credit;
+
+        SET current_level = current_level - 1;
+    END WHILE;
+
+    -- 步骤4: 【末级科目】的全年发生额由各月发生额合计得出
     UPDATE account_balances ab
     LEFT JOIN (
         SELECT
-            je.account_code,
-            SUM(je.debit_amount) AS total_debit,
-            SUM(je.credit_amount) AS total_credit
-        FROM journal_entries je
-        JOIN vouchers v ON je.voucher_id = v.id
-        WHERE YEAR(v.voucher_date) = fiscal_year_param
-        GROUP BY je.account_code
+            account_code,
+            SUM(period_debit) AS total_debit,
+            SUM(period_credit) AS total_credit
+        FROM account_period_balances
+        WHERE fiscal_year = fiscal_year_param
+        GROUP BY account_code
     ) AS entry_summary ON ab.account_code = entry_summary.account_code
     SET
         ab.period_debit = COALESCE(entry_summary.total_debit, 0.00),
@@ -320,8 +320,13 @@ INSERT INTO `journal_entries` (`voucher_id`, `account_code`, `summary`, `debit_a
 (@v_id, '4103', '结转本年利润', 2523680.00, 0.00),
 (@v_id, '4104', '转入利润分配', 0.00, 2523680.00);
 
-
-
-
-
-
+-- ----------------------------
+-- 回填凭证主表的借方合计（凭证列表直接读取 total_amount）
+-- ----------------------------
+UPDATE `vouchers` v
+JOIN (
+    SELECT voucher_id, SUM(debit_amount) AS total_debit
+    FROM `journal_entries`
+    GROUP BY voucher_id
+) t ON t.voucher_id = v.id
+SET v.total_amount = t.total_debit;
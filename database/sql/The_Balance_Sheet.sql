@@ -2,29 +2,20 @@
 -- 附录A：完整财务报表存储过程脚本 (新资产负-债表格式)
 -- =================================================================
 -- 说明：
--- 1. 本脚本将重构 balance_sheet_report 表以支持左右栏对称格式。
--- 2. proc_generate_balance_sheet 存储过程将被完全重写，以匹配标准报表格式。
--- 3. 其他存储过程和结果表保持不变。
+-- 1. 资产负-债表采用左右栏对称格式。
+-- 2. proc_generate_balance_sheet 不再写入全局共享的 balance_sheet_report 表，
+--    而是在当前会话的临时表中生成报表，并直接以结果集返回，
+--    后端通过 cursor.stored_results() 读取。
+--    这样多个用户同时查询不同年度时，不会因清空共享表而争用元数据锁，也不会读到别人的年度。
 -- =================================================================
 
 -- 使用目标数据库
 USE financial_db;
 
 -- ----------------------------
--- 1. 重建资产负-债表结果表
+-- 1. 旧版本的共享结果表已不再使用
 -- ----------------------------
 DROP TABLE IF EXISTS `balance_sheet_report`;
-CREATE TABLE `balance_sheet_report` (
-  `id` int NOT NULL AUTO_INCREMENT,
-  `line_index` int DEFAULT NULL COMMENT '行次 (用于排序)',
-  `asset_item` varchar(100) DEFAULT NULL COMMENT '资产项目',
-  `asset_opening` decimal(14,2) DEFAULT NULL COMMENT '资产期初数',
-  `asset_closing` decimal(14,2) DEFAULT NULL COMMENT '资产期末数',
-  `liability_equity_item` varchar(100) DEFAULT NULL COMMENT '负-债及所有者权益项目',
-  `liability_equity_opening` decimal(14,2) DEFAULT NULL COMMENT '负-债和权益期初数',
-  `liability_equity_closing` decimal(14,2) DEFAULT NULL COMMENT '负-债和权益期末数',
-  PRIMARY KEY (`id`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='资产负-债表结果表(新格式)';
 
 
 -- ----------------------------
@@ -40,8 +31,19 @@ BEGIN
     DECLARE var_opening, var_closing DECIMAL(14,2);
     SET prev_year = fiscal_year_param - 1;
 
-    -- 开始前清空历史数据
-    TRUNCATE TABLE `balance_sheet_report`;
+    -- 报表结果放在会话级临时表中，各会话互不干扰
+    DROP TEMPORARY TABLE IF EXISTS tmp_balance_sheet_report;
+    CREATE TEMPORARY TABLE tmp_balance_sheet_report (
+      `id` int NOT NULL AUTO_INCREMENT,
+      `line_index` int DEFAULT NULL COMMENT '行次 (用于排序)',
+      `asset_item` varchar(100) DEFAULT NULL COMMENT '资产项目',
+      `asset_opening` decimal(14,2) DEFAULT NULL COMMENT '资产期初数',
+      `asset_closing` decimal(14,2) DEFAULT NULL COMMENT '资产期末数',
+      `liability_equity_item` varchar(100) DEFAULT NULL COMMENT '负-债及所有者权益项目',
+      `liability_equity_opening` decimal(14,2) DEFAULT NULL COMMENT '负-债和权益期初数',
+      `liability_equity_closing` decimal(14,2) DEFAULT NULL COMMENT '负-债和权益期末数',
+      PRIMARY KEY (`id`)
+    );
 
     -- 使用临时表来准备左右两栏的数据
     DROP TEMPORARY TABLE IF EXISTS temp_assets;
@@ -154,11 +156,11 @@ BEGIN
     SELECT SUM(opening), SUM(closing) INTO var_opening, var_closing FROM temp_liabilities_equity WHERE line_index IN (52, 58);
     INSERT INTO temp_liabilities_equity (line_index, item, opening, closing) VALUES (59, '负-债和所有者权益总计', var_opening, var_closing);
 
-    -- ==================== 将两个临时表合并到最终结果表 (最终修正版) ====================
+    -- ==================== 将两个临时表合并到结果临时表 ====================
     -- 使用两步INSERT来模拟FULL OUTER JOIN，避免 "Can't reopen table" 错误
 
     -- 第一步：插入所有资产项，以及与之匹配的负债和权益项 (LEFT JOIN)
-    INSERT INTO balance_sheet_report (line_index, asset_item, asset_opening, asset_closing, liability_equity_item, liability_equity_opening, liability_equity_closing)
+    INSERT INTO tmp_balance_sheet_report (line_index, asset_item, asset_opening, asset_closing, liability_equity_item, liability_equity_opening, liability_equity_closing)
     SELECT
         a.line_index,
         a.item,
@@ -173,7 +175,9 @@ BEGIN
         temp_liabilities_equity l ON a.line_index = l.line_index - 30; -- 行次对齐
 
     -- 第二步：插入所有在资产部分没有匹配到的负债和权益项
-    INSERT INTO balance_sheet_report (line_index, liability_equity_item, liability_equity_opening, liability_equity_closing)
+    -- 第一步写入的行次正是资产行次，因此直接对照 temp_assets 判断
+    -- （同一条语句中不能两次打开同一张临时表）
+    INSERT INTO tmp_balance_sheet_report (line_index, liability_equity_item, liability_equity_opening, liability_equity_closing)
     SELECT
         l.line_index,
         l.item,
@@ -181,12 +185,15 @@ BEGIN
         l.closing
     FROM
         temp_liabilities_equity l
-    WHERE NOT EXISTS (SELECT 1 FROM balance_sheet_report b WHERE b.line_index = l.line_index);
+    WHERE NOT EXISTS (SELECT 1 FROM temp_assets a WHERE a.line_index = l.line_index);
 
+    -- 以结果集的形式返回报表
+    SELECT * FROM tmp_balance_sheet_report ORDER BY line_index;
 
     -- 清理临时表
     DROP TEMPORARY TABLE temp_assets;
     DROP TEMPORARY TABLE temp_liabilities_equity;
+    DROP TEMPORARY TABLE tmp_balance_sheet_report;
 
 END$$
 DELIMITER ;
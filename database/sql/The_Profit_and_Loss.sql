@@ -1,18 +1,11 @@
 SET FOREIGN_KEY_CHECKS = 0;
 
 -- ----------------------------
--- Table structure for income_statement_report
+-- 旧版本的共享结果表 income_statement_report 已不再使用：
+-- 利润表改为在会话级临时表中生成，并以结果集返回，
+-- 后端通过 cursor.stored_results() 读取，多个会话并发生成互不影响
 -- ----------------------------
 DROP TABLE IF EXISTS `income_statement_report`;
-
--- 创建利润表结果表
-CREATE TABLE `income_statement_report` (
-    `id`          INT NOT NULL AUTO_INCREMENT COMMENT '主键ID',
-    `line_index`  INT COMMENT '行次',
-    `item`        VARCHAR(100) COMMENT '项目',
-    `amount`      DECIMAL(14, 2) COMMENT '本期金额',
-    PRIMARY KEY (`id`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='利润表结果表';
 SET FOREIGN_KEY_CHECKS = 1;
 
 -- 先删除旧的存储过程
@@ -24,6 +17,9 @@ CREATE PROCEDURE `proc_generate_income_statement`(IN fiscal_year_param INT)
 BEGIN
     -- 声明用于存放计算结果的变量
     DECLARE var_operating_profit, var_total_profit, var_net_profit DECIMAL(14, 2);
+    DECLARE var_revenue, var_cost, var_tax_surcharge DECIMAL(14, 2);
+    DECLARE var_selling_expense, var_admin_expense, var_finance_expense DECIMAL(14, 2);
+    DECLARE var_non_op_income, var_non_op_expense, var_income_tax DECIMAL(14, 2);
 
     -- 步骤1: 创建并填充一级科目发生额临时表
     -- 注意：利润表取的是本期发生额 (period_debit, period_credit)
@@ -47,67 +43,61 @@ BEGIN
         ab.fiscal_year = fiscal_year_param
         AND coa.level = 1;
 
-    -- 步骤2: 清空上次的报表结果
-    TRUNCATE TABLE `income_statement_report`;
-
-    -- 步骤3: 从临时表中取数，填充报表
-    -- 1. 主营业务收入 (取贷方发生额)
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 1, '一、主营业务收入', COALESCE(SUM(period_credit), 0) FROM `level1_income_summary` WHERE `account_code` = '6001';
-
-    -- 2. 减：主营业务成本 (取借方发生额)
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 2, '  减：主营业务成本', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6401';
-
-    -- 3. 税金及附加 (取借方发生额) - 【修正】原脚本6601错误，应为6403
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 3, '       税金及附加', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6403';
-    
-    -- 4. 销售费用 (取借方发生额) - 【修正】原脚本6602错误，应为6601
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 6, '  减：销售费用', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6601';
-    
-    -- 5. 管理费用 (取借方发生额) - 【修正】原脚本6603错误，应为6602
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 7, '       管理费用', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6602';
-
-    -- 6. 财务费用 (取借方发生额) - 【修正】原脚本6604错误，应为6603
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 8, '       财务费用', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6603';
-
-    -- 7. 计算营业利润
-    -- 营业利润 = 主营业务收入 - (主营成本 + 税金 + 销售费用 + 管理费用 + 财务费用)
+    -- 步骤2: 先把各项目金额取到变量中
+    -- （会话临时表在同一条语句中不能被引用两次，因此小计用变量计算，而不是回查报表表）
     SELECT
-        (SELECT amount FROM `income_statement_report` WHERE line_index = 1) - 
-        COALESCE(SUM(amount), 0)
-    INTO var_operating_profit
-    FROM `income_statement_report`
-    WHERE line_index IN (2, 3, 6, 7, 8);
-    INSERT INTO `income_statement_report` (line_index, item, amount) VALUES (9, '二、营业利润（亏损以“-”号填列）', var_operating_profit);
+        COALESCE(SUM(CASE WHEN account_code = '6001' THEN period_credit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6401' THEN period_debit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6403' THEN period_debit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6601' THEN period_debit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6602' THEN period_debit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6603' THEN period_debit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6301' THEN period_credit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6711' THEN period_debit ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN account_code = '6801' THEN period_debit ELSE 0 END), 0)
+    INTO var_revenue, var_cost, var_tax_surcharge, var_selling_expense, var_admin_expense,
+         var_finance_expense, var_non_op_income, var_non_op_expense, var_income_tax
+    FROM `level1_income_summary`;
 
-    -- 8. 加：营业外收入 (取贷方发生额)
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 12, '  加：营业外收入', COALESCE(SUM(period_credit), 0) FROM `level1_income_summary` WHERE `account_code` = '6301';
-
-    -- 9. 减：营业外支出 (取借方发生额) - 【修正】原脚本6701错误，应为6711
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 13, '  减：营业外支出', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6711';
-
-    -- 10. 计算利润总额
+    -- 营业利润 = 主营业务收入 - (主营成本 + 税金 + 销售费用 + 管理费用 + 财务费用)
+    SET var_operating_profit = var_revenue - (var_cost + var_tax_surcharge + var_selling_expense + var_admin_expense + var_finance_expense);
     -- 利润总额 = 营业利润 + 营业外收入 - 营业外支出
-    SET var_total_profit = var_operating_profit 
-                         + (SELECT amount FROM `income_statement_report` WHERE line_index = 12) 
-                         - (SELECT amount FROM `income_statement_report` WHERE line_index = 13);
-    INSERT INTO `income_statement_report` (line_index, item, amount) VALUES (14, '三、利润总额（亏损总额以“-”号填列）', var_total_profit);
-
-    -- 11. 减：所得税费用 (取借方发生额) 
-    INSERT INTO `income_statement_report` (line_index, item, amount)
-    SELECT 15, '  减：所得税费用', COALESCE(SUM(period_debit), 0) FROM `level1_income_summary` WHERE `account_code` = '6801';
-
-    -- 12. 计算净利润
+    SET var_total_profit = var_operating_profit + var_non_op_income - var_non_op_expense;
     -- 净利润 = 利润总额 - 所得税费用
-    SET var_net_profit = var_total_profit - (SELECT amount FROM `income_statement_report` WHERE line_index = 15);
-    INSERT INTO `income_statement_report` (line_index, item, amount) VALUES (16, '四、净利润（净亏损以“-”号填列）', var_net_profit);
+    SET var_net_profit = var_total_profit - var_income_tax;
+
+    -- 步骤3: 在本会话的临时表中生成报表
+    -- 科目口径说明：
+    --   税金及附加取 6403，销售费用取 6601，管理费用取 6602，财务费用取 6603，
+    --   营业外支出取 6711，所得税费用取 6801（均为原脚本修正后的科目）
+    DROP TEMPORARY TABLE IF EXISTS `tmp_income_statement_report`;
+    CREATE TEMPORARY TABLE `tmp_income_statement_report` (
+        `id`          INT NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+        `line_index`  INT COMMENT '行次',
+        `item`        VARCHAR(100) COMMENT '项目',
+        `amount`      DECIMAL(14, 2) COMMENT '本期金额',
+        PRIMARY KEY (`id`)
+    );
+
+    INSERT INTO `tmp_income_statement_report` (line_index, item, amount) VALUES
+        (1,  '一、主营业务收入', var_revenue),
+        (2,  '  减：主营业务成本', var_cost),
+        (3,  '       税金及附加', var_tax_surcharge),
+        (6,  '  减：销售费用', var_selling_expense),
+        (7,  '       管理费用', var_admin_expense),
+        (8,  '       财务费用', var_finance_expense),
+        (9,  '二、营业利润（亏损以“-”号填列）', var_operating_profit),
+        (12, '  加：营业外收入', var_non_op_income),
+        (13, '  减：营业外支出', var_non_op_expense),
+        (14, '三、利润总额（亏损总额以“-”号填列）', var_total_profit),
+        (15, '  减：所得税费用', var_income_tax),
+        (16, '四、净利润（净亏损以“-”号填列）', var_net_profit);
+
+    -- 步骤4: 以结果集返回报表并清理
+    SELECT * FROM `tmp_income_statement_report` ORDER BY line_index;
+
+    DROP TEMPORARY TABLE `tmp_income_statement_report`;
+    DROP TEMPORARY TABLE `level1_income_summary`;
 
 END$$
 DELIMITER ;
@@ -0,0 +1,23 @@
+-- =================================================================
+-- 升级脚本 001：凭证列表分页与借方合计
+-- =================================================================
+-- 说明：
+-- 1. 适用于已按旧版 1_tables.sql 建好表、并已有凭证数据的数据库；新建库直接执行 1_tables.sql 即可。
+-- 2. 为 vouchers 增加 total_amount 列，并用一次分组汇总回填历史凭证的借方合计。
+-- 3. 增加凭证列表键集分页和按凭证字筛选所需的索引。
+-- =================================================================
+
+USE financial_db;
+
+ALTER TABLE `vouchers`
+    ADD COLUMN `total_amount` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '借方合计（保存凭证时写入）' AFTER `summary`,
+    ADD KEY `idx_voucher_date_number` (`voucher_date`, `voucher_number`),
+    ADD KEY `idx_voucher_type_date` (`voucher_type`, `voucher_date`, `voucher_number`);
+
+UPDATE `vouchers` v
+JOIN (
+    SELECT voucher_id, SUM(debit_amount) AS total_debit
+    FROM `journal_entries`
+    GROUP BY voucher_id
+) t ON t.voucher_id = v.id
+SET v.total_amount = t.total_debit;
@@ -0,0 +1,35 @@
+-- =================================================================
+-- 升级脚本 002：凭证号序列与唯一约束
+-- =================================================================
+-- 说明：
+-- 1. 适用于已执行过 001 的已有数据库；新建库直接执行 1_tables.sql 即可。
+-- 2. 为 vouchers 增加凭证期间生成列，并加唯一键 (voucher_type, voucher_period, voucher_number)。
+--    若历史数据中已存在重号，ALTER 会失败，请先用文末的查询找出重号凭证并修正。
+-- 3. 创建 voucher_number_sequences，并按现有凭证初始化各期间已用到的最大号
+--    （不初始化也可以，首次取号时会自动按该月最大号初始化）。
+-- =================================================================
+
+USE financial_db;
+
+ALTER TABLE `vouchers`
+    ADD COLUMN `voucher_period` int AS (YEAR(`voucher_date`) * 100 + MONTH(`voucher_date`)) STORED
+        COMMENT '凭证期间（如 202501），凭证号在期间内编号' AFTER `voucher_number`,
+    ADD UNIQUE KEY `uk_voucher_type_period_number` (`voucher_type`, `voucher_period`, `voucher_number`);
+
+CREATE TABLE IF NOT EXISTS `voucher_number_sequences` (
+  `voucher_type` varchar(10) NOT NULL COMMENT '凭证字',
+  `period_year` smallint NOT NULL COMMENT '年度',
+  `period_month` tinyint NOT NULL COMMENT '月份',
+  `last_number` int NOT NULL DEFAULT '0' COMMENT '已分配的最大凭证号',
+  PRIMARY KEY (`voucher_type`, `period_year`, `period_month`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='凭证号序列（保存凭证时在同一事务中取号）';
+
+INSERT INTO `voucher_number_sequences` (voucher_type, period_year, period_month, last_number)
+SELECT voucher_type, voucher_period DIV 100, voucher_period MOD 100, MAX(voucher_number)
+FROM `vouchers`
+GROUP BY voucher_type, voucher_period
+ON DUPLICATE KEY UPDATE last_number = GREATEST(last_number, VALUES(last_number));
+
+-- 查找重号凭证（唯一键添加失败时使用）：
+-- SELECT voucher_type, DATE_FORMAT(voucher_date, '%Y-%m') AS period, voucher_number, COUNT(*)
+-- FROM vouchers GROUP BY voucher_type, period, voucher_number HAVING COUNT(*) > 1;
@@ -0,0 +1,22 @@
+-- =================================================================
+-- 升级脚本 003：按月的科目发生额表
+-- =================================================================
+-- 说明：
+-- 1. 适用于已有数据库；新建库直接执行 1_tables.sql 即可。
+-- 2. 创建 account_period_balances 后，需重新执行 3_procedures.sql（过程新增了按月汇总步骤），
+--    再对每个已有凭证的年度运行一次科目汇总以回填期间行，例如：
+--        CALL proc_generate_account_summary(2025);
+--    增量模式下也可以用对账命令回填：python ledger_balances.py 2025 --repair
+-- =================================================================
+
+USE financial_db;
+
+CREATE TABLE IF NOT EXISTS `account_period_balances` (
+  `fiscal_year` int NOT NULL COMMENT '会计年度',
+  `period_month` tinyint NOT NULL COMMENT '会计期间（月份 1-12）',
+  `account_code` varchar(16) NOT NULL COMMENT '科目代码',
+  `period_debit` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '本月借方发生额',
+  `period_credit` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '本月贷方发生额',
+  PRIMARY KEY (`fiscal_year`, `period_month`, `account_code`),
+  KEY `idx_account_year` (`account_code`, `fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='科目期间发生额表';
@@ -0,0 +1,20 @@
+-- =================================================================
+-- 升级脚本 004：年末结转记录
+-- =================================================================
+-- 说明：
+-- 1. 适用于已有数据库；新建库直接执行 1_tables.sql 即可。
+-- 2. 创建 year_end_closes 后即可使用年末结转（backend/year_end.py 或 POST /api/year_end/close），
+--    例如把 2022-2024 年末余额依次结转为下一年度期初：
+--        python year_end.py 2022 --to 2025
+-- =================================================================
+
+USE financial_db;
+
+CREATE TABLE IF NOT EXISTS `year_end_closes` (
+  `fiscal_year` int NOT NULL COMMENT '结转的会计年度（其期末余额结转为下一年度期初）',
+  `source_fingerprint` varchar(128) NOT NULL COMMENT '结转时本年期末余额的指纹，未变化时再次结转会跳过',
+  `net_income` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '转入留存收益的本年净利润',
+  `accounts` int NOT NULL DEFAULT '0' COMMENT '结转时的科目数',
+  `closed_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '结转时间',
+  PRIMARY KEY (`fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='年末结转记录';
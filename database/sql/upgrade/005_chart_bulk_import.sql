@@ -0,0 +1,77 @@
+-- =================================================================
+-- 升级脚本 005：科目批量导入
+-- =================================================================
+-- 说明：
+-- 1. 适用于已有数据库；新建库直接执行 2_constraints_and_triggers.sql 即可。
+-- 2. 重建科目表的 INSERT / UPDATE 触发器：
+--    - 级别和上级代码的推导从固定的 4/6/8/10 位扩展为任意级别（一级 4 位，此后每级 2 位）；
+--    - 会话变量 @chart_bulk_import = 1 时 INSERT 触发器直接使用插入的级别和上级代码，
+--      不再逐行查询上级科目（由 backend/chart_import.py 在内存中统一校验）。
+-- =================================================================
+
+USE financial_db;
+
+DROP TRIGGER IF EXISTS `trg_before_insert_chart_of_accounts`;
+DROP TRIGGER IF EXISTS `trg_before_update_chart_of_accounts`;
+
+DELIMITER $$
+
+-- --- BEFORE INSERT Trigger ---
+CREATE TRIGGER `trg_before_insert_chart_of_accounts`
+BEFORE INSERT ON `chart_of_accounts`
+FOR EACH ROW
+BEGIN
+    DECLARE code_len INT;
+
+    -- 批量导入（backend/chart_import.py）已在内存中推导级别、上级代码并校验过层级，
+    -- 会话变量 @chart_bulk_import = 1 时直接使用插入的值，不再逐行查询上级科目
+    IF COALESCE(@chart_bulk_import, 0) <> 1 THEN
+        SET code_len = CHAR_LENGTH(NEW.account_code);
+
+        -- 根据科目代码长度计算科目级别和父级代码：一级科目 4 位，此后每级 2 位
+        IF code_len = 4 THEN
+            SET NEW.level = 1;
+            SET NEW.parent_code = NULL;
+        ELSEIF code_len > 4 AND MOD(code_len - 4, 2) = 0 THEN
+            SET NEW.level = (code_len - 4) DIV 2 + 1;
+            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, code_len - 2);
+        END IF;
+
+        -- 校验父科目是否存在
+        IF NEW.parent_code IS NOT NULL AND NOT EXISTS (SELECT 1 FROM chart_of_accounts WHERE account_code = NEW.parent_code) THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = '父科目代码不存在，无法添加子科目。';
+        END IF;
+    END IF;
+END$$
+
+
+-- --- BEFORE UPDATE Trigger ---
+CREATE TRIGGER `trg_before_update_chart_of_accounts`
+BEFORE UPDATE ON `chart_of_accounts`
+FOR EACH ROW
+BEGIN
+    -- 在BEGIN之后立即声明所有变量
+    DECLARE code_len INT;
+
+    -- 如果科目代码被修改
+    IF NEW.account_code != OLD.account_code THEN
+        -- 检查该科目是否已被使用（作为父科目或在凭证/余额中使用）
+        IF EXISTS (SELECT 1 FROM chart_of_accounts WHERE parent_code = OLD.account_code) OR
+           EXISTS (SELECT 1 FROM journal_entries WHERE account_code = OLD.account_code) OR
+           EXISTS (SELECT 1 FROM account_balances WHERE account_code = OLD.account_code) THEN
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = '科目已被使用，禁止修改科目代码。';
+        END IF;
+        
+        -- 重新计算级别和父级代码
+        SET code_len = CHAR_LENGTH(NEW.account_code);
+        IF code_len = 4 THEN
+            SET NEW.level = 1;
+            SET NEW.parent_code = NULL;
+        ELSEIF code_len > 4 AND MOD(code_len - 4, 2) = 0 THEN
+            SET NEW.level = (code_len - 4) DIV 2 + 1;
+            SET NEW.parent_code = SUBSTRING(NEW.account_code, 1, code_len - 2);
+        END IF;
+    END IF;
+END$$
+
+DELIMITER ;
@@ -0,0 +1,58 @@
+-- =================================================================
+-- 升级脚本 006：已结转年度的归档
+-- =================================================================
+-- 说明：
+-- 1. 适用于已有数据库；新建库直接执行 1_tables.sql 即可。
+-- 2. 创建归档记录表和两张归档表后，需重新执行 3_procedures.sql
+--    （proc_generate_account_summary 对已归档年度直接报错，不再把该年度的发生额清零）。
+-- 3. 已年末结转、试算平衡检查通过的年度即可归档（backend/archive.py 或 POST /api/year_end/archive），
+--    例如：
+--        python archive.py 2022
+-- 4. 没有改为按年度分区：MySQL 的分区表不支持外键，journal_entries 的 fk_entry_voucher（级联删除）
+--    和 fk_entry_account 都需要保留；唯一键 uk_voucher_type_period_number 也必须包含分区列。
+-- =================================================================
+
+USE financial_db;
+
+-- 已归档（backend/archive.py）的年度：凭证和分录已移到归档表，该年度的科目余额为只读快照。
+-- status 为 archiving 表示正在分批搬移（中断后再次运行会继续），两种状态下该年度都不能再写入。
+CREATE TABLE IF NOT EXISTS `fiscal_year_archives` (
+  `fiscal_year` int NOT NULL COMMENT '归档的会计年度',
+  `status` enum('archiving','archived') NOT NULL DEFAULT 'archiving' COMMENT '归档状态',
+  `voucher_count` int NOT NULL DEFAULT '0' COMMENT '归档的凭证数',
+  `entry_count` int NOT NULL DEFAULT '0' COMMENT '归档的分录数',
+  `total_amount` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT '归档凭证的借方合计',
+  `balances_fingerprint` varchar(128) DEFAULT NULL COMMENT '归档时科目余额的指纹，用于核对快照未被改动',
+  `started_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '开始归档时间',
+  `archived_at` datetime DEFAULT NULL COMMENT '完成归档时间',
+  PRIMARY KEY (`fiscal_year`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='年度归档记录';
+
+-- 已归档年度的凭证和分录，列与 vouchers / journal_entries 相同，保留原凭证 id 和分录 id。
+-- 只在归档时写入，不需要外键和唯一约束；压缩行格式减少历史数据占用的磁盘和缓冲池。
+CREATE TABLE IF NOT EXISTS `vouchers_archive` (
+  `id` int NOT NULL COMMENT '原凭证ID',
+  `voucher_date` date NOT NULL COMMENT '凭证日期',
+  `voucher_type` varchar(10) NOT NULL COMMENT '凭证字',
+  `voucher_number` int NOT NULL COMMENT '凭证号',
+  `voucher_period` int AS (YEAR(`voucher_date`) * 100 + MONTH(`voucher_date`)) STORED COMMENT '凭证期间',
+  `summary` varchar(255) NOT NULL COMMENT '摘要',
+  `total_amount` decimal(14,2) NOT NULL DEFAULT '0.00' COMMENT '借方合计',
+  `created_at` datetime DEFAULT NULL COMMENT '创建时间',
+  `updated_at` datetime DEFAULT NULL COMMENT '更新时间',
+  PRIMARY KEY (`id`),
+  KEY `idx_voucher_date_number` (`voucher_date`, `voucher_number`),
+  KEY `idx_voucher_type_date` (`voucher_type`, `voucher_date`, `voucher_number`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 ROW_FORMAT=COMPRESSED COMMENT='凭证主表（已归档年度）';
+
+CREATE TABLE IF NOT EXISTS `journal_entries_archive` (
+  `id` int NOT NULL COMMENT '原分录ID',
+  `voucher_id` int NOT NULL COMMENT '凭证ID',
+  `account_code` varchar(16) NOT NULL COMMENT '科目代码',
+  `summary` varchar(255) NOT NULL COMMENT '摘要',
+  `debit_amount` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '借方金额',
+  `credit_amount` decimal(12,2) NOT NULL DEFAULT '0.00' COMMENT '贷方金额',
+  PRIMARY KEY (`id`),
+  KEY `idx_voucher_id` (`voucher_id`),
+  KEY `idx_account_code` (`account_code`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 ROW_FORMAT=COMPRESSED COMMENT='凭证分录表（已归档年度）';